@@ -0,0 +1,211 @@
+# achievements.py
+"""
+Automatic achievements, awarded as statistics and submissions are written.
+
+Every rule names the stat columns or events it depends on, and RULES_BY_TRIGGER
+indexes the rules by those names. A write hands evaluate() the triggers it
+touched (the changed columns, or "completion"), so only those rules run, and
+each rule only reads the one student's rows:
+
+  PersonalBest   new best for a metric, against personal_bests (seeded from the old stat value)
+  TopPercentile  metric within the top N% of all students, ranked in a cached sorted array
+  Milestone      student_progress counter (streak, completions) reaching a threshold
+
+One-off awards are recorded in achievement_awards so they are never repeated.
+record() writes the student_achievements and notifications rows of a batch,
+plus a news_feed row for each one-off award (personal bests are only told to
+the student), with executemany in the caller's transaction; nothing commits here.
+"""
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional
+
+import numpy as np
+
+COHORT_TTL = 60         # seconds a worker reuses a metric's sorted values for percentile ranks
+MIN_COHORT = 20         # fewer students with the metric than this and no percentile award is given
+
+# metric -> (label, unit, higher is better)
+METRICS = {
+    "vertical_jump": ("vertical jump", "cm", True),
+    "broad_jump": ("broad jump", "cm", True),
+    "flying_10": ("flying 10", "s", False),
+    "track_interval": ("track interval", "s", False),
+    "hang_clean": ("hang clean", "kg", True),
+    "bench": ("bench press", "kg", True),
+    "back_squat": ("back squat", "kg", True),
+    "front_squat": ("front squat", "kg", True),
+    "jump_force": ("jump force", "N", True),
+    "air_time": ("air time", "s", True),
+}
+
+
+class Award(NamedTuple):
+    student_id: int
+    rule: str
+    title: str
+    description: str
+    once: bool  # recorded in achievement_awards and never given again
+
+
+def _better(metric: str, a: float, b: float) -> bool:
+    return a > b if METRICS[metric][2] else a < b
+
+
+def _fmt(metric: str, value: float) -> str:
+    return f"{value:g} {METRICS[metric][1]}"
+
+
+class PersonalBest:
+    def __init__(self, metric: str):
+        self.metric = metric
+        self.key = f"pb:{metric}"
+        self.triggers = (metric,)
+
+    def evaluate(self, cur, student_id: int, old: Mapping, new: Mapping) -> List[Award]:
+        value = new.get(self.metric)
+        if value is None:
+            return []
+        row = cur.execute("SELECT value FROM personal_bests WHERE student_id = ? AND metric = ?",
+                          (student_id, self.metric)).fetchone()
+        best = row[0] if row else old.get(self.metric)
+        improved = best is not None and _better(self.metric, value, best)
+        if row is None or improved:
+            # the first write for a metric also stores the old stat value as the baseline
+            kept = value if best is None or improved else best
+            cur.execute("""
+                        INSERT INTO personal_bests (student_id, metric, value, set_at) VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                            ON CONFLICT(student_id, metric) DO UPDATE SET value = excluded.value, set_at = excluded.set_at
+                        """, (student_id, self.metric, kept))
+        if not improved:
+            return []  # includes a first measurement, which is the baseline rather than an improvement
+        label = METRICS[self.metric][0]
+        return [Award(student_id, self.key, f"New {label} personal best",
+                      f"{_fmt(self.metric, value)} (previous best {_fmt(self.metric, best)})", once=False)]
+
+
+class _Cohort:
+    """Per-worker sorted values of one metric across all students, refreshed every COHORT_TTL seconds."""
+
+    def __init__(self, metric: str):
+        self.metric = metric
+        self.values = np.empty(0)
+        self.loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def sorted_values(self, cur) -> np.ndarray:
+        if time.monotonic() - self.loaded_at > COHORT_TTL:
+            with self._lock:
+                if time.monotonic() - self.loaded_at > COHORT_TTL:
+                    rows = cur.execute(f"SELECT {self.metric} FROM student_statistics "
+                                       f"WHERE {self.metric} IS NOT NULL").fetchall()
+                    self.values = np.sort(np.fromiter((r[0] for r in rows), dtype=np.float64, count=len(rows)))
+                    self.loaded_at = time.monotonic()
+        return self.values
+
+
+class TopPercentile:
+    def __init__(self, metric: str, percent: int):
+        self.metric = metric
+        self.percent = percent
+        self.key = f"top{percent}:{metric}"
+        self.triggers = (metric,)
+        self.cohort = _Cohort(metric)
+
+    def evaluate(self, cur, student_id: int, old: Mapping, new: Mapping) -> List[Award]:
+        value = new.get(self.metric)
+        if value is None:
+            return []
+        values = self.cohort.sorted_values(cur)
+        if len(values) < MIN_COHORT:
+            return []
+        if METRICS[self.metric][2]:
+            ahead = len(values) - np.searchsorted(values, value, side="right")
+        else:
+            ahead = np.searchsorted(values, value, side="left")
+        previous = old.get(self.metric)
+        if previous is not None and _better(self.metric, previous, value):
+            ahead -= 1  # the cached array may still hold this student's own older, better value
+        if ahead >= len(values) * self.percent / 100:
+            return []
+        label = METRICS[self.metric][0]
+        return [Award(student_id, self.key, f"Top {self.percent}% {label}",
+                      f"{_fmt(self.metric, value)} ranks #{int(ahead) + 1} of {len(values)} students", once=True)]
+
+
+class Milestone:
+    def __init__(self, column: str, threshold: int, title: str, description: str):
+        self.column = column
+        self.threshold = threshold
+        self.key = f"{column}:{threshold}"
+        self.title = title
+        self.description = description
+        self.triggers = ("completion",)
+
+    def evaluate(self, cur, student_id: int, old: Mapping, new: Mapping) -> List[Award]:
+        row = cur.execute(f"SELECT {self.column} FROM student_progress WHERE student_id = ?", (student_id,)).fetchone()
+        if not row or (row[0] or 0) < self.threshold:
+            return []
+        return [Award(student_id, self.key, self.title, self.description, once=True)]
+
+
+RULES = (
+    [PersonalBest(m) for m in METRICS]
+    + [TopPercentile(m, 10) for m in ("vertical_jump", "broad_jump", "flying_10")]
+    + [Milestone("streak_count", n, f"{n}-form streak", f"{n} forms in a row completed on time")
+       for n in (5, 10, 25, 50)]
+    + [Milestone("forms_completed", n, f"{n} forms completed", f"Completed {n} assigned forms")
+       for n in (10, 50, 100)]
+)
+
+RULES_BY_TRIGGER: Dict[str, list] = defaultdict(list)
+for _rule in RULES:
+    for _trigger in _rule.triggers:
+        RULES_BY_TRIGGER[_trigger].append(_rule)
+
+
+def evaluate(cur, student_id: int, triggers: Iterable[str],
+             old: Optional[Mapping] = None, new: Optional[Mapping] = None) -> List[Award]:
+    """Run the rules indexed under `triggers` for one student; returns awards not yet held (not recorded)."""
+    old, new = old or {}, new or {}
+    seen, awards = set(), []
+    for trigger in triggers:
+        for rule in RULES_BY_TRIGGER.get(trigger, ()):
+            if rule.key not in seen:
+                seen.add(rule.key)
+                awards.extend(rule.evaluate(cur, student_id, old, new))
+    once = [a.rule for a in awards if a.once]
+    if once:
+        held = {r[0] for r in cur.execute(
+            f"SELECT rule FROM achievement_awards WHERE student_id = ? AND rule IN ({', '.join('?' * len(once))})",
+            [student_id, *once])}
+        awards = [a for a in awards if not (a.once and a.rule in held)]
+    return awards
+
+
+def record(cur, awards: List[Award]):
+    """Write a batch of awards to achievements and notifications, one-off ones also to the news feed (not committed)."""
+    if not awards:
+        return
+    ids = sorted({a.student_id for a in awards})
+    names = {r[0]: r[1] for r in cur.execute(
+        f"SELECT id, COALESCE(name, email) FROM users WHERE id IN ({', '.join('?' * len(ids))})", ids)}
+    cur.executemany("INSERT OR IGNORE INTO achievement_awards (student_id, rule) VALUES (?, ?)",
+                    [(a.student_id, a.rule) for a in awards if a.once])
+    cur.executemany("INSERT INTO student_achievements (student_id, title, description) VALUES (?, ?, ?)",
+                    [(a.student_id, a.title, a.description) for a in awards])
+    cur.executemany("INSERT INTO notifications (user_id, type, title, message) VALUES (?, 'achievement', ?, ?)",
+                    [(a.student_id, a.title, a.description) for a in awards])
+    # only one-off awards are announced school-wide; personal bests stay with the student
+    cur.executemany("INSERT INTO news_feed (title, description, category) VALUES (?, ?, 'student_achievement')",
+                    [(f"{names.get(a.student_id, 'A student')}: {a.title}", a.description)
+                     for a in awards if a.once])
+
+
+def check(cur, student_id: int, triggers: Iterable[str],
+          old: Optional[Mapping] = None, new: Optional[Mapping] = None) -> List[Award]:
+    """evaluate() and record() in one call; the usual hook after a write."""
+    awards = evaluate(cur, student_id, triggers, old, new)
+    record(cur, awards)
+    return awards
@@ -0,0 +1,117 @@
+# admission.py
+"""
+Admission control for expensive model runs.
+
+Each model gets a ModelGate: at most `concurrency` runs execute at once per
+worker process, and at most `queue_size` more wait for a slot. Waiters are
+served by lane (LANES order), then FIFO within a lane. A request that finds
+the queue full, or waits longer than `max_wait`, is rejected right away with
+Overloaded, which the app turns into 503 + Retry-After. Threads serving
+cheap routes never touch a gate, so they keep their latency while the
+models are saturated.
+"""
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+LANES = ("interactive", "standard", "background")  # highest priority first
+DEFAULT_CONCURRENCY = 2
+DEFAULT_QUEUE_SIZE = 8
+DEFAULT_MAX_WAIT = 30.0
+
+
+class Overloaded(Exception):
+    def __init__(self, model: str, reason: str, retry_after: int):
+        super().__init__(f"{model} is overloaded ({reason})")
+        self.model = model
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class ModelGate:
+    def __init__(self, name: str, concurrency: int = DEFAULT_CONCURRENCY,
+                 queue_size: int = DEFAULT_QUEUE_SIZE, max_wait: float = DEFAULT_MAX_WAIT):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._waiting = []  # heap of (lane rank, seq)
+        self._seq = itertools.count()
+        self.active = 0
+        self.admitted = 0
+        self.shed = {"queue_full": 0, "timeout": 0}
+        self.avg_run_seconds = 1.0  # EWMA, used for Retry-After
+
+    def _retry_after(self) -> int:
+        backlog = len(self._waiting) + self.active
+        return max(1, round(self.avg_run_seconds * backlog / self.concurrency))
+
+    def check(self):
+        """Fail fast, before the caller reads a large request body, if the queue is already full."""
+        with self._cond:
+            if self.active >= self.concurrency and len(self._waiting) >= self.queue_size:
+                self.shed["queue_full"] += 1
+                raise Overloaded(self.name, "queue_full", self._retry_after())
+
+    @contextmanager
+    def slot(self, lane: str = "standard"):
+        self._acquire(lane)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._cond:
+                self.active -= 1
+                self.avg_run_seconds = 0.8 * self.avg_run_seconds + 0.2 * elapsed
+                self._cond.notify_all()
+
+    def _acquire(self, lane: str):
+        ticket = (LANES.index(lane), next(self._seq))
+        with self._cond:
+            if self.active < self.concurrency and not self._waiting:
+                self.active += 1
+                self.admitted += 1
+                return
+            if len(self._waiting) >= self.queue_size:
+                self.shed["queue_full"] += 1
+                raise Overloaded(self.name, "queue_full", self._retry_after())
+
+            heapq.heappush(self._waiting, ticket)
+            deadline = time.monotonic() + self.max_wait
+            while not (self._waiting[0] == ticket and self.active < self.concurrency):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    self._cond.notify_all()
+                    self.shed["timeout"] += 1
+                    raise Overloaded(self.name, "timeout", self._retry_after())
+                self._cond.wait(remaining)
+            heapq.heappop(self._waiting)
+            self.active += 1
+            self.admitted += 1
+            self._cond.notify_all()  # the next waiter may also fit
+
+    def stats(self) -> dict:
+        with self._cond:
+            queued = {lane: 0 for lane in LANES}
+            for rank, _ in self._waiting:
+                queued[LANES[rank]] += 1
+            return {
+                "concurrency": self.concurrency,
+                "queueSize": self.queue_size,
+                "active": self.active,
+                "queued": queued,
+                "admitted": self.admitted,
+                "shed": dict(self.shed),
+                "avgRunSeconds": round(self.avg_run_seconds, 3),
+            }
+
+
+def build_gates(model_keys, limits: Dict[str, dict]) -> Dict[str, ModelGate]:
+    return {key: ModelGate(key, **limits.get(key, {})) for key in model_keys}
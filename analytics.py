@@ -0,0 +1,301 @@
+# analytics.py
+"""
+Columnar analytics snapshots.
+
+build_snapshot() exports submissions, student_statistics and class rosters
+into one .npy file per column under ANALYTICS_DIR/<version>/. It then points
+ANALYTICS_DIR/CURRENT at the new version. Classes are dictionary-encoded:
+class_code indexes meta.json["classes"]. Every worker opens the arrays with
+np.load(mmap_mode="r"), so aggregates read shared page-cache pages instead
+of per-process copies, and chart requests never touch SQLite.
+"""
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+try:
+    import fcntl  # POSIX only; without it every worker may rebuild
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger("analytics")
+
+ANALYTICS_DIR = os.environ.get("ANALYTICS_DIR", "./analytics_snapshots")
+REFRESH_SECONDS = int(os.environ.get("ANALYTICS_REFRESH_SECONDS", "900"))
+READ_BATCH = 50000
+KEEP_SNAPSHOTS = 2
+
+METRICS = (
+    "height", "weight", "bmi", "vertical_jump", "broad_jump", "flying_10", "track_interval",
+    "hang_clean", "bench", "back_squat", "front_squat", "balance_left", "balance_right",
+    "jump_force", "air_time", "workout_consistency",
+)
+
+# table -> (query, [(column, dtype)]) ; NULLs arrive as NaN and are mapped per dtype below
+EXPORTS = {
+    "submissions": ("""
+        SELECT s.id, s.student_id, s.form_id, f.class_id,
+               CAST(strftime('%s', s.submitted_at) AS INTEGER),
+               s.completed, s.graded, s.late, s.student_rating, s.teacher_rating
+        FROM submissions s
+                 JOIN forms f ON f.id = s.form_id
+        ORDER BY s.id
+    """, [("id", np.int64), ("student_id", np.int64), ("form_id", np.int64), ("class_id", np.int64),
+          ("submitted_at", np.int64), ("completed", np.int8), ("graded", np.int8), ("late", np.int8),
+          ("student_rating", np.float32), ("teacher_rating", np.float32)]),
+    "statistics": ("SELECT student_id, " + ", ".join(METRICS) + " FROM student_statistics ORDER BY student_id",
+                   [("student_id", np.int64)] + [(m, np.float32) for m in METRICS]),
+    "roster": ("""
+        SELECT DISTINCT student_id, class_id FROM teacher_students
+        WHERE class_id IS NOT NULL
+        ORDER BY class_id, student_id
+    """, [("student_id", np.int64), ("class_id", np.int64)]),
+}
+
+
+def _read_columns(conn, sql, columns) -> Dict[str, np.ndarray]:
+    """Read a query in batches into one typed array per column."""
+    chunks = []
+    cur = conn.execute(sql)
+    while True:
+        rows = cur.fetchmany(READ_BATCH)
+        if not rows:
+            break
+        chunks.append(np.array(rows, dtype=np.float64).reshape(len(rows), len(columns)))
+    table = np.concatenate(chunks) if chunks else np.empty((0, len(columns)))
+
+    out = {}
+    for i, (name, dtype) in enumerate(columns):
+        col = table[:, i]
+        if np.issubdtype(dtype, np.integer):
+            col = np.where(np.isnan(col), -1, col)
+        out[name] = col.astype(dtype)
+    return out
+
+
+def lookup_positions(sorted_keys: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Index of each value in sorted_keys, or -1 where it is absent."""
+    if not len(sorted_keys):
+        return np.full(len(values), -1, dtype=np.int64)
+    pos = np.minimum(np.searchsorted(sorted_keys, values), len(sorted_keys) - 1)
+    return np.where(sorted_keys[pos] == values, pos, -1)
+
+
+def build_snapshot(db_file: str, root: str = ANALYTICS_DIR) -> str:
+    """Write a new snapshot version and atomically make it current. Returns its directory."""
+    now_ns = time.time_ns()
+    version = time.strftime("%Y%m%dT%H%M%S", time.gmtime(now_ns // 10**9)) + f".{now_ns % 10**9:09d}-{os.getpid()}"
+    target = os.path.join(root, version)
+    os.makedirs(target)
+
+    conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+    try:
+        tables = {name: _read_columns(conn, sql, cols) for name, (sql, cols) in EXPORTS.items()}
+        classes = conn.execute("SELECT id, name FROM classes ORDER BY id").fetchall()
+    finally:
+        conn.close()
+
+    # dictionary-encode class ids; -1 means "no class"
+    class_ids = np.array([c[0] for c in classes], dtype=np.int64)
+    for name in ("submissions", "roster"):
+        tables[name]["class_code"] = lookup_positions(class_ids, tables[name].pop("class_id")).astype(np.int32)
+
+    for name, cols in tables.items():
+        for col, arr in cols.items():
+            np.save(os.path.join(target, f"{name}.{col}.npy"), arr)
+    meta = {
+        "version": version,
+        "built_at": int(time.time()),
+        "rows": {name: int(len(next(iter(cols.values())))) for name, cols in tables.items()},
+        "classes": [{"id": c[0], "name": c[1]} for c in classes],
+        "metrics": list(METRICS),
+    }
+    with open(os.path.join(target, "meta.json"), "w") as f:
+        json.dump(meta, f)
+
+    pointer = os.path.join(root, "CURRENT")
+    with open(pointer + ".tmp", "w") as f:
+        f.write(version)
+    os.replace(pointer + ".tmp", pointer)
+
+    # drop old versions; workers that still map them keep their open files
+    versions = sorted(d for d in os.listdir(root) if os.path.isdir(os.path.join(root, d)))
+    for old in versions[:-KEEP_SNAPSHOTS]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    return target
+
+
+class Snapshot:
+    """Lazily memory-maps the columns of one snapshot version."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self._cols = {}
+
+    def col(self, table: str, name: str) -> np.ndarray:
+        key = f"{table}.{name}"
+        arr = self._cols.get(key)
+        if arr is None:
+            arr = self._cols[key] = np.load(os.path.join(self.path, key + ".npy"), mmap_mode="r")
+        return arr
+
+    def class_code(self, class_id: int) -> int:
+        for i, c in enumerate(self.meta["classes"]):
+            if c["id"] == class_id:
+                return i
+        return -2  # matches nothing, not even "no class"
+
+
+_current = {"version": None, "snapshot": None, "checked": 0.0}
+_current_lock = threading.Lock()
+
+
+def current_snapshot(root: str = ANALYTICS_DIR, recheck_seconds: float = 5.0) -> Optional[Snapshot]:
+    """The newest snapshot, re-reading the CURRENT pointer at most every few seconds."""
+    now = time.monotonic()
+    with _current_lock:
+        if _current["snapshot"] is not None and now - _current["checked"] < recheck_seconds:
+            return _current["snapshot"]
+        _current["checked"] = now
+        try:
+            with open(os.path.join(root, "CURRENT")) as f:
+                version = f.read().strip()
+        except OSError:
+            return None
+        if version != _current["version"]:
+            _current["snapshot"] = Snapshot(os.path.join(root, version))
+            _current["version"] = version
+        return _current["snapshot"]
+
+
+# ---------- Aggregates ----------
+BUCKET_SECONDS = {"day": 86400, "week": 7 * 86400}
+
+
+def participation(snap: Snapshot, bucket: str = "week", class_id: Optional[int] = None) -> dict:
+    """Completed submissions and distinct active students per time bucket."""
+    ts = snap.col("submissions", "submitted_at")
+    mask = (snap.col("submissions", "completed") == 1) & (ts >= 0)
+    if class_id is not None:
+        mask &= snap.col("submissions", "class_code") == snap.class_code(class_id)
+
+    size = BUCKET_SECONDS[bucket]
+    buckets = ts[mask] // size
+    students = snap.col("submissions", "student_id")[mask]
+    if not len(buckets):
+        return {"bucket": bucket, "labels": [], "submissions": [], "activeStudents": []}
+
+    labels, sub_counts = np.unique(buckets, return_counts=True)
+    pairs = np.unique(np.stack([buckets, students], axis=1), axis=0)
+    _, active_counts = np.unique(pairs[:, 0], return_counts=True)
+    return {
+        "bucket": bucket,
+        "labels": [time.strftime("%Y-%m-%d", time.gmtime(int(b) * size)) for b in labels],
+        "submissions": sub_counts.tolist(),
+        "activeStudents": active_counts.tolist(),
+    }
+
+
+def distribution(snap: Snapshot, metric: str, by: str = "class", bins: int = 10) -> dict:
+    """Summary statistics and a shared-edge histogram of `metric`, overall or per class."""
+    stat_ids = snap.col("statistics", "student_id")
+    values = snap.col("statistics", metric)
+    present = ~np.isnan(values)
+    if not present.any():
+        return {"metric": metric, "groups": []}
+    edges = np.histogram_bin_edges(values[present], bins=bins)
+
+    def summarize(vals):
+        vals = vals[~np.isnan(vals)]
+        if not len(vals):
+            return None
+        q = np.percentile(vals, [0, 25, 50, 75, 100])
+        return {
+            "count": int(len(vals)), "mean": round(float(vals.mean()), 3),
+            "min": float(q[0]), "p25": float(q[1]), "median": float(q[2]), "p75": float(q[3]), "max": float(q[4]),
+            "histogram": np.histogram(vals, bins=edges)[0].tolist(),
+        }
+
+    groups = []
+    if by == "class":
+        roster_students = snap.col("roster", "student_id")
+        roster_codes = snap.col("roster", "class_code")
+        # join roster -> statistics by student id (statistics is sorted by student_id)
+        pos = lookup_positions(stat_ids, roster_students)
+        joined_vals = np.where(pos >= 0, values[np.maximum(pos, 0)], np.nan)
+        order = np.argsort(roster_codes, kind="stable")
+        codes_sorted = roster_codes[order]
+        uniq, starts = np.unique(codes_sorted, return_index=True)
+        ends = np.r_[starts[1:], len(codes_sorted)]
+        for code, s, e in zip(uniq, starts, ends):
+            if code < 0:
+                continue
+            summary = summarize(joined_vals[order[s:e]])
+            if summary:
+                cls = snap.meta["classes"][code]
+                groups.append({"classId": cls["id"], "className": cls["name"], **summary})
+    else:
+        groups.append({"classId": None, "className": "All students", **summarize(values)})
+
+    return {"metric": metric, "binEdges": edges.tolist(), "groups": groups}
+
+
+class SnapshotBuilder:
+    """Rebuilds the snapshot every REFRESH_SECONDS; with several workers only the lock holder builds."""
+
+    def __init__(self, db_file: str, root: str = ANALYTICS_DIR, interval: float = REFRESH_SECONDS):
+        self.db_file = db_file
+        self.root = root
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _stale(self) -> bool:
+        try:
+            return time.time() - os.path.getmtime(os.path.join(self.root, "CURRENT")) >= self.interval
+        except OSError:
+            return True
+
+    def build_if_stale(self, wait: bool = False):
+        """Build unless fresh; with wait=True block on a concurrent build instead of skipping."""
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, ".lock"), "w") as lock:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | (0 if wait else fcntl.LOCK_NB))
+                except OSError:
+                    return None  # another worker is building
+            if self._stale():
+                return build_snapshot(self.db_file, self.root)
+        return None
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.build_if_stale()
+            except Exception:
+                logger.exception("Analytics snapshot build failed")
+            self._stop.wait(min(self.interval, 60))
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="analytics-snapshots", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+if __name__ == "__main__":
+    import sys
+    print("Snapshot written to", build_snapshot(sys.argv[1] if len(sys.argv) > 1 else "fitness_app.db"))
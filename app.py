@@ -2,15 +2,78 @@
 import os
 import csv
 import io
+import json
+import logging
+import mimetypes
 import sqlite3
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, g
+import time
+from functools import wraps
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, g, make_response, send_from_directory
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 from datetime import datetime, timedelta
 
+from models import DEVICE, build_wrappers
+from utils import openrouter_explain, allowed_file as allowed_media_file
+from http_cache import (
+    VERSIONED_TABLES,
+    version_trigger_sql,
+    table_versions,
+    make_etag,
+    compress_response,
+)
+from reminders import DeadlineScheduler, parse_due_date
+from analytics import METRICS, SnapshotBuilder, current_snapshot, participation, distribution
+from exports import DATASETS, EXPORT_FORMATS, stream_export
+from progress import record_completion
+from achievements import check as check_achievements
+from measurements import METRIC_UNITS, ingest as ingest_measurements, parse_value, record_history
+from form_stats import form_stats_trigger_sql, recompute as recompute_form_stats
+from reflections import ReflectionIndex, top_terms
+from timeline import DEFAULT_PAGE_SIZE as FEED_PAGE_SIZE, MAX_PAGE_SIZE as FEED_MAX_PAGE, Timeline
+from series import MAX_WIDTH, METHODS as SERIES_METHODS, MIN_WIDTH, SeriesCache
+from roster import DEFAULT_PAGE_SIZE, KINDS as ROSTER_KINDS, SORTS as ROSTER_SORTS, fetch_page as fetch_roster_page
+from profiles import STAT_COLUMNS, ProfileCache, profile_version_trigger_sql
+from store import StoreSessionInterface, make_store
+from admission import Overloaded, build_gates
+from model_registry import ModelRegistry
+from inference import InferenceClient, InferenceUnavailable
+from metrics import (
+    REGISTRY, ACTIVITY_LOG_WRITES, DB_CONNECTIONS, DB_QUERIES, DB_TIME, HTTP_LATENCY, HTTP_RESPONSES,
+    MODEL_FAILURES, MODEL_INFERENCE,
+)
+from profiler import MODES as PROFILE_MODES, PROFILE_DIR, RequestProfile, list_profiles, profile_path, should_sample
+from sqltrace import SQL_TRACE, SLOW_REQUEST_MS, TracingConnection, compact, explain, server_timing
+from assets import DIST_DIR, IMMUTABLE_CACHE_CONTROL, load_manifest, precompressed_variant
+
 # Configuration
+SECRET_KEY_FILE = os.environ.get("FLASK_SECRET_FILE", os.path.join("instance", "secret_key"))
+
+def load_secret_key(path=SECRET_KEY_FILE):
+    """
+    FLASK_SECRET if set, otherwise a key persisted at `path` (created on first use),
+    so every worker process and every restart signs sessions with the same key.
+    """
+    if os.environ.get("FLASK_SECRET"):
+        return os.environ["FLASK_SECRET"]
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(path, "rb") as f:
+            return f.read()
+    with os.fdopen(fd, "wb") as f:
+        key = os.urandom(32)
+        f.write(key)
+    return key
+
 app = Flask(__name__)
-app.secret_key = os.environ.get("FLASK_SECRET") or os.urandom(24)
+app.secret_key = load_secret_key()
+
+# Sessions, role lookups and caches shared by every worker (see store.py)
+shared_store = make_store()
+app.session_interface = StoreSessionInterface(shared_store)
+ROLE_CACHE_TTL = 300
 
 DB_FILE = "fitness_app.db"
 ADMIN_EMAIL = "elay@micds.org"
@@ -22,8 +85,13 @@ TEACHER_PASSWORD_PLAIN = "teacherrights"
 def get_db():
     db = getattr(g, "_database", None)
     if db is None:
-        db = g._database = sqlite3.connect(DB_FILE, detect_types=sqlite3.PARSE_DECLTYPES)
+        if SQL_TRACE:
+            db = sqlite3.connect(DB_FILE, detect_types=sqlite3.PARSE_DECLTYPES, factory=TracingConnection)
+        else:
+            db = sqlite3.connect(DB_FILE, detect_types=sqlite3.PARSE_DECLTYPES)
         db.row_factory = sqlite3.Row
+        g._database = db
+        DB_CONNECTIONS.inc("opened")
     return db
 
 @app.teardown_appcontext
@@ -31,15 +99,48 @@ def close_connection(exception):
     db = getattr(g, "_database", None)
     if db is not None:
         db.close()
+        DB_CONNECTIONS.inc("closed")
 
 def dict_from_row(row):
     return dict(row) if row else None
 
+@app.before_request
+def sync_shared_store():
+    shared_store.sync()
+
+def current_role():
+    """
+    Role of the signed-in user, read through the shared store rather than the
+    session so that /admin/change_role takes effect on sessions already open.
+    """
+    user_id = session.get("user_id")
+    if user_id is None:
+        return None
+    role = shared_store.get(f"role:{user_id}")
+    if role is None:
+        row = get_db().execute("SELECT role FROM users WHERE id = ?", (user_id,)).fetchone()
+        role = row["role"] if row else ""
+        shared_store.set(f"role:{user_id}", role, ttl=ROLE_CACHE_TTL)
+    return role or None
+
 def is_admin():
-    return session.get("role") == "admin"
+    return current_role() == "admin"
+
+def require_admin():
+    if not is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+    return None
+
+def require_login():
+    if 'user_id' not in session:
+        return jsonify({"error": "Unauthorized"}), 403
+    return None
 
-def log_activity(action, detail="", user_id=None):
-    """Insert an entry into activity_logs for audit trail."""
+def log_activity(action, detail="", user_id=None, commit=True):
+    """
+    Insert an entry into activity_logs for audit trail.
+    Pass commit=False to make the entry part of the caller's open transaction.
+    """
     try:
         db = get_db()
         cur = db.cursor()
@@ -47,14 +148,156 @@ def log_activity(action, detail="", user_id=None):
                     INSERT INTO activity_logs (action, detail, user_id, created_at)
                     VALUES (?, ?, ?, ?)
                     """, (action, detail, user_id, datetime.utcnow()))
-        db.commit()
+        if commit:
+            db.commit()
+        ACTIVITY_LOG_WRITES.inc("ok")
     except Exception as e:
+        ACTIVITY_LOG_WRITES.inc("error")
         app.logger.warning("Failed to write activity log: %s", e)
 
 
+def conditional_json(*tables, ttl=None, guard=None):
+    """
+    Serve a read route with an ETag derived from table_versions.
+    A matching If-None-Match is answered with 304 before the view runs.
+    `guard` is the view's access check (returns an error response or None)
+    and runs first, so a 304 is never given to a caller the view would
+    refuse. `ttl` (seconds) additionally rolls the ETag for views that
+    depend on the clock, e.g. "active in the last 7 days".
+    No Last-Modified is sent: table_versions.updated_at has one-second
+    resolution, so two writes within a second would share it.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if guard is not None:
+                refused = guard()
+                if refused: return refused
+            versions = table_versions(get_db(), tables)
+            parts = [request.full_path, session.get("user_id"), current_role()]
+            parts.extend((name, version) for name, version, _ in versions)
+            if ttl:
+                parts.append(int(time.time() // ttl))
+            etag = make_etag(parts)
+
+            if request.if_none_match.contains_weak(etag):
+                resp = app.response_class(status=304)
+            else:
+                resp = make_response(view(*args, **kwargs))
+                if resp.status_code != 200:
+                    return resp
+            resp.set_etag(etag, weak=True)
+            resp.headers["Cache-Control"] = "private, no-cache"
+            return resp
+        return wrapper
+    return decorator
+
+
+@app.after_request
+def compress_body(response):
+    return compress_response(response, request.accept_encodings)
+
+
+@app.before_request
+def start_request_timer():
+    g._request_started = time.perf_counter()
+
+
+@app.after_request
+def trace_sql(response):
+    """Server-Timing for every response; slow-request and N+1 warnings from the request's QueryStats."""
+    elapsed = time.perf_counter() - g.get("_request_started", time.perf_counter())
+    db = getattr(g, "_database", None)
+    stats = getattr(db, "stats", None)
+    if stats is None:
+        response.headers["Server-Timing"] = f"app;dur={elapsed * 1000:.2f}"
+        return response
+    response.headers["Server-Timing"] = server_timing(stats, elapsed)
+
+    for sql, count in stats.repeated():
+        app.logger.warning("Possible N+1 in %s %s: statement ran %d times: %s",
+                           request.method, request.path, count, compact(sql))
+    if elapsed * 1000 >= SLOW_REQUEST_MS:
+        lines = []
+        for sql, (count, seconds, params) in stats.slowest(3):
+            lines.append(f"  {seconds * 1000:.1f}ms x{count}  {compact(sql)}")
+            lines.extend(f"      plan: {step}" for step in explain(db, sql, params))
+        app.logger.warning("Slow request %s %s: %.0fms, %d queries, %.0fms in SQL\n%s",
+                           request.method, request.full_path, elapsed * 1000, stats.count,
+                           stats.seconds * 1000, "\n".join(lines))
+    return response
+
+
+@app.after_request
+def record_request_metrics(response):
+    elapsed = time.perf_counter() - g.get("_request_started", time.perf_counter())
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    HTTP_LATENCY.observe(elapsed, route, request.method)
+    HTTP_RESPONSES.inc(route, request.method, str(response.status_code))
+    stats = getattr(getattr(g, "_database", None), "stats", None)
+    if stats is not None:
+        DB_QUERIES.observe(stats.count, route)
+        DB_TIME.observe(stats.seconds, route)
+    return response
+
+
+@app.before_request
+def maybe_start_profile():
+    """Profile this request if an admin asked for it (X-Profile / ?_profile) or it was randomly sampled."""
+    requested = request.headers.get("X-Profile") or request.args.get("_profile")
+    if requested and is_admin():
+        g._profile = RequestProfile(requested if requested in PROFILE_MODES else "sample", "admin").start()
+    elif should_sample():
+        g._profile = RequestProfile("sample", "sampled").start()
+
+
+@app.after_request
+def finish_profile(response):
+    profile = g.pop("_profile", None)
+    if profile is not None:
+        meta = profile.finish({
+            "method": request.method, "path": request.full_path, "endpoint": request.endpoint,
+            "status": response.status_code, "userId": session.get("user_id"),
+        })
+        response.headers["X-Profile-Id"] = meta["id"]
+    return response
+
+
+# ---------- Static assets ----------
+def asset_url(filename):
+    """URL for a static file, preferring its fingerprinted build (see assets.py)."""
+    hashed = load_manifest().get(filename)
+    if hashed:
+        return url_for("hashed_asset", filename=hashed)
+    return url_for("static", filename=filename)
+
+app.jinja_env.globals["asset_url"] = asset_url
+
+
+@app.route("/assets/<path:filename>")
+def hashed_asset(filename):
+    """Serve a fingerprinted asset, using its precompressed sibling when accepted."""
+    encoding = precompressed_variant(DIST_DIR, filename, request.accept_encodings)
+    suffix = {"br": ".br", "gzip": ".gz"}.get(encoding, "")
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    resp = send_from_directory(DIST_DIR, filename + suffix, mimetype=mimetype)
+    if encoding:
+        resp.headers["Content-Encoding"] = encoding
+    resp.vary.add("Accept-Encoding")
+    resp.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    return resp
+
+
 # ================================================================
 # ===================== DATABASE INIT ============================
 # ================================================================
+def add_column_if_missing(c, table, column, decl):
+    """ALTER TABLE for databases created before `column` was added to the schema."""
+    existing = {r[1] for r in c.execute(f"PRAGMA table_info({table})")}
+    if column not in existing:
+        c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
 def init_db():
     """Initialize professional-grade fitness/education tracking database."""
     with sqlite3.connect(DB_FILE) as conn:
@@ -207,10 +450,19 @@ def init_db():
                                                                   student_id INTEGER NOT NULL,
                                                                   streak_count INTEGER DEFAULT 0,
                                                                   last_completed TIMESTAMP,
+                                                                  forms_completed INTEGER DEFAULT 0,
+                                                                  forms_on_time INTEGER DEFAULT 0,
                                                                   FOREIGN KEY(student_id) REFERENCES users(id)
                       )
                   """)
 
+        add_column_if_missing(c, "student_progress", "forms_completed", "INTEGER DEFAULT 0")
+        add_column_if_missing(c, "student_progress", "forms_on_time", "INTEGER DEFAULT 0")
+        if not c.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_student_progress_student'").fetchone():
+            # older databases may hold several rows per student; keep the newest so the unique index can be built
+            c.execute("DELETE FROM student_progress WHERE id NOT IN (SELECT MAX(id) FROM student_progress GROUP BY student_id)")
+        c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_student_progress_student ON student_progress(student_id)")
+
         # NOTIFICATIONS
         c.execute("""
                   CREATE TABLE IF NOT EXISTS notifications (
@@ -234,9 +486,12 @@ def init_db():
                                                            category TEXT DEFAULT 'student_achievement',
                                                            created_by INTEGER,
                                                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                                                           FOREIGN KEY(created_by) REFERENCES users(id)
+                                                           class_id INTEGER,
+                                                           FOREIGN KEY(created_by) REFERENCES users(id),
+                      FOREIGN KEY(class_id) REFERENCES classes(id)
                       )
                   """)
+        add_column_if_missing(c, "news_feed", "class_id", "INTEGER")  # NULL = the whole school
 
         # MESSAGES (for internal messenger)
         c.execute("""
@@ -264,6 +519,133 @@ def init_db():
                       )
                   """)
 
+        # TABLE VERSIONS (change counters backing ETags, bumped by triggers)
+        c.execute("""
+                  CREATE TABLE IF NOT EXISTS table_versions (
+                                                                name TEXT PRIMARY KEY,
+                                                                version INTEGER NOT NULL DEFAULT 0,
+                                                                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                  )
+                  """)
+        for table in VERSIONED_TABLES:
+            c.execute("INSERT OR IGNORE INTO table_versions (name) VALUES (?)", (table,))
+            for stmt in version_trigger_sql(table):
+                c.execute(stmt)
+
+        # PROFILE VERSIONS (per-student change counters for the profile cache)
+        c.execute("""
+                  CREATE TABLE IF NOT EXISTS profile_versions (
+                                                                  student_id INTEGER PRIMARY KEY,
+                                                                  version INTEGER NOT NULL DEFAULT 0
+                  )
+                  """)
+        for stmt in profile_version_trigger_sql():
+            c.execute(stmt)
+
+        # FORM STATS (per-form submission counts and rating sums, maintained by triggers; see form_stats.py)
+        c.execute("""
+                  CREATE TABLE IF NOT EXISTS form_stats (
+                                                            form_id INTEGER PRIMARY KEY,
+                                                            assigned INTEGER NOT NULL DEFAULT 0,
+                                                            submitted INTEGER NOT NULL DEFAULT 0,
+                                                            graded INTEGER NOT NULL DEFAULT 0,
+                                                            late INTEGER NOT NULL DEFAULT 0,
+                                                            student_rating_sum INTEGER NOT NULL DEFAULT 0,
+                                                            student_rating_count INTEGER NOT NULL DEFAULT 0,
+                                                            teacher_rating_sum INTEGER NOT NULL DEFAULT 0,
+                                                            teacher_rating_count INTEGER NOT NULL DEFAULT 0,
+                                                            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                                                            FOREIGN KEY(form_id) REFERENCES forms(id)
+                  )
+                  """)
+        stats_missing = c.execute("SELECT 1 FROM sqlite_master WHERE name = 'trg_form_stats_insert'").fetchone() is None
+        for stmt in form_stats_trigger_sql():
+            c.execute(stmt)
+
+        # PERSONAL BESTS / ACHIEVEMENT AWARDS (state of the automatic achievement rules; see achievements.py)
+        c.execute("""
+                  CREATE TABLE IF NOT EXISTS personal_bests (
+                                                                student_id INTEGER NOT NULL,
+                                                                metric TEXT NOT NULL,
+                                                                value REAL NOT NULL,
+                                                                set_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                                                                PRIMARY KEY(student_id, metric),
+                      FOREIGN KEY(student_id) REFERENCES users(id)
+                      )
+                  """)
+        c.execute("""
+                  CREATE TABLE IF NOT EXISTS achievement_awards (
+                                                                    student_id INTEGER NOT NULL,
+                                                                    rule TEXT NOT NULL,
+                                                                    awarded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                                                                    PRIMARY KEY(student_id, rule),
+                      FOREIGN KEY(student_id) REFERENCES users(id)
+                      )
+                  """)
+
+        # STAT MEASUREMENTS (every recorded value, newest last; student_statistics holds the current one)
+        c.execute("""
+                  CREATE TABLE IF NOT EXISTS stat_measurements (
+                                                                   id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                                                   student_id INTEGER NOT NULL,
+                                                                   metric TEXT NOT NULL,
+                                                                   value REAL NOT NULL,
+                                                                   measured_at TIMESTAMP NOT NULL,
+                                                                   recorded_by INTEGER,
+                                                                   FOREIGN KEY(student_id) REFERENCES users(id),
+                      FOREIGN KEY(recorded_by) REFERENCES users(id)
+                      )
+                  """)
+        # (student_id, metric) ends in the rowid, so chart caches read just the rows newer than theirs (see series.py)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_stat_measurements_student ON stat_measurements(student_id, metric)")
+        if c.execute("SELECT 1 FROM stat_measurements LIMIT 1").fetchone() is None:
+            # start each history with the current value, so charts aren't empty for stats recorded before it
+            for metric in METRIC_UNITS:
+                c.execute(f"""
+                          INSERT INTO stat_measurements (student_id, metric, value, measured_at)
+                          SELECT student_id, '{metric}', {metric}, COALESCE(updated_at, CURRENT_TIMESTAMP)
+                          FROM student_statistics WHERE {metric} IS NOT NULL
+                          """)
+
+        # FORM REMINDERS (idempotency markers for deadline reminders / late flags)
+        c.execute("""
+                  CREATE TABLE IF NOT EXISTS form_reminders (
+                                                                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                                                submission_id INTEGER NOT NULL,
+                                                                kind TEXT CHECK(kind IN ('reminder', 'late')) NOT NULL,
+                      batch_id TEXT NOT NULL,
+                      sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                      UNIQUE(submission_id, kind),
+                      FOREIGN KEY(submission_id) REFERENCES submissions(id)
+                      )
+                  """)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_form_reminders_batch ON form_reminders(batch_id)")
+
+        # REFLECTION VECTORS (hashed TF embeddings of student responses, see reflections.py)
+        c.execute("""
+                  CREATE TABLE IF NOT EXISTS reflection_vectors (
+                                                                    submission_id INTEGER PRIMARY KEY,
+                                                                    form_id INTEGER NOT NULL,
+                                                                    terms BLOB NOT NULL,
+                                                                    weights BLOB NOT NULL,
+                                                                    FOREIGN KEY(submission_id) REFERENCES submissions(id)
+                  )
+                  """)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_reflection_vectors_form ON reflection_vectors(form_id, submission_id)")
+
+        # INDEXES (pending-submission lookups and roster joins)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_submissions_form_completed ON submissions(form_id, completed, student_id)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_submissions_student_completed ON submissions(student_id, completed)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_teacher_students_class ON teacher_students(class_id, student_id)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_forms_class ON forms(class_id)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_forms_due ON forms(status, due_date)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_forms_teacher ON forms(teacher_id, id)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_news_feed_audience ON news_feed(class_id, created_at, id)")
+        # keyset pagination for the admin roster (see roster.py)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_users_role_id ON users(role, id)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_users_role_display ON users(role, COALESCE(name, email) COLLATE NOCASE, id)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_classes_name ON classes(name COLLATE NOCASE, id)")
+
         # SEED ADMIN (if not exists)
         c.execute("SELECT id FROM users WHERE email = ?", (ADMIN_EMAIL,))
         if not c.fetchone():
@@ -282,6 +664,9 @@ def init_db():
             conn.commit()
 
         conn.commit()
+        if stats_missing:
+            # first run with the form_stats triggers: fold in submissions written before they existed
+            recompute_form_stats(conn, apply=True)
 
 
 # ================================================================
@@ -299,6 +684,7 @@ def auth():
         user = c.fetchone()
 
         if user and check_password_hash(user["password"], password):
+            session.regenerate()  # never keep a session id that existed before authentication
             session['user_id'] = user["id"]
             session['email'] = email
             session['role'] = user["role"]
@@ -339,30 +725,32 @@ def admin_dashboard():
     if not is_admin():
         return redirect(url_for('auth'))
 
-    db = get_db()
-    c = db.cursor()
-    c.execute("SELECT id, name, email FROM users WHERE role='teacher'")
-    teachers = [dict(r) for r in c.fetchall()]
-
-    c.execute("SELECT id, name, email FROM users WHERE role='student'")
-    students = [dict(r) for r in c.fetchall()]
+    # the page is a shell; roster data is loaded page by page from /admin/roster
+    return render_template("admin.html")
 
-    c.execute("SELECT id, name, description FROM classes")
-    classes = [dict(r) for r in c.fetchall()]
 
-    # render your admin dashboard template (must exist under templates/)
-    return render_template(
-        "admin.html",
-        teachers=teachers,
-        students=students,
-        classes=classes
-    )
+# ---------------- ROSTER (keyset-paginated) ---------------- #
+@app.route('/admin/roster', methods=['GET'])
+@conditional_json("users", "classes", "teacher_students", guard=require_admin)
+def admin_roster():
+    kind = request.args.get("kind", "classes")
+    sort = request.args.get("sort", "recent")
+    if kind not in ROSTER_KINDS or sort not in ROSTER_SORTS:
+        return jsonify({"error": f"kind must be one of {list(ROSTER_KINDS)}, sort one of {list(ROSTER_SORTS)}"}), 400
+    try:
+        page = fetch_roster_page(get_db(), kind, sort,
+                                 q=(request.args.get("q") or "").strip(),
+                                 limit=request.args.get("limit", DEFAULT_PAGE_SIZE, type=int),
+                                 cursor=request.args.get("cursor") or None)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(page)
 
 
 # ---------------- ADD TEACHER/STUDENT ---------------- #
 @app.route('/admin/add_user', methods=['POST'])
 def add_user():
-    if session.get('role') != 'admin':
+    if not is_admin():
         return jsonify({"error": "Unauthorized"}), 403
 
     data = request.get_json()
@@ -418,6 +806,7 @@ def change_role():
     try:
         c.execute("UPDATE users SET role = ? WHERE id = ?", (new_role, user["id"]))
         db.commit()
+        shared_store.delete(f"role:{user['id']}")
         log_activity("change_role", f"{user['email']} => {new_role}", user_id=session.get("user_id"))
         return jsonify({"message": "Role updated"})
     except Exception:
@@ -479,6 +868,7 @@ def assign_student():
 
 # ---------------- SEARCH ---------------- #
 @app.route("/admin/search")
+@conditional_json("users", guard=require_admin)
 def admin_search():
     qval=(request.args.get("q") or "").strip().lower()
     if not qval: return jsonify([])
@@ -571,14 +961,30 @@ def bulk_upload():
                     if not student_id or not form_id:
                         errors.append({"row": i, "error": "Missing student_id or form_id"})
                         continue
-                    # simple insertion: create a submission entry (ungraded/graded depending on grade)
+                    # fill the pending placeholder created at assignment, else create a submission entry
                     try:
                         submitted_at = datetime.utcnow()
                         graded = 1 if grade else 0
-                        cur.execute("""
-                                    INSERT INTO submissions (form_id, student_id, student_response, student_rating, submitted_at, graded, completed)
-                                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                                    """, (form_id, student_id, "", int(grade) if grade and grade.isdigit() else None, submitted_at, graded, 1 if grade else 0))
+                        values = ("", int(grade) if grade and grade.isdigit() else None, submitted_at, graded, 1 if grade else 0)
+                        cur.execute("SELECT id FROM submissions WHERE form_id = ? AND student_id = ? AND completed = 0 LIMIT 1",
+                                    (form_id, student_id))
+                        pending = cur.fetchone()
+                        if pending:
+                            sub_id = pending["id"]
+                            cur.execute("""
+                                        UPDATE submissions
+                                        SET student_response = ?, student_rating = ?, submitted_at = ?, graded = ?, completed = ?
+                                        WHERE id = ?
+                                        """, values + (sub_id,))
+                        else:
+                            cur.execute("""
+                                        INSERT INTO submissions (student_response, student_rating, submitted_at, graded, completed, form_id, student_id)
+                                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                                        """, values + (form_id, student_id))
+                            sub_id = cur.lastrowid
+                        if grade:
+                            record_completion(cur, sub_id)
+                            check_achievements(cur, int(student_id), ["completion"])
                         inserted += 1
                     except Exception as e:
                         errors.append({"row": i, "error": "Insert failed"})
@@ -705,10 +1111,8 @@ def post_message():
 
 # ---------------- ACTIVITY (pull recent) ---------------- #
 @app.route('/admin/activity', methods=['GET'])
+@conditional_json("activity_logs", guard=require_admin)
 def get_activity():
-    if not is_admin():
-        return jsonify({"error": "Unauthorized"}), 403
-
     limit = int(request.args.get('limit', 50))
     db = get_db()
     c = db.cursor()
@@ -719,10 +1123,8 @@ def get_activity():
 
 # ---------------- STATS (for rings) ---------------- #
 @app.route('/admin/stats', methods=['GET'])
+@conditional_json("users", "submissions", "forms", ttl=300, guard=require_admin)
 def admin_stats():
-    if not is_admin():
-        return jsonify({"error": "Unauthorized"}), 403
-
     db = get_db()
     c = db.cursor()
 
@@ -773,12 +1175,101 @@ def admin_stats():
 
     return jsonify(stats)
 
+# ---------------- EXPORT (streaming CSV / NDJSON) ---------------- #
+def export_response(teacher_id=None):
+    """Stream ?dataset=submissions|statistics as ?format=csv|ndjson."""
+    dataset = request.args.get("dataset", "submissions")
+    fmt = request.args.get("format", "csv")
+    if dataset not in DATASETS or fmt not in EXPORT_FORMATS:
+        return jsonify({"error": "Unknown dataset or format"}), 400
+
+    stamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+    resp = app.response_class(stream_export(DB_FILE, dataset, fmt, teacher_id), mimetype=EXPORT_FORMATS[fmt])
+    resp.headers["Content-Disposition"] = f'attachment; filename="{dataset}-{stamp}.{fmt}"'
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+
+@app.route('/admin/export', methods=['GET'])
+def admin_export():
+    if not is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+    log_activity("export", f"{request.args.get('dataset', 'submissions')} ({request.args.get('format', 'csv')})",
+                 user_id=session.get("user_id"))
+    return export_response()
+
+# ---------------- ANALYTICS (columnar snapshots) ---------------- #
+snapshot_builder = None
+
+def start_snapshot_builder():
+    """Periodically rebuild the memory-mapped analytics snapshot (see analytics.py)."""
+    global snapshot_builder
+    if snapshot_builder is None:
+        snapshot_builder = SnapshotBuilder(DB_FILE).start()
+    return snapshot_builder
+
+
+def analytics_snapshot():
+    snap = current_snapshot()
+    if snap is None:
+        SnapshotBuilder(DB_FILE).build_if_stale(wait=True)
+        snap = current_snapshot(recheck_seconds=0)
+    return snap
+
+
+@app.route('/admin/analytics/participation', methods=['GET'])
+def admin_analytics_participation():
+    if not is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+
+    bucket = request.args.get("bucket", "week")
+    class_id = request.args.get("classId", type=int)
+    if bucket not in ("day", "week"):
+        return jsonify({"error": "bucket must be day or week"}), 400
+
+    snap = analytics_snapshot()
+    if snap is None:
+        return jsonify({"error": "Analytics snapshot unavailable"}), 503
+    result = participation(snap, bucket, class_id)
+    result["snapshot"] = snap.meta["version"]
+    return jsonify(result)
+
+
+@app.route('/admin/analytics/distribution', methods=['GET'])
+def admin_analytics_distribution():
+    if not is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+
+    metric = request.args.get("metric", "vertical_jump")
+    by = request.args.get("by", "class")
+    bins = min(max(request.args.get("bins", 10, type=int), 1), 100)
+    if metric not in METRICS or by not in ("class", "all"):
+        return jsonify({"error": "Unknown metric or grouping"}), 400
+
+    snap = analytics_snapshot()
+    if snap is None:
+        return jsonify({"error": "Analytics snapshot unavailable"}), 503
+    result = distribution(snap, metric, by, bins)
+    result["snapshot"] = snap.meta["version"]
+    return jsonify(result)
+
 # ================================================================
 # ====================== TEACHER API ROUTES ======================
 # ================================================================
 
+# ---------- Deadline reminders ----------
+deadline_scheduler = None
+
+def start_scheduler():
+    """Start the in-process deadline scheduler (safe to run in every worker)."""
+    global deadline_scheduler
+    if deadline_scheduler is None:
+        deadline_scheduler = DeadlineScheduler(DB_FILE).start()
+    return deadline_scheduler
+
+
 def require_teacher():
-    if session.get("role") != "teacher":
+    if current_role() != "teacher":
         return jsonify({"error": "Unauthorized"}), 403
     return None
 
@@ -787,10 +1278,8 @@ def require_teacher():
 # GET: Classes for logged-in teacher
 # ---------------------------------------------------------------
 @app.route("/api/teacher/classes")
+@conditional_json("classes", "teacher_students", guard=require_teacher)
 def api_teacher_classes():
-    unauthorized = require_teacher()
-    if unauthorized: return unauthorized
-
     teacher_id = session.get("user_id")
     db = get_db()
     c = db.cursor()
@@ -808,36 +1297,374 @@ def api_teacher_classes():
 
 
 # ---------------------------------------------------------------
-# POST: Assign a form to a class
+# GET: Forms for logged-in teacher, with precomputed grading counts
+# ---------------------------------------------------------------
+TEACHER_FORMS_PAGE = 50
+
+@app.route("/api/teacher/forms")
+@conditional_json("forms", "submissions", "classes", guard=require_teacher)
+def api_teacher_forms():
+    """Newest first; ?classId= filters, ?beforeId= continues from the previous page's last id."""
+    teacher_id = session.get("user_id")
+    limit = max(1, min(request.args.get("limit", TEACHER_FORMS_PAGE, type=int), 200))
+    where, params = ["f.teacher_id = ?"], [teacher_id]
+    if request.args.get("classId", type=int) is not None:
+        where.append("f.class_id = ?")
+        params.append(request.args.get("classId", type=int))
+    if request.args.get("beforeId", type=int) is not None:
+        where.append("f.id < ?")
+        params.append(request.args.get("beforeId", type=int))
+
+    rows = get_db().execute(f"""
+              SELECT f.id, f.class_id, c.name AS class_name, f.question, f.created_at, f.due_date, f.status,
+                     f.average_rating, st.assigned, st.submitted, st.graded, st.late,
+                     st.teacher_rating_sum, st.teacher_rating_count
+              FROM forms f
+                       LEFT JOIN classes c ON c.id = f.class_id
+                       LEFT JOIN form_stats st ON st.form_id = f.id
+              WHERE {' AND '.join(where)}
+              ORDER BY f.id DESC
+              LIMIT ?
+              """, params + [limit]).fetchall()
+
+    forms = []
+    for r in rows:
+        assigned, submitted, graded = r["assigned"] or 0, r["submitted"] or 0, r["graded"] or 0
+        forms.append({
+            "id": r["id"], "classId": r["class_id"], "className": r["class_name"], "question": r["question"],
+            "createdAt": r["created_at"], "dueDate": r["due_date"], "status": r["status"],
+            "assigned": assigned, "submitted": submitted, "pending": assigned - submitted,
+            "graded": graded, "ungraded": submitted - graded, "late": r["late"] or 0,
+            "averageRating": r["average_rating"],
+            "averageTeacherRating": (round(r["teacher_rating_sum"] / r["teacher_rating_count"], 2)
+                                     if r["teacher_rating_count"] else None),
+        })
+    return jsonify({"forms": forms, "nextBeforeId": forms[-1]["id"] if len(forms) == limit else None})
+
+
+# ---------------------------------------------------------------
+# GET: Export this teacher's submissions / student statistics
+# ---------------------------------------------------------------
+@app.route("/api/teacher/export")
+def api_teacher_export():
+    unauthorized = require_teacher()
+    if unauthorized: return unauthorized
+    return export_response(teacher_id=session.get("user_id"))
+
+
+# ---------------------------------------------------------------
+# POST: Assign a form to one or more classes
 # ---------------------------------------------------------------
 @app.route("/api/forms/assign", methods=["POST"])
 def api_assign_form():
+    """
+    Expects JSON like:
+      { "classIds": [1, 2], "question": "...", "dueDate": "2025-11-10" }
+    ("classId" is still accepted for a single class.) Creates one form per
+    class and a pending submission row for every rostered student.
+    """
     unauthorized = require_teacher()
     if unauthorized: return unauthorized
 
     data = request.get_json() or {}
     teacher_id = session.get("user_id")
 
-    class_id = data.get("classId")
+    class_ids = data.get("classIds") or ([data["classId"]] if data.get("classId") else [])
     question = (data.get("question") or "").strip()
-    due_date = data.get("dueDate")
 
-    if not class_id or not question:
-        return jsonify({"error": "classId and question required"}), 400
+    if not isinstance(class_ids, list):
+        return jsonify({"error": "classIds must be a list of class ids"}), 400
+    try:
+        if any(isinstance(cid, bool) for cid in class_ids):
+            raise TypeError
+        class_ids = sorted({int(cid) for cid in class_ids})
+    except (TypeError, ValueError):
+        return jsonify({"error": "classIds must be integers"}), 400
+    try:
+        due_date = parse_due_date(data.get("dueDate"))
+    except (TypeError, ValueError):
+        return jsonify({"error": "dueDate must be an ISO date"}), 400
+    if not class_ids or not question:
+        return jsonify({"error": "classIds and question required"}), 400
 
     db = get_db()
     c = db.cursor()
 
+    marks = ",".join("?" * len(class_ids))
+    c.execute(f"SELECT id FROM classes WHERE teacher_id = ? AND id IN ({marks})", (teacher_id, *class_ids))
+    owned = {r["id"] for r in c.fetchall()}
+    if owned != set(class_ids):
+        return jsonify({"error": "Classes not found for this teacher", "classIds": sorted(set(class_ids) - owned)}), 403
+
     try:
-        c.execute("""
-                  INSERT INTO forms (teacher_id, class_id, question, due_date, status)
-                  VALUES (?, ?, ?, ?, 'active')
-                  """, (teacher_id, class_id, question, due_date))
+        form_ids = []
+        for class_id in class_ids:
+            c.execute("""
+                      INSERT INTO forms (teacher_id, class_id, question, due_date, status)
+                      VALUES (?, ?, ?, ?, 'active')
+                      """, (teacher_id, class_id, question, due_date))
+            form_ids.append(c.lastrowid)
+
+        # one pending submission per rostered student, for all new forms at once
+        marks = ",".join("?" * len(form_ids))
+        c.execute(f"""
+                  INSERT INTO submissions (form_id, student_id, graded, late, completed)
+                  SELECT DISTINCT f.id, ts.student_id, 0, 0, 0
+                  FROM forms f
+                           JOIN teacher_students ts ON ts.class_id = f.class_id
+                  WHERE f.id IN ({marks})
+                  """, form_ids)
+        placeholders = c.rowcount
+
+        log_activity("assign_form", f"classes {class_ids} forms {form_ids} pending {placeholders}",
+                     user_id=teacher_id, commit=False)
+        db.commit()
+        if deadline_scheduler is not None:
+            deadline_scheduler.schedule(due_date)
+        return jsonify({"message": "Form assigned", "formIds": form_ids, "pending": placeholders})
+    except Exception:
+        db.rollback()
+        app.logger.exception("Assign form failed")
+        return jsonify({"error": "DB insert failed"}), 500
+
+
+# ---------------------------------------------------------------
+# GET: Students who still owe a response for a form
+# ---------------------------------------------------------------
+@app.route("/api/forms/<int:form_id>/pending")
+def api_form_pending(form_id):
+    unauthorized = require_teacher()
+    if unauthorized: return unauthorized
+
+    teacher_id = session.get("user_id")
+    db = get_db()
+    c = db.cursor()
+
+    c.execute("SELECT 1 FROM forms WHERE id = ? AND teacher_id = ?", (form_id, teacher_id))
+    if not c.fetchone():
+        return jsonify({"error": "Form not found"}), 404
+
+    c.execute("""
+              SELECT s.id AS submission_id, u.id, u.name, u.email, s.late
+              FROM submissions s
+                       JOIN users u ON u.id = s.student_id
+              WHERE s.form_id = ? AND s.completed = 0
+              ORDER BY u.name
+              """, (form_id,))
+    return jsonify([dict(r) for r in c.fetchall()])
+
+
+# ---------------------------------------------------------------
+# GET: Similar responses / response clusters for a form
+# ---------------------------------------------------------------
+reflection_index = ReflectionIndex()
+SIMILAR_MAX = 50
+
+
+def owned_form_or_404(form_id):
+    row = get_db().execute("SELECT 1 FROM forms WHERE id = ? AND teacher_id = ?",
+                           (form_id, session.get("user_id"))).fetchone()
+    return None if row else (jsonify({"error": "Form not found"}), 404)
+
+
+def submission_summaries(ids):
+    if not ids:
+        return {}
+    marks = ",".join("?" * len(ids))
+    rows = get_db().execute(f"""
+              SELECT s.id, s.student_id, COALESCE(u.name, u.email) AS name, s.student_response,
+                     s.student_rating, s.teacher_rating, s.graded
+              FROM submissions s
+                       JOIN users u ON u.id = s.student_id
+              WHERE s.id IN ({marks})
+              """, list(ids)).fetchall()
+    return {r["id"]: {"submissionId": r["id"], "studentId": r["student_id"], "name": r["name"],
+                      "response": r["student_response"], "studentRating": r["student_rating"],
+                      "teacherRating": r["teacher_rating"], "graded": bool(r["graded"])} for r in rows}
+
+
+@app.route("/api/forms/<int:form_id>/similar")
+def api_form_similar(form_id):
+    """?submissionId=<id> or ?q=<text>, plus optional &k= (default 10): the closest responses by cosine."""
+    unauthorized = require_teacher() or owned_form_or_404(form_id)
+    if unauthorized: return unauthorized
+
+    submission_id = request.args.get("submissionId", type=int)
+    q = (request.args.get("q") or "").strip()
+    k = max(1, min(request.args.get("k", 10, type=int), SIMILAR_MAX))
+    if submission_id is None and not q:
+        return jsonify({"error": "submissionId or q required"}), 400
+    try:
+        hits = reflection_index.similar(get_db(), form_id, submission_id=submission_id, text=q, k=k)
+    except KeyError:
+        return jsonify({"error": "Submission has no response in this form"}), 404
+
+    summaries = submission_summaries([sid for sid, _ in hits])
+    return jsonify([dict(summaries[sid], score=round(score, 4)) for sid, score in hits if sid in summaries])
+
+
+@app.route("/api/forms/<int:form_id>/clusters")
+def api_form_clusters(form_id):
+    """Groups of similar responses (?k= clusters, default about sqrt(n/2)), largest first."""
+    unauthorized = require_teacher() or owned_form_or_404(form_id)
+    if unauthorized: return unauthorized
+
+    k = request.args.get("k", type=int)
+    if k is not None and not 1 <= k <= 50:
+        return jsonify({"error": "k must be between 1 and 50"}), 400
+
+    start = time.perf_counter()
+    clusters = reflection_index.clusters(get_db(), form_id, k=k)
+    elapsed_ms = round((time.perf_counter() - start) * 1000, 2)
+
+    summaries = submission_summaries([sid for cl in clusters for sid in cl["submissionIds"]])
+    members = [[summaries[sid] for sid in cl["submissionIds"] if sid in summaries] for cl in clusters]
+    terms = top_terms([[m["response"] for m in group] for group in members])
+    return jsonify({
+        "formId": form_id,
+        "responses": sum(len(group) for group in members),
+        "clusterMs": elapsed_ms,
+        "clusters": [{"size": len(group), "terms": words, "cohesion": cl["cohesion"],
+                      "exemplar": summaries.get(cl["exemplarId"]), "members": group}
+                     for cl, group, words in zip(clusters, members, terms)],
+    })
+
+
+# ---------------------------------------------------------------
+# GET: Downsampled chart series of a student's / class's measurements
+# ---------------------------------------------------------------
+series_cache = SeriesCache()
+
+
+def series_args():
+    """(width, method, start, end) from the query string, or raise ValueError."""
+    width = min(max(request.args.get("width", 600, type=int), MIN_WIDTH), MAX_WIDTH)
+    method = request.args.get("method", "lttb")
+    if method not in SERIES_METHODS:
+        raise ValueError(f"method must be one of {list(SERIES_METHODS)}")
+    return width, method, parse_due_date(request.args.get("from")), parse_due_date(request.args.get("to"))
+
+
+@app.route("/api/students/<int:student_id>/series/<metric>", methods=["GET"])
+def api_student_series(student_id, metric):
+    role = current_role()
+    if role not in ("admin", "teacher") and not (role == "student" and session.get("user_id") == student_id):
+        return jsonify({"error": "Unauthorized"}), 403
+    if metric not in METRIC_UNITS:
+        return jsonify({"error": f"metric must be one of {list(METRIC_UNITS)}"}), 400
+    try:
+        width, method, start, end = series_args()
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    points = series_cache.query(get_db(), student_id, metric, width, method, start, end)
+    return jsonify({"studentId": student_id, "metric": metric, "unit": METRIC_UNITS[metric],
+                    "method": method, "width": width, **points})
+
+
+@app.route("/api/classes/<int:class_id>/series/<metric>", methods=["GET"])
+def api_class_series(class_id, metric):
+    if current_role() not in ("admin", "teacher"):
+        return jsonify({"error": "Unauthorized"}), 403
+    if metric not in METRIC_UNITS:
+        return jsonify({"error": f"metric must be one of {list(METRIC_UNITS)}"}), 400
+    try:
+        width, method, start, end = series_args()
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    db = get_db()
+    if not is_admin() and not db.execute("SELECT 1 FROM classes WHERE id = ? AND teacher_id = ?",
+                                         (class_id, session.get("user_id"))).fetchone():
+        return jsonify({"error": "Class not found"}), 404
+    members = db.execute("""
+                         SELECT DISTINCT ts.student_id, COALESCE(u.name, u.email) AS name
+                         FROM teacher_students ts
+                                  JOIN users u ON u.id = ts.student_id
+                         WHERE ts.class_id = ?
+                         ORDER BY ts.student_id
+                         """, (class_id,)).fetchall()
+    series = []
+    for m in members:
+        points = series_cache.query(db, m["student_id"], metric, width, method, start, end)
+        if points["rawPoints"]:
+            series.append({"studentId": m["student_id"], "name": m["name"], **points})
+    return jsonify({"classId": class_id, "metric": metric, "unit": METRIC_UNITS[metric],
+                    "method": method, "width": width, "series": series})
+
+
+# ---------------------------------------------------------------
+# GET/POST: News feed timeline (school-wide plus the reader's classes)
+# ---------------------------------------------------------------
+news_timeline = Timeline()
+
+
+def warm_timeline():
+    """Fill the feed buffers now (e.g. in the master before forking) rather than on the first read."""
+    with app.app_context():
+        news_timeline.warm(get_db())
+
+
+def feed_class_ids():
+    """Classes whose feed items the signed-in user sees; None means all of them (admins)."""
+    role, user_id = current_role(), session.get("user_id")
+    if role == "admin":
+        return None
+    if role == "teacher":
+        rows = get_db().execute("SELECT id FROM classes WHERE teacher_id = ?", (user_id,)).fetchall()
+    else:
+        rows = get_db().execute("SELECT DISTINCT class_id FROM teacher_students "
+                                "WHERE student_id = ? AND class_id IS NOT NULL", (user_id,)).fetchall()
+    return [r[0] for r in rows]
+
+
+@app.route("/api/feed", methods=["GET"])
+@conditional_json("news_feed", "classes", "teacher_students", guard=require_login)
+def api_feed():
+    limit = min(max(request.args.get("limit", FEED_PAGE_SIZE, type=int), 1), FEED_MAX_PAGE)
+    class_ids, school = feed_class_ids(), True
+    class_id = request.args.get("classId", type=int)
+    if class_id is not None:
+        if class_ids is not None and class_id not in class_ids:
+            return jsonify({"error": "Class not found"}), 404
+        class_ids, school = [class_id], False
+
+    try:
+        page = news_timeline.page(get_db(), class_ids, request.args.get("cursor"), limit, school)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(page)
+
+
+@app.route("/api/feed", methods=["POST"])
+def api_feed_post():
+    role = current_role()
+    if role not in ("admin", "teacher"):
+        return jsonify({"error": "Unauthorized"}), 403
+
+    data = request.get_json() or {}
+    title = (data.get("title") or "").strip()
+    description = (data.get("description") or "").strip()
+    category = (data.get("category") or "announcement").strip()
+    class_id = data.get("classId")
+    if not title:
+        return jsonify({"error": "title required"}), 400
+    if class_id is None and role != "admin":
+        return jsonify({"error": "classId required"}), 400
+    if class_id is not None and role != "admin" and class_id not in feed_class_ids():
+        return jsonify({"error": "Class not found"}), 404
+
+    db = get_db()
+    try:
+        cur = db.execute("INSERT INTO news_feed (title, description, category, created_by, class_id) "
+                         "VALUES (?, ?, ?, ?, ?)", (title, description, category, session.get("user_id"), class_id))
+        log_activity("feed_post", f"{'class ' + str(class_id) if class_id else 'school'}: {title}",
+                     user_id=session.get("user_id"), commit=False)
         db.commit()
-        log_activity("assign_form", f"class {class_id}", user_id=teacher_id)
-        return jsonify({"message": "Form assigned"})
+        return jsonify({"message": "Posted", "id": cur.lastrowid})
     except Exception:
         db.rollback()
+        app.logger.exception("Feed post failed")
         return jsonify({"error": "DB insert failed"}), 500
 
 
@@ -911,13 +1738,107 @@ def api_grade_submission():
 
 
 # ---------------------------------------------------------------
-# GET: Messenger threads list (students assigned to teacher)
+# POST: Grade many submissions in one transaction
 # ---------------------------------------------------------------
-@app.route("/api/messages/threads")
-def api_message_threads():
+BULK_GRADE_MAX = 500
+
+@app.route("/api/submissions/grade/bulk", methods=["POST"])
+def api_grade_submissions_bulk():
+    """
+    Expects JSON like:
+      { "grades": [ { "submissionId": 1, "rating": 3, "feedback": "..." },
+                    { "submissionId": 2, "rating": 4, "templateId": 7 } ] }
+    All entries are applied or none are.
+    """
     unauthorized = require_teacher()
     if unauthorized: return unauthorized
 
+    data = request.get_json() or {}
+    teacher_id = session.get("user_id")
+    entries = data.get("grades") or []
+
+    if not isinstance(entries, list) or not entries:
+        return jsonify({"error": "grades list required"}), 400
+    if len(entries) > BULK_GRADE_MAX:
+        return jsonify({"error": f"At most {BULK_GRADE_MAX} grades per request"}), 400
+
+    # validate shape; later entries for the same submission win
+    grades = {}
+    errors = []
+    for i, entry in enumerate(entries):
+        try:
+            sub_id = int(entry.get("submissionId"))
+            rating = int(entry.get("rating"))
+            template_id = int(entry["templateId"]) if entry.get("templateId") else None
+        except (TypeError, ValueError, AttributeError):
+            errors.append({"index": i, "error": "submissionId and rating required"})
+            continue
+        if not 1 <= rating <= 4:
+            errors.append({"index": i, "error": "rating must be between 1 and 4"})
+            continue
+        feedback = (entry.get("feedback") or "").strip()
+        grades[sub_id] = (rating, feedback, template_id)
+    if errors:
+        return jsonify({"error": "Invalid grades", "errors": errors}), 400
+
+    db = get_db()
+    c = db.cursor()
+
+    # resolve feedback templates (teacher's own only)
+    template_ids = {t for _, _, t in grades.values() if t}
+    templates = {}
+    if template_ids:
+        marks = ",".join("?" * len(template_ids))
+        c.execute(f"SELECT id, content FROM feedback_templates WHERE teacher_id = ? AND id IN ({marks})",
+                  (teacher_id, *template_ids))
+        templates = {r["id"]: r["content"] for r in c.fetchall()}
+        missing = sorted(template_ids - templates.keys())
+        if missing:
+            return jsonify({"error": "Unknown feedback templates", "templateIds": missing}), 400
+
+    # one set-based ownership check for every submission
+    marks = ",".join("?" * len(grades))
+    c.execute(f"""
+              SELECT s.id, s.completed
+              FROM submissions s
+                       JOIN forms f ON f.id = s.form_id
+              WHERE f.teacher_id = ? AND s.id IN ({marks})
+              """, (teacher_id, *grades.keys()))
+    found = c.fetchall()
+    owned = {r["id"] for r in found}
+    not_owned = sorted(grades.keys() - owned)
+    if not_owned:
+        return jsonify({"error": "Submissions not found for this teacher", "submissionIds": not_owned}), 403
+    # assignment creates pending rows up front; only completed ones can be graded
+    pending = sorted(r["id"] for r in found if not r["completed"])
+    if pending:
+        return jsonify({"error": "Invalid grades",
+                        "errors": [{"submissionId": sub_id, "error": "Submission not completed yet"}
+                                   for sub_id in pending]}), 400
+
+    rows = [(rating, templates[t] if t else feedback, sub_id)
+            for sub_id, (rating, feedback, t) in grades.items()]
+    try:
+        c.executemany("""
+                      UPDATE submissions
+                      SET teacher_rating = ?, teacher_feedback = ?, graded = 1
+                      WHERE id = ?
+                      """, rows)
+        log_activity("grade_submissions_bulk", f"{len(rows)} submissions", user_id=teacher_id, commit=False)
+        db.commit()
+        return jsonify({"message": f"{len(rows)} submissions graded", "graded": len(rows)})
+    except Exception:
+        db.rollback()
+        app.logger.exception("Bulk grading failed")
+        return jsonify({"error": "DB update failed"}), 500
+
+
+# ---------------------------------------------------------------
+# GET: Messenger threads list (students assigned to teacher)
+# ---------------------------------------------------------------
+@app.route("/api/messages/threads")
+@conditional_json("teacher_students", "users", guard=require_teacher)
+def api_message_threads():
     teacher_id = session.get("user_id")
     db = get_db()
     c = db.cursor()
@@ -1000,53 +1921,207 @@ def api_send_message():
 # ---------------------------------------------------------------
 @app.route("/api/stats/add", methods=["POST"])
 def api_stats_add():
-    unauthorized = require_teacher()
-    if unauthorized: return unauthorized
+    if current_role() not in ("admin", "teacher"):
+        return jsonify({"error": "Unauthorized"}), 403
 
     data = request.get_json() or {}
     student_id = data.get("studentId")
 
     if not student_id:
         return jsonify({"error": "studentId required"}), 400
+    try:
+        if isinstance(student_id, bool):
+            raise TypeError
+        student_id = int(student_id)
+    except (TypeError, ValueError):
+        return jsonify({"error": "studentId must be an integer"}), 400
+    if not is_admin() and not get_db().execute(
+            "SELECT 1 FROM teacher_students WHERE teacher_id = ? AND student_id = ?",
+            (session.get("user_id"), student_id)).fetchone():
+        return jsonify({"error": "Not linked to this student"}), 403
+
+    values = {}
+    for col in STAT_COLUMNS:
+        if col in data and col != "workout_consistency":  # consistency is derived from submissions
+            try:
+                values[col] = parse_value(col, data[col])  # same rules as a batch ingest
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
 
     db = get_db()
     c = db.cursor()
 
-    # Minimal insert/update example
+    try:
+        old = c.execute(f"SELECT {', '.join(STAT_COLUMNS)} FROM student_statistics WHERE student_id = ?",
+                        (student_id,)).fetchone()
+        cols = list(values) + ["updated_at"]
+        c.execute(f"""
+                  INSERT INTO student_statistics (student_id, {", ".join(cols)})
+                  VALUES (?, {", ".join("?" * len(cols))})
+                      ON CONFLICT(student_id) DO UPDATE SET {", ".join(f"{col}=excluded.{col}" for col in cols)}
+                  """, (student_id, *values.values(), datetime.utcnow()))
+        record_history(c, [(student_id, col, v, datetime.utcnow()) for col, v in values.items()
+                           if v is not None and col in METRIC_UNITS], session.get("user_id"))
+        awarded = check_achievements(c, student_id, list(values), dict(old) if old else {}, values)
+        db.commit()
+        return jsonify({"message": "Stats updated", "achievements": [a.title for a in awarded]})
+    except Exception:
+        db.rollback()
+        app.logger.exception("Stats update failed")
+        return jsonify({"error": "DB update failed"}), 500
+
+# ---------------------------------------------------------------
+# POST: Ingest a batch of measurements (JSON array or CSV)
+# ---------------------------------------------------------------
+@app.route("/api/stats/ingest", methods=["POST"])
+def api_stats_ingest():
+    if current_role() not in ("admin", "teacher"):
+        return jsonify({"error": "Unauthorized"}), 403
+
+    # JSON: [rows] or {"rows": [...], "units": {...}, "measuredAt": ...}; CSV: a file upload or a text/csv body
+    first_row = 2
+    if request.is_json:
+        data = request.get_json(silent=True)
+        if isinstance(data, list):
+            data = {"rows": data}
+        if not isinstance(data, dict) or not isinstance(data.get("rows"), list):
+            return jsonify({"error": "Expected a JSON array of rows or {\"rows\": [...]}"}), 400
+        rows, units, measured_at, first_row = data["rows"], data.get("units"), data.get("measuredAt"), 1
+        if not all(isinstance(r, dict) for r in rows):
+            return jsonify({"error": "Each row must be an object"}), 400
+    else:
+        file = request.files.get("file")
+        if file is not None and not allowed_file(file.filename):
+            return jsonify({"error": "Please upload a CSV file."}), 400
+        text = (file.stream.read() if file is not None else request.get_data()).decode("utf-8", errors="replace")
+        rows = list(csv.DictReader(io.StringIO(text)))
+        measured_at = request.values.get("measuredAt")
+        try:
+            units = json.loads(request.values.get("units") or "{}")
+        except ValueError:
+            return jsonify({"error": "units must be a JSON object"}), 400
+    if units is not None and not isinstance(units, dict):
+        return jsonify({"error": "units must be a JSON object"}), 400
+    if not rows:
+        return jsonify({"error": "No rows to ingest"}), 400
+
+    db = get_db()
+    c = db.cursor()
+    try:
+        result = ingest_measurements(c, rows, units=units, measured_at=parse_due_date(measured_at),
+                                     recorded_by=session.get("user_id"), first_row=first_row,
+                                     teacher_id=None if is_admin() else session.get("user_id"))
+    except (TypeError, ValueError) as e:
+        db.rollback()
+        return jsonify({"error": str(e)}), 400
+    except Exception:
+        db.rollback()
+        app.logger.exception("Measurement ingest failed")
+        return jsonify({"error": "DB update failed"}), 500
+    log_activity("stats_ingest", f"rows={len(rows)} students={result['students']} errors={len(result['errors'])}",
+                 user_id=session.get("user_id"), commit=False)
+    db.commit()
+
+    resp = {"message": f"Ingested {result['measurements']} measurements for {result['students']} students",
+            "students": result["students"], "measurements": result["measurements"],
+            "achievements": len(result["achievements"])}
+    if result["errors"]:
+        resp["errors"] = result["errors"]
+    return jsonify(resp)
+
+
+# ================================================================
+# ====================== STUDENT API ROUTES ======================
+# ================================================================
+
+# ---------------------------------------------------------------
+# POST: Submit a response to an assigned form
+# ---------------------------------------------------------------
+@app.route("/api/student/forms/submit", methods=["POST"])
+def api_student_submit_form():
+    if current_role() != "student":
+        return jsonify({"error": "Unauthorized"}), 403
+
+    data = request.get_json() or {}
+    student_id = session.get("user_id")
+
+    form_id = data.get("formId")
+    rating = data.get("rating")
+    text = (data.get("text") or "").strip()
+
+    try:
+        rating = int(rating) if rating not in (None, "") else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "rating must be a number"}), 400
+    if not form_id or (rating is not None and not 1 <= rating <= 4):
+        return jsonify({"error": "formId and a rating between 1 and 4 required"}), 400
+
+    db = get_db()
+    c = db.cursor()
+
+    c.execute("""
+              SELECT s.id, s.completed, s.late, f.due_date
+              FROM submissions s
+                       JOIN forms f ON f.id = s.form_id
+              WHERE s.form_id = ? AND s.student_id = ?
+              ORDER BY s.completed
+              LIMIT 1
+              """, (form_id, student_id))
+    sub = c.fetchone()
+    if not sub:
+        return jsonify({"error": "Form not assigned to you"}), 404
+    if sub["completed"]:
+        return jsonify({"error": "Form already submitted"}), 400
+
+    now = datetime.utcnow()
+    due = parse_due_date(sub["due_date"])
+    late = 1 if sub["late"] or (due is not None and now > due) else 0
+
     try:
         c.execute("""
-                  INSERT INTO student_statistics (student_id, updated_at)
-                  VALUES (?, ?)
-                      ON CONFLICT(student_id) DO UPDATE SET updated_at=excluded.updated_at
-                  """, (student_id, datetime.utcnow()))
+                  UPDATE submissions
+                  SET student_response = ?, student_rating = ?, submitted_at = ?, completed = 1, late = ?
+                  WHERE id = ?
+                  """, (text, rating, now, late, sub["id"]))
+        record_completion(c, sub["id"])
+        awarded = check_achievements(c, student_id, ["completion"])
+        log_activity("submit_form", f"form {form_id}", user_id=student_id, commit=False)
         db.commit()
-        return jsonify({"message": "Stats updated"})
+        return jsonify({"message": "Submitted", "late": bool(late), "achievements": [a.title for a in awarded]})
     except Exception:
         db.rollback()
+        app.logger.exception("Form submit failed")
         return jsonify({"error": "DB update failed"}), 500
 
-'''
-# app.py
-import os
-import io
-import json
-import time
-import logging
-from typing import Any, Dict
-from flask import Flask, request, jsonify, send_file, abort
-from werkzeug.utils import secure_filename
 
-from models import (
-    TrendEnsembleWrapper,
-    InjuryRiskWrapper,
-    TechniqueAnalysisWrapper,
-    WorkloadOptimizerWrapper,
-    RecoveryPredictorWrapper,
-    TalentScoutWrapper,
-    PersonalizedPlanWrapper,
-)
-from utils import openrouter_explain, allowed_file
+# ================================================================
+# ========================= PROFILE API ==========================
+# ================================================================
+profile_cache = ProfileCache(shared_store)
+
+
+@app.route("/api/profile/<int:profile_id>", methods=["GET"])
+def get_profile(profile_id: int):
+    role = current_role()
+    if role not in ("admin", "teacher") and not (role == "student" and session.get("user_id") == profile_id):
+        return jsonify({"error": "Unauthorized"}), 403
+
+    body, version = profile_cache.get(get_db(), profile_id)
+    if body is None:
+        return jsonify({"error": "Profile not found"}), 404
+
+    etag = f"profile-{profile_id}-{version}"
+    if request.if_none_match.contains_weak(etag):
+        resp = app.response_class(status=304)
+    else:
+        resp = app.response_class(body, mimetype="application/json")
+    resp.set_etag(etag, weak=True)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
 
+# ================================================================
+# ========================== MODEL API ===========================
+# ================================================================
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("profile-api")
 
@@ -1054,38 +2129,96 @@ logger = logging.getLogger("profile-api")
 UPLOAD_FOLDER = os.environ.get("UPLOAD_FOLDER", "./uploads")
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 app.config["MAX_CONTENT_LENGTH"] = 200 * 1024 * 1024  # 200MB for video uploads; adapt as needed
 
 # Instantiate lazy model wrappers (they'll load weights on first use)
-MODEL_WRAPPERS = {
-    "trend-ensemble": TrendEnsembleWrapper(),
-    "injury-risk": InjuryRiskWrapper(),
-    "technique-analysis": TechniqueAnalysisWrapper(),
-    "workload-optimizer": WorkloadOptimizerWrapper(),
-    "recovery-predictor": RecoveryPredictorWrapper(),
-    "talent-scout": TalentScoutWrapper(),
-    "personalized-plan": PersonalizedPlanWrapper(),
+MODEL_REGISTRY = ModelRegistry(device=DEVICE)
+MODEL_WRAPPERS = build_wrappers(MODEL_REGISTRY)
+
+# Per-worker admission limits; models not listed get admission.DEFAULT_* values
+MODEL_LIMITS = {
+    "technique-analysis": {"concurrency": 1, "queue_size": 4, "max_wait": 60.0},
 }
+MODEL_GATES = build_gates(MODEL_WRAPPERS, MODEL_LIMITS)
+
+# Inference-server mode: with INFERENCE_SOCKET set, models run in `python inference.py` worker processes
+INFERENCE_CLIENT = InferenceClient(os.environ["INFERENCE_SOCKET"]) if os.environ.get("INFERENCE_SOCKET") else None
+
+
+def run_wrapper(model_key, **kwargs):
+    if INFERENCE_CLIENT is not None:
+        return INFERENCE_CLIENT.run(model_key, **kwargs)
+    return MODEL_WRAPPERS[model_key].run(**kwargs)
+
+
+def admission_metrics():
+    stats = {key: gate.stats() for key, gate in MODEL_GATES.items()}
+    yield ("model_runs_active", "gauge", "Model runs executing in this worker",
+           [({"model": k}, s["active"]) for k, s in stats.items()])
+    yield ("model_queue_depth", "gauge", "Model runs waiting for a slot",
+           [({"model": k, "lane": lane}, n) for k, s in stats.items() for lane, n in s["queued"].items()])
+    yield ("model_admitted_total", "counter", "Model runs admitted",
+           [({"model": k}, s["admitted"]) for k, s in stats.items()])
+    yield ("model_shed_total", "counter", "Model requests rejected with 503",
+           [({"model": k, "reason": r}, n) for k, s in stats.items() for r, n in s["shed"].items()])
+    yield ("model_loaded", "gauge", "1 once the model's weights are in memory",
+           [({"model": k}, int(w.lazy.loaded)) for k, w in MODEL_WRAPPERS.items()])
+    status = MODEL_REGISTRY.status(MODEL_WRAPPERS)
+    yield ("model_resident_bytes", "gauge", "Resident memory of each loaded model in this worker",
+           [({"model": k, "version": s["loadedVersion"]}, s["residentBytes"]) for k, s in status.items() if s["loaded"]])
+    yield ("model_evictions_total", "counter", "Models evicted for idleness or the memory budget",
+           [({}, MODEL_REGISTRY.evictions)])
+
+
+REGISTRY.add_collector(admission_metrics)
+
+
+def request_lane():
+    """Teachers and admins go first; any caller may send X-Request-Priority: background for re-scoring jobs."""
+    if request.headers.get("X-Request-Priority", "").strip().lower() == "background":
+        return "background"
+    return "interactive" if current_role() in ("teacher", "admin") else "standard"
+
+
+def overloaded_response(exc):
+    logger.warning("Shed %s request (%s)", exc.model, exc.reason)
+    resp = jsonify({"error": "Model is busy, retry later", "model": exc.model, "reason": exc.reason})
+    resp.status_code = 503
+    resp.headers["Retry-After"] = str(exc.retry_after)
+    return resp
+
+
+def preload_models(keys=None):
+    """Load model weights now (e.g. in the master before forking) rather than on first request."""
+    if INFERENCE_CLIENT is not None:
+        logger.info("Models run in the inference server; nothing to preload")
+        return
+    MODEL_REGISTRY.hold_sweeper()  # the master forks after this; workers sweep their own copies
+    for key, wrapper in MODEL_WRAPPERS.items():
+        if keys is None or key in keys:
+            start = time.perf_counter()
+            wrapper.lazy.model
+            logger.info("Preloaded %s in %.2fs", key, time.perf_counter() - start)
+
+def profile_access_denied(profile_id):
+    """403 unless signed in as staff, or as the student who owns `profile_id`."""
+    if 'user_id' not in session:
+        return jsonify({"error": "Unauthorized"}), 403
+    if current_role() not in ("admin", "teacher") and session.get("user_id") != profile_id:
+        return jsonify({"error": "Unauthorized"}), 403
+    return None
 
-# === Example profile retrieval (replace with your DB queries) ===
-@app.route("/api/profile/<int:profile_id>", methods=["GET"])
-def get_profile(profile_id: int):
-    # MOCK: return example profile. Replace with DB lookup.
-    profile = {
-        "id": profile_id,
-        "displayName": "Alex Parker",
-        "classYear": "2026",
-        "summary": "Student-athlete passionate about track & field and strength training.",
-        "profilePic": None,
-        "sports": ["Track (Spring 2025)", "Soccer (Fall 2024)"],
-        "achievements": [{"id": 1, "title": "Player of the Week", "date": "2025-10-20"}],
-        "stats": {"vjump": 44, "broad": 195, "hangclean": 82, "bench": 90, "maxsprint": 8.4, "consistency": 86},
-        "history": [["2025-05-01", "vjump", 40], ["2025-07-01", "vjump", 42], ["2025-09-01", "vjump", 44]],
-        "badges": [{"id": "b1", "title": "Effort Badge"}],
-        "credits": 6,
-        "lastActive": "2025-11-08",
-    }
-    return jsonify(profile)
+
+def staff_profile_target(profile_id):
+    """(student row, None) for staff acting on a student's profile, else (None, error response)."""
+    if current_role() not in ("admin", "teacher"):
+        return None, (jsonify({"error": "Unauthorized"}), 403)
+    student = get_db().execute("SELECT id, COALESCE(name, email) AS name FROM users WHERE id = ? AND role = 'student'",
+                               (profile_id,)).fetchone()
+    if not student:
+        return None, (jsonify({"error": "Profile not found"}), 404)
+    return student, None
 
 
 # === Model-run entry point ===
@@ -1097,28 +2230,36 @@ def run_model(profile_id: int, model_key: str):
     Or multipart/form-data for file uploads (technique-analysis).
     The server calls the appropriate wrapper. Wrappers must be safe and CPU/GPU aware.
     """
+    denied = profile_access_denied(profile_id)  # before touching the (possibly large) upload
+    if denied: return denied
     wrapper = MODEL_WRAPPERS.get(model_key)
     if not wrapper:
         return jsonify({"error": "Unknown model key"}), 404
+    gate = MODEL_GATES[model_key]
 
     # dispatch to wrapper
     try:
+        gate.check()  # shed before accepting an upload we could not run
         if model_key == "technique-analysis":
             # file upload path (supports video upload)
             if "video" not in request.files:
                 return jsonify({"error": "Missing video file (form field 'video')"}), 400
             f = request.files["video"]
-            if f.filename == "" or not allowed_file(f.filename, ext_whitelist={"mp4", "mov", "mkv", "webm"}):
+            if f.filename == "" or not allowed_media_file(f.filename, ext_whitelist={"mp4", "mov", "mkv", "webm"}):
                 return jsonify({"error": "Invalid or missing video file"}), 400
             filename = secure_filename(f.filename)
             saved_path = os.path.join(app.config["UPLOAD_FOLDER"], f"{int(time.time())}_{filename}")
-            f.save(saved_path)
 
             # the wrapper handles reading the file, extracting frames / features, running model(s)
-            result = wrapper.run(profile_id=profile_id, video_path=saved_path, metadata=request.form.to_dict())
+            with gate.slot(request_lane()):
+                f.save(saved_path)  # only once admitted, so a shed request leaves nothing on disk
+                with MODEL_INFERENCE.time(model_key):
+                    result = run_wrapper(model_key, profile_id=profile_id, video_path=saved_path,
+                                         metadata=request.form.to_dict())
         else:
             payload = request.get_json(silent=True) or {}
-            result = wrapper.run(profile_id=profile_id, payload=payload)
+            with gate.slot(request_lane()), MODEL_INFERENCE.time(model_key):
+                result = run_wrapper(model_key, profile_id=profile_id, payload=payload)
 
         # optionally call OpenRouter for an explainability / summary pass:
         # Construct a short prompt summarizing outputs and ask OpenRouter for an
@@ -1134,14 +2275,108 @@ def run_model(profile_id: int, model_key: str):
 
         response = {"model": model_key, "summary": result.get("summary", ""), "confidence": result.get("confidence", None), "details": result.get("details", {}), "explain": explanation}
         return jsonify(response)
+    except Overloaded as e:
+        return overloaded_response(e)
+    except InferenceUnavailable as e:
+        logger.warning("Inference server unavailable for %s: %s", model_key, e)
+        resp = jsonify({"error": "Model service unavailable, retry later", "model": model_key})
+        resp.status_code = 503
+        resp.headers["Retry-After"] = "5"
+        return resp
     except Exception as e:
+        MODEL_FAILURES.inc(model_key)
         logger.exception("Model %s failed", model_key)
         return jsonify({"error": "model failure", "details": str(e)}), 500
 
 
+@app.route("/admin/profiles", methods=["GET"])
+def admin_profiles():
+    if not is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+    return jsonify(list_profiles(limit=request.args.get("limit", 50, type=int)))
+
+
+@app.route("/admin/profiles/<string:filename>", methods=["GET"])
+def admin_profile_file(filename):
+    if not is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+    path = profile_path(filename)
+    if path is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return send_from_directory(os.path.abspath(PROFILE_DIR), filename, as_attachment=True)
+
+
+@app.route("/admin/metrics", methods=["GET"])
+def admin_metrics():
+    """Prometheus text format. Scrapers authenticate with `Authorization: Bearer $METRICS_TOKEN`."""
+    token = os.environ.get("METRICS_TOKEN")
+    if not is_admin() and not (token and request.headers.get("Authorization") == f"Bearer {token}"):
+        return jsonify({"error": "Unauthorized"}), 403
+    return app.response_class(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/admin/models/admission", methods=["GET"])
+def model_admission_stats():
+    if not is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+    return jsonify({key: gate.stats() for key, gate in MODEL_GATES.items()})
+
+
+@app.route("/admin/models", methods=["GET"])
+def model_registry_status():
+    """Versions, residency and memory per model, as seen by the worker that answers."""
+    if not is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+    return jsonify({"pid": os.getpid(), **MODEL_REGISTRY.totals(),
+                    "models": MODEL_REGISTRY.status(MODEL_WRAPPERS)})
+
+
+@app.route("/admin/inference", methods=["GET"])
+def inference_status():
+    """Worker pool health of the inference server, or in-process mode."""
+    if not is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+    if INFERENCE_CLIENT is None:
+        return jsonify({"mode": "in-process"})
+    try:
+        return jsonify({"mode": "server", "socket": INFERENCE_CLIENT.address, **INFERENCE_CLIENT.stats()})
+    except InferenceUnavailable as e:
+        return jsonify({"mode": "server", "socket": INFERENCE_CLIENT.address, "error": str(e)}), 503
+
+
+@app.route("/admin/models/<string:model_key>/activate", methods=["POST"])
+def activate_model_version(model_key):
+    """Hot-swap: every worker loads the new version on the model's next use."""
+    if not is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+    if model_key not in MODEL_WRAPPERS:
+        return jsonify({"error": "Unknown model key"}), 404
+    version = (request.get_json(silent=True) or {}).get("version")
+    if not version:
+        return jsonify({"error": "version is required"}), 400
+    try:
+        MODEL_REGISTRY.activate(model_key, str(version))
+    except KeyError:
+        return jsonify({"error": f"{model_key} has no version {version}"}), 404
+    log_activity("model_activate", f"{model_key} -> {version}", user_id=session.get("user_id"))
+    return jsonify({"model": model_key, "activeVersion": version})
+
+
+@app.route("/admin/models/<string:model_key>/evict", methods=["POST"])
+def evict_model(model_key):
+    if not is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+    if model_key not in MODEL_WRAPPERS:
+        return jsonify({"error": "Unknown model key"}), 404
+    freed = MODEL_REGISTRY.evict(model_key)
+    return jsonify({"model": model_key, "evicted": freed is not None, "tensorBytes": freed or 0})
+
+
 # === Model detail endpoint ===
 @app.route("/api/profile/<int:profile_id>/models/<string:model_key>/detail", methods=["GET"])
 def model_detail(profile_id: int, model_key: str):
+    denied = profile_access_denied(profile_id)
+    if denied: return denied
     wrapper = MODEL_WRAPPERS.get(model_key)
     if not wrapper:
         return jsonify({"error": "Unknown model"}), 404
@@ -1156,57 +2391,95 @@ def model_detail(profile_id: int, model_key: str):
 # === Reporting / endorsements / edit / badge endpoints ===
 @app.route("/api/profile/<int:profile_id>/report", methods=["POST"])
 def report_profile(profile_id: int):
+    """Any signed-in user may flag a profile; every admin gets a notification."""
+    if 'user_id' not in session:
+        return jsonify({"error": "Unauthorized"}), 403
     data = request.get_json() or {}
-    text = data.get("text", "").strip()
+    text = (data.get("text") or "").strip()
     if not text:
         return jsonify({"error": "text required"}), 400
-    # TODO: store report in DB / ticketing system. Notify admin.
-    logger.info("REPORT for %s: %s", profile_id, text[:200])
-    return jsonify({"ok": True}), 200
+
+    db = get_db()
+    try:
+        admins = [r[0] for r in db.execute("SELECT id FROM users WHERE role = 'admin'")]
+        db.executemany("INSERT INTO notifications (user_id, type, title, message) VALUES (?, 'update', ?, ?)",
+                       [(a, f"Profile {profile_id} reported", text[:1000]) for a in admins])
+        log_activity("profile_report", f"profile {profile_id}: {text[:200]}", user_id=session.get("user_id"), commit=False)
+        db.commit()
+        return jsonify({"message": "Report sent"})
+    except Exception:
+        db.rollback()
+        app.logger.exception("Profile report failed")
+        return jsonify({"error": "DB insert failed"}), 500
+
+
+def notify_student(student_id, title, message, action):
+    """Notification to one student plus an activity log row, committed together."""
+    db = get_db()
+    try:
+        db.execute("INSERT INTO notifications (user_id, type, title, message) VALUES (?, 'update', ?, ?)",
+                   (student_id, title, message))
+        log_activity(action, f"student {student_id}: {message[:200]}", user_id=session.get("user_id"), commit=False)
+        db.commit()
+        return None
+    except Exception:
+        db.rollback()
+        app.logger.exception("%s failed", action)
+        return jsonify({"error": "DB insert failed"}), 500
 
 
 @app.route("/api/profile/<int:profile_id>/endorse", methods=["POST"])
 def endorse_profile(profile_id: int):
-    data = request.get_json() or {}
-    text = data.get("text", "").strip()
+    student, error = staff_profile_target(profile_id)
+    if error: return error
+    text = ((request.get_json() or {}).get("text") or "").strip()
     if not text:
         return jsonify({"error": "text required"}), 400
-    # TODO: persist endorsement in DB
-    logger.info("ENDORSE for %s: %s", profile_id, text[:200])
-    return jsonify({"ok": True}), 200
+    failed = notify_student(student["id"], "New endorsement", text[:1000], "profile_endorse")
+    return failed or jsonify({"message": "Endorsement sent"})
 
 
 @app.route("/api/profile/<int:profile_id>/edit-request", methods=["POST"])
 def edit_request(profile_id: int):
-    data = request.get_json() or {}
-    text = data.get("text", "").strip()
+    student, error = staff_profile_target(profile_id)
+    if error: return error
+    text = ((request.get_json() or {}).get("text") or "").strip()
     if not text:
         return jsonify({"error": "text required"}), 400
-    logger.info("EDIT REQUEST for %s: %s", profile_id, text[:200])
-    return jsonify({"ok": True}), 200
+    failed = notify_student(student["id"], "Profile edit requested", text[:1000], "profile_edit_request")
+    return failed or jsonify({"message": "Request sent"})
 
 
 @app.route("/api/profile/<int:profile_id>/badge", methods=["POST"])
 def award_badge(profile_id: int):
-    data = request.get_json() or {}
-    title = data.get("title", "").strip()
+    student, error = staff_profile_target(profile_id)
+    if error: return error
+    title = ((request.get_json() or {}).get("title") or "").strip()
     if not title:
         return jsonify({"error": "title required"}), 400
-    logger.info("AWARD BADGE for %s: %s", profile_id, title)
-    return jsonify({"ok": True}), 200
 
+    db = get_db()
+    try:
+        db.execute("INSERT INTO student_achievements (student_id, title, added_by) VALUES (?, ?, ?)",
+                   (student["id"], title, session.get("user_id")))
+        db.execute("INSERT INTO notifications (user_id, type, title, message) VALUES (?, 'achievement', ?, ?)",
+                   (student["id"], "Badge awarded", title))
+        log_activity("award_badge", f"student {student['id']}: {title}", user_id=session.get("user_id"), commit=False)
+        db.commit()
+        return jsonify({"message": "Badge awarded"})
+    except Exception:
+        db.rollback()
+        app.logger.exception("Badge award failed")
+        return jsonify({"error": "DB insert failed"}), 500
 
-# Optional: endpoint to stream model progress / logs (advanced)
-@app.route("/api/profile/<int:profile_id>/models/<string:model_key>/stream", methods=["GET"])
-def stream_model(profile_id: int, model_key: str):
-    # Implement SSE or WebSocket for real-time progress feedback if you want.
-    return jsonify({"error": "not implemented"}), 501
 
-'''
 # ================================================================
 # ===================== SERVER ENTRY =============================
 # ================================================================
 if __name__ == "__main__":
     init_db()
+    warm_timeline()
+    start_scheduler()
+    start_snapshot_builder()
     # run on 0.0.0.0 when in production behind reverse proxy; here keep debug for dev
     app.run(debug=True, host="127.0.0.1", port=5000)
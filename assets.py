@@ -0,0 +1,105 @@
+# assets.py
+"""
+Fingerprinted static asset build.
+
+Run `python assets.py` before deploying. Every file under static/ is copied to
+static/dist/ as <name>.<hash><ext>, text assets also get .gz/.br siblings, and
+static/dist/manifest.json maps original names to hashed names. Templates call
+asset_url('admin.js') and fall back to plain /static/ paths when no build exists.
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+from typing import Dict, Optional
+
+try:
+    import brotli  # optional; .br siblings are skipped when it is not installed
+except ImportError:
+    brotli = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST_NAME = "manifest.json"
+
+HASH_LENGTH = 12
+# Images and video are already compressed; precompressing them only wastes disk.
+PRECOMPRESS_EXTENSIONS = {".js", ".css", ".svg", ".json", ".html", ".txt", ".map"}
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_manifest_cache = {"mtime": None, "data": {}}
+
+
+def fingerprint(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            h.update(chunk)
+    return h.hexdigest()[:HASH_LENGTH]
+
+
+def hashed_name(rel_path: str, digest: str) -> str:
+    root, ext = os.path.splitext(rel_path)
+    return f"{root}.{digest}{ext}"
+
+
+def build_assets(static_dir: str = STATIC_DIR, dist_dir: str = DIST_DIR) -> Dict[str, str]:
+    """Rebuild dist_dir from static_dir and return the {original: hashed} manifest."""
+    if os.path.isdir(dist_dir):
+        shutil.rmtree(dist_dir)
+    os.makedirs(dist_dir)
+
+    manifest = {}
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != dist_dir]
+        for name in sorted(files):
+            src = os.path.join(root, name)
+            rel = os.path.relpath(src, static_dir).replace(os.sep, "/")
+            target_rel = hashed_name(rel, fingerprint(src))
+            target = os.path.join(dist_dir, target_rel)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(src, target)
+
+            if os.path.splitext(name)[1].lower() in PRECOMPRESS_EXTENSIONS:
+                with open(src, "rb") as f:
+                    data = f.read()
+                with open(target + ".gz", "wb") as f:
+                    f.write(gzip.compress(data, compresslevel=9))
+                if brotli is not None:
+                    with open(target + ".br", "wb") as f:
+                        f.write(brotli.compress(data, quality=11))
+            manifest[rel] = target_rel
+
+    with open(os.path.join(dist_dir, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(dist_dir: str = DIST_DIR) -> Dict[str, str]:
+    """Return the current manifest, re-reading it only when the file changes."""
+    path = os.path.join(dist_dir, MANIFEST_NAME)
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return {}
+    if _manifest_cache["mtime"] != mtime:
+        with open(path) as f:
+            _manifest_cache["data"] = json.load(f)
+        _manifest_cache["mtime"] = mtime
+    return _manifest_cache["data"]
+
+
+def precompressed_variant(dist_dir: str, hashed: str, accept_encodings) -> Optional[str]:
+    """Pick the best existing .br/.gz sibling the client accepts ('br', 'gzip' or None)."""
+    if accept_encodings["br"] and os.path.exists(os.path.join(dist_dir, hashed + ".br")):
+        return "br"
+    if accept_encodings["gzip"] and os.path.exists(os.path.join(dist_dir, hashed + ".gz")):
+        return "gzip"
+    return None
+
+
+if __name__ == "__main__":
+    built = build_assets()
+    print(f"Built {len(built)} assets into {DIST_DIR}")
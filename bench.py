@@ -0,0 +1,274 @@
+# bench.py
+"""
+End-to-end latency benchmark for the main routes.
+
+    python seed.py --db /tmp/bench.db --preset school --reset
+    python bench.py --db /tmp/bench.db --save-baseline baseline.json
+    python bench.py --db /tmp/bench.db --compare baseline.json        # exit 1 on regressions
+    python bench.py --db /tmp/bench.db --url http://127.0.0.1:8000 --concurrency 16
+
+By default, requests go through Flask's test client in this process. This
+measures the app and SQLite without network overhead. With --url the same
+scenarios go over HTTP to a running server (for example serve.py), which
+includes the worker model and the socket layer. Every scenario reports p50,
+p95 and p99 latency in ms, throughput, and the number of non-2xx/304
+responses. A saved baseline flags any scenario whose p95 regressed by more
+than --tolerance.
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import numpy as np
+
+SYNTHETIC_PASSWORD = "password123"
+MIN_REGRESSION_MS = 2.0  # ignore p95 changes smaller than this; sub-ms routes are noisy
+
+
+@dataclass
+class Scenario:
+    name: str
+    role: Optional[str]  # None = anonymous
+    method: str
+    path: str  # formatted with the context from pick_context()
+    body: Optional[Callable[[dict], dict]] = None  # -> {"json": ...} or {"csv": ...}
+    write: bool = False
+
+
+def _bulk_users_csv(ctx):
+    tag = uuid.uuid4().hex[:10]
+    rows = "\n".join(f"Bench {tag} {i},bench-{tag}-{i}@bench.example,student" for i in range(20))
+    return {"csv": "name,email,role\n" + rows + "\n"}
+
+
+SCENARIOS = [
+    Scenario("login_page", None, "GET", "/"),
+    Scenario("admin_dashboard", "admin", "GET", "/admin"),
+    Scenario("admin_stats", "admin", "GET", "/admin/stats"),
+    Scenario("admin_roster", "admin", "GET", "/admin/roster?kind=students&sort=alpha"),
+    Scenario("admin_search", "admin", "GET", "/admin/search?q=student1"),
+    Scenario("admin_activity", "admin", "GET", "/admin/activity?limit=50"),
+    Scenario("admin_export_statistics", "admin", "GET", "/admin/export?dataset=statistics&format=csv"),
+    Scenario("analytics_participation", "admin", "GET", "/admin/analytics/participation?bucket=week"),
+    Scenario("teacher_classes", "teacher", "GET", "/api/teacher/classes"),
+    Scenario("message_threads", "teacher", "GET", "/api/messages/threads"),
+    Scenario("message_thread", "teacher", "GET", "/api/messages/thread/{student_id}"),
+    Scenario("form_pending", "teacher", "GET", "/api/forms/{form_id}/pending"),
+    Scenario("profile", "teacher", "GET", "/api/profile/{student_id}"),
+    Scenario("send_message", "teacher", "POST", "/api/messages/send",
+             lambda ctx: {"json": {"studentId": ctx["student_id"], "content": "benchmark message"}}, write=True),
+    Scenario("bulk_upload_users", "admin", "POST", "/admin/bulk_upload", _bulk_users_csv, write=True),
+]
+
+
+def pick_context(db_file: str) -> dict:
+    """The busiest teacher, one of their students and one of their forms."""
+    conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+    try:
+        admin = conn.execute("SELECT id, email FROM users WHERE role = 'admin' ORDER BY id LIMIT 1").fetchone()
+        teacher = conn.execute("""
+            SELECT ts.teacher_id, u.email FROM teacher_students ts JOIN users u ON u.id = ts.teacher_id
+            GROUP BY ts.teacher_id ORDER BY COUNT(*) DESC LIMIT 1
+        """).fetchone()
+        if not admin or not teacher:
+            raise SystemExit(f"{db_file} has no admin or rostered teacher; run seed.py first")
+        student = conn.execute("SELECT u.id, u.email FROM teacher_students ts JOIN users u ON u.id = ts.student_id "
+                               "WHERE ts.teacher_id = ? ORDER BY u.id LIMIT 1", (teacher[0],)).fetchone()
+        form = conn.execute("SELECT id FROM forms WHERE teacher_id = ? ORDER BY id DESC LIMIT 1",
+                            (teacher[0],)).fetchone()
+    finally:
+        conn.close()
+    return {
+        "admin_id": admin[0], "admin_email": admin[1],
+        "teacher_id": teacher[0], "teacher_email": teacher[1],
+        "student_id": student[0], "student_email": student[1],
+        "form_id": form[0] if form else 0,
+    }
+
+
+# ---------- clients ----------
+class TestClientSession:
+    def __init__(self, app, role, ctx):
+        self.client = app.test_client()
+        if role:
+            with self.client.session_transaction() as s:
+                s["user_id"] = ctx[f"{role}_id"]
+                s["role"] = role
+
+    def request(self, method, path, body):
+        kwargs = {}
+        if body and "json" in body:
+            kwargs["json"] = body["json"]
+        elif body and "csv" in body:
+            import io
+            kwargs["data"] = {"type": "users", "file": (io.BytesIO(body["csv"].encode()), "bench.csv")}
+            kwargs["content_type"] = "multipart/form-data"
+        resp = self.client.open(path, method=method, **kwargs)
+        size = len(resp.get_data())  # drains streamed bodies too
+        return resp.status_code, size
+
+
+class HttpSession:
+    def __init__(self, base_url, role, ctx, admin_password):
+        self.base = base_url.rstrip("/")
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+        if role:
+            password = admin_password if role == "admin" else SYNTHETIC_PASSWORD
+            form = urllib.parse.urlencode({"email": ctx[f"{role}_email"], "password": password}).encode()
+            status, _ = self._send("POST", "/", form, {"Content-Type": "application/x-www-form-urlencoded"})
+            if status != 302:
+                raise SystemExit(f"Login as {ctx[f'{role}_email']} failed with status {status}")
+
+    def _send(self, method, path, data=None, headers=None):
+        req = urllib.request.Request(self.base + path, data=data, method=method, headers=headers or {})
+        try:
+            with self.opener.open(req) as resp:
+                return resp.status, len(resp.read())
+        except urllib.error.HTTPError as e:
+            return e.code, len(e.read())
+
+    def request(self, method, path, body):
+        if body and "json" in body:
+            return self._send(method, path, json.dumps(body["json"]).encode(), {"Content-Type": "application/json"})
+        if body and "csv" in body:
+            boundary = uuid.uuid4().hex
+            data = (f'--{boundary}\r\nContent-Disposition: form-data; name="type"\r\n\r\nusers\r\n'
+                    f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="bench.csv"\r\n'
+                    f'Content-Type: text/csv\r\n\r\n{body["csv"]}\r\n--{boundary}--\r\n').encode()
+            return self._send(method, path, data, {"Content-Type": f"multipart/form-data; boundary={boundary}"})
+        return self._send(method, path)
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+# ---------- runner ----------
+def run_scenario(scenario, make_session, ctx, requests, concurrency, warmup):
+    path = scenario.path.format(**ctx)
+    latencies, errors, lock = [], [0], threading.Lock()
+    counter = iter(range(requests))
+
+    def worker():
+        session = make_session(scenario.role)
+        for _ in range(warmup):
+            session.request(scenario.method, path, scenario.body(ctx) if scenario.body else None)
+        mine, bad = [], 0
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    break
+            body = scenario.body(ctx) if scenario.body else None
+            start = time.perf_counter()
+            status, _ = session.request(scenario.method, path, body)
+            mine.append(time.perf_counter() - start)
+            if not (200 <= status < 300 or status == 304):
+                bad += 1
+        with lock:
+            latencies.extend(mine)
+            errors[0] += bad
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    if not latencies:
+        return {"requests": 0, "errors": errors[0], "p50": 0.0, "p95": 0.0, "p99": 0.0, "mean": 0.0, "rps": 0.0}
+    ms = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"requests": len(ms), "errors": errors[0], "p50": round(float(p50), 2), "p95": round(float(p95), 2),
+            "p99": round(float(p99), 2), "mean": round(float(ms.mean()), 2), "rps": round(len(ms) / wall, 1)}
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, cur in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        limit = max(base["p95"] * (1 + tolerance), base["p95"] + MIN_REGRESSION_MS)
+        if cur["p95"] > limit:
+            regressions.append((name, base["p95"], cur["p95"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the app's routes and compare against a baseline.")
+    parser.add_argument("--db", default="fitness_app.db")
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process test client")
+    parser.add_argument("--admin-password", default=os.environ.get("BENCH_ADMIN_PASSWORD", "adminrights"))
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=3, help="unmeasured requests per thread")
+    parser.add_argument("--only", help="comma-separated scenario names")
+    parser.add_argument("--no-writes", action="store_true", help="skip scenarios that modify the database")
+    parser.add_argument("--save-baseline", metavar="FILE")
+    parser.add_argument("--compare", metavar="FILE")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 increase over the baseline")
+    args = parser.parse_args()
+
+    ctx = pick_context(args.db)
+    if args.url:
+        def make_session(role):
+            return HttpSession(args.url, role, ctx, args.admin_password)
+    else:
+        import app as webapp
+        webapp.DB_FILE = args.db
+
+        def make_session(role):
+            return TestClientSession(webapp.app, role, ctx)
+
+    selected = [s for s in SCENARIOS
+                if (not args.only or s.name in args.only.split(",")) and not (args.no_writes and s.write)]
+    results = {}
+    print(f"{'scenario':<26}{'p50':>9}{'p95':>9}{'p99':>9}{'req/s':>9}{'errors':>8}")
+    for scenario in selected:
+        r = results[scenario.name] = run_scenario(scenario, make_session, ctx, args.requests,
+                                                  args.concurrency, args.warmup)
+        print(f"{scenario.name:<26}{r['p50']:>9.2f}{r['p95']:>9.2f}{r['p99']:>9.2f}{r['rps']:>9.1f}{r['errors']:>8}",
+              flush=True)
+
+    report = {
+        "meta": {"db": os.path.abspath(args.db), "url": args.url, "requests": args.requests,
+                 "concurrency": args.concurrency, "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())},
+        "results": results,
+    }
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        for key in ("url", "concurrency"):
+            if baseline["meta"].get(key) != report["meta"][key]:
+                print(f"warning: baseline {key}={baseline['meta'].get(key)!r} differs from this run's "
+                      f"{report['meta'][key]!r}; latencies are not directly comparable")
+        regressions = compare(results, baseline, args.tolerance)
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: p95 {before:.2f}ms -> {after:.2f}ms")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against", args.compare)
+
+
+if __name__ == "__main__":
+    main()
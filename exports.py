@@ -0,0 +1,99 @@
+# exports.py
+"""
+Streaming CSV / NDJSON exports.
+
+Rows are read from a dedicated read-only connection in EXPORT_BATCH_SIZE
+fetchmany() batches and encoded one batch at a time, so memory stays flat
+no matter how many rows the export covers.
+"""
+import csv
+import io
+import json
+import sqlite3
+from typing import Iterator, Optional, Sequence
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+STAT_EXPORT_COLUMNS = (
+    "height", "weight", "bmi", "vertical_jump", "broad_jump", "flying_10", "track_interval",
+    "hang_clean", "bench", "back_squat", "front_squat", "balance_left", "balance_right",
+    "jump_force", "air_time", "workout_consistency",
+)
+
+# dataset -> (SELECT ... for everyone, extra WHERE for a teacher's scope)
+DATASETS = {
+    "submissions": ("""
+        SELECT s.id AS submission_id, s.form_id, f.class_id, c.name AS class_name, f.question,
+               s.student_id, u.name AS student_name, u.email AS student_email,
+               s.student_rating, s.student_response, s.teacher_rating, s.teacher_feedback,
+               s.submitted_at, s.completed, s.graded, s.late
+        FROM submissions s
+                 JOIN forms f ON f.id = s.form_id
+                 JOIN users u ON u.id = s.student_id
+                 LEFT JOIN classes c ON c.id = f.class_id
+        {where}
+        ORDER BY s.id
+    """, "WHERE f.teacher_id = ?"),
+    "statistics": ("""
+        SELECT st.student_id, u.name AS student_name, u.email AS student_email,
+               """ + ", ".join(f"st.{col}" for col in STAT_EXPORT_COLUMNS) + """,
+               p.streak_count, st.updated_at
+        FROM student_statistics st
+                 JOIN users u ON u.id = st.student_id
+                 LEFT JOIN student_progress p ON p.student_id = st.student_id
+        {where}
+        ORDER BY st.student_id
+    """, "WHERE st.student_id IN (SELECT student_id FROM teacher_students WHERE teacher_id = ?)"),
+}
+
+
+def open_readonly(db_file: str):
+    return sqlite3.connect(f"file:{db_file}?mode=ro", uri=True, check_same_thread=False)
+
+
+def iter_batches(db_file: str, dataset: str, teacher_id: Optional[int] = None,
+                 batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[Sequence]:
+    """Yield the column names, then lists of row tuples, closing the connection when done or abandoned."""
+    sql, scoped = DATASETS[dataset]
+    params = ()
+    if teacher_id is not None:
+        sql, params = sql.format(where=scoped), (teacher_id,)
+    else:
+        sql = sql.format(where="")
+
+    conn = open_readonly(db_file)
+    try:
+        cur = conn.execute(sql, params)
+        yield [d[0] for d in cur.description]
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
+
+def encode_csv(batches: Iterator[Sequence]) -> Iterator[str]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(next(batches))
+    for rows in batches:
+        writer.writerows(rows)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def encode_ndjson(batches: Iterator[Sequence]) -> Iterator[str]:
+    columns = next(batches)
+    for rows in batches:
+        yield "".join(json.dumps(dict(zip(columns, row)), default=str) + "\n" for row in rows)
+
+
+def stream_export(db_file: str, dataset: str, fmt: str, teacher_id: Optional[int] = None) -> Iterator[str]:
+    batches = iter_batches(db_file, dataset, teacher_id)
+    return encode_csv(batches) if fmt == "csv" else encode_ndjson(batches)
@@ -0,0 +1,111 @@
+# form_stats.py
+"""
+Per-form grading aggregates, kept current by triggers on submissions.
+
+  form_stats.assigned / submitted / graded / late      row counts (completed, graded, late flags)
+  form_stats.{student,teacher}_rating_{sum,count}      for mean ratings
+  forms.average_rating                                 mean student_rating of the form, 2 dp
+
+Every INSERT, DELETE, or UPDATE of a counted submissions column adds the new
+row's contribution and subtracts the old one. Reading a form's summary is
+therefore one primary-key lookup instead of a GROUP BY over submissions.
+recompute() derives the same numbers with that GROUP BY and reports (or
+repairs) any drift:
+
+    python form_stats.py            # verify only
+    python form_stats.py --apply    # verify and overwrite
+"""
+import argparse
+import sqlite3
+from typing import List
+
+COUNTERS = ("assigned", "submitted", "graded", "late",
+            "student_rating_sum", "student_rating_count", "teacher_rating_sum", "teacher_rating_count")
+
+
+def _contribution(row: str) -> List[str]:
+    """SQL expressions for what one submissions row adds to each counter, in COUNTERS order."""
+    return ["1", f"COALESCE({row}.completed, 0)", f"COALESCE({row}.graded, 0)", f"COALESCE({row}.late, 0)",
+            f"COALESCE({row}.student_rating, 0)", f"({row}.student_rating IS NOT NULL)",
+            f"COALESCE({row}.teacher_rating, 0)", f"({row}.teacher_rating IS NOT NULL)"]
+
+
+def _apply_sql(row: str, sign: str) -> str:
+    values = ", ".join(f"{sign}{expr}" for expr in _contribution(row))
+    updates = ", ".join(f"{col} = {col} + excluded.{col}" for col in COUNTERS)
+    return f"""
+        INSERT INTO form_stats (form_id, {", ".join(COUNTERS)}) VALUES ({row}.form_id, {values})
+        ON CONFLICT(form_id) DO UPDATE SET {updates}, updated_at = CURRENT_TIMESTAMP;
+    """
+
+
+def _average_sql(form_id: str) -> str:
+    mean = f"""(SELECT ROUND(1.0 * student_rating_sum / student_rating_count, 2)
+               FROM form_stats WHERE form_id = {form_id} AND student_rating_count > 0)"""
+    return f"UPDATE forms SET average_rating = {mean} WHERE id = {form_id} AND average_rating IS NOT {mean};"
+
+
+def form_stats_trigger_sql() -> List[str]:
+    cols = "form_id, completed, graded, late, student_rating, teacher_rating"
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS trg_form_stats_insert AFTER INSERT ON submissions
+            BEGIN {_apply_sql("NEW", "")} {_average_sql("NEW.form_id")} END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_form_stats_delete AFTER DELETE ON submissions
+            BEGIN {_apply_sql("OLD", "-")} {_average_sql("OLD.form_id")} END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_form_stats_update AFTER UPDATE OF {cols} ON submissions
+            BEGIN {_apply_sql("OLD", "-")} {_apply_sql("NEW", "")}
+                  {_average_sql("OLD.form_id")} {_average_sql("NEW.form_id")} END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_form_stats_form_delete AFTER DELETE ON forms
+           BEGIN DELETE FROM form_stats WHERE form_id = OLD.id; END""",
+    ]
+
+
+def _expected(conn):
+    sums = ", ".join(f"SUM({expr})" for expr in _contribution("s"))
+    return {r[0]: tuple(r[1:]) for r in conn.execute(f"SELECT s.form_id, {sums} FROM submissions s GROUP BY s.form_id")}
+
+
+def recompute(conn, apply: bool = False) -> List[dict]:
+    """Compare form_stats and forms.average_rating with a full GROUP BY; optionally write the recomputed values."""
+    expected = _expected(conn)
+    stored = {r[0]: tuple(r[1:]) for r in conn.execute(f"SELECT form_id, {', '.join(COUNTERS)} FROM form_stats")}
+    zero = (0,) * len(COUNTERS)
+
+    mismatches = []
+    for form_id in expected.keys() | stored.keys():
+        want, have = expected.get(form_id, zero), stored.get(form_id, zero)
+        if have != want:
+            mismatches.append({"form_id": form_id, "stored": dict(zip(COUNTERS, have)),
+                               "expected": dict(zip(COUNTERS, want))})
+    for form_id, stored_avg, want_avg in conn.execute("""
+            SELECT f.id, f.average_rating,
+                   (SELECT ROUND(1.0 * SUM(s.student_rating) / COUNT(s.student_rating), 2)
+                    FROM submissions s WHERE s.form_id = f.id)
+            FROM forms f"""):
+        if stored_avg != want_avg:
+            mismatches.append({"form_id": form_id, "stored": {"average_rating": stored_avg},
+                               "expected": {"average_rating": want_avg}})
+
+    if apply and mismatches:
+        conn.execute("DELETE FROM form_stats")
+        conn.executemany(f"INSERT INTO form_stats (form_id, {', '.join(COUNTERS)}) "
+                         f"VALUES (?, {', '.join('?' * len(COUNTERS))})",
+                         [(form_id, *counts) for form_id, counts in expected.items()])
+        conn.execute("""UPDATE forms SET average_rating = (
+                            SELECT ROUND(1.0 * student_rating_sum / student_rating_count, 2)
+                            FROM form_stats WHERE form_id = forms.id AND student_rating_count > 0)""")
+        conn.commit()
+    return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verify (and optionally repair) per-form aggregates.")
+    parser.add_argument("--db", default="fitness_app.db")
+    parser.add_argument("--apply", action="store_true", help="overwrite stored values with the recompute")
+    args = parser.parse_args()
+
+    with sqlite3.connect(args.db) as conn:
+        found = recompute(conn, apply=args.apply)
+    for m in found[:20]:
+        print(m)
+    print(f"{len(found)} forms differ" + (" (repaired)" if args.apply and found else ""))
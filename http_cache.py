@@ -0,0 +1,107 @@
+# http_cache.py
+import gzip
+import hashlib
+from typing import Iterable, List, Optional, Tuple
+
+try:
+    import brotli  # optional; gzip is used when it is not installed
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are sent as-is; compressing them costs more than it saves.
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+COMPRESSIBLE_MIMETYPES = {
+    "application/json",
+    "application/x-ndjson",
+    "text/html",
+    "text/csv",
+    "text/plain",
+}
+
+# Tables whose writes bump a row in table_versions (see init_db).
+VERSIONED_TABLES = (
+    "users", "classes", "teacher_students", "forms", "submissions",
+    "student_statistics", "student_achievements", "student_sports",
+    "sports_credits", "feedback_templates", "student_progress",
+    "notifications", "news_feed", "messages", "activity_logs",
+)
+
+
+def version_trigger_sql(table: str) -> List[str]:
+    """CREATE TRIGGER statements that bump table_versions on any write to `table`."""
+    statements = []
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        statements.append(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_version_{event.lower()}
+            AFTER {event} ON {table}
+            BEGIN
+                UPDATE table_versions
+                SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+                WHERE name = '{table}';
+            END
+        """)
+    return statements
+
+
+def table_versions(db, tables: Iterable[str]) -> List[Tuple[str, int, Optional[object]]]:
+    """Return (name, version, updated_at) for each table, in a single primary-key lookup."""
+    tables = list(tables)
+    placeholders = ",".join("?" for _ in tables)
+    rows = db.execute(
+        f"SELECT name, version, updated_at FROM table_versions WHERE name IN ({placeholders}) ORDER BY name",
+        tables,
+    ).fetchall()
+    return [(r["name"], r["version"], r["updated_at"]) for r in rows]
+
+
+def make_etag(parts: Iterable[object]) -> str:
+    """Hash an ordered list of validator parts into a short opaque tag."""
+    h = hashlib.sha1()
+    for p in parts:
+        h.update(repr(p).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()[:20]
+
+
+def choose_encoding(accept_encodings) -> Optional[str]:
+    """Pick 'br' or 'gzip' from a werkzeug Accept-Encoding header, or None."""
+    if brotli is not None and accept_encodings["br"]:
+        return "br"
+    if accept_encodings["gzip"]:
+        return "gzip"
+    return None
+
+
+def compress_bytes(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def compress_response(response, accept_encodings, min_bytes: int = COMPRESS_MIN_BYTES):
+    """
+    Compress a buffered response body in place when the client accepts it.
+    Streamed, passthrough, already-encoded and small bodies are left alone.
+    """
+    if response.status_code < 200 or response.status_code >= 300 or response.status_code == 204:
+        return response
+    if response.direct_passthrough or response.is_streamed:
+        return response
+    if "Content-Encoding" in response.headers:
+        return response
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < min_bytes:
+        return response
+    encoding = choose_encoding(accept_encodings)
+    if encoding is None:
+        return response
+
+    response.set_data(compress_bytes(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    return response
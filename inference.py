@@ -0,0 +1,473 @@
+# inference.py
+"""
+Out-of-process model inference.
+
+    python inference.py --workers 2                          # the inference server
+    INFERENCE_SOCKET=./instance/inference.sock python serve.py   # web tier uses it
+
+The server supervises a pool of model worker processes. Each worker owns its
+own build_wrappers() instances and ModelRegistry, runs one request at a time
+and limits torch to INFERENCE_TORCH_THREADS intra-op threads. A crashing or
+hung model therefore takes down one model worker, not a web worker. The
+supervisor pings idle workers every HEALTH_INTERVAL seconds and replaces any
+that died or stopped answering. A request that crashes or times out its
+worker gets an error, and the worker is restarted.
+
+Web workers talk to the server through InferenceClient over a Unix socket
+(multiprocessing.connection, authenticated with a key derived from the app
+secret). Messages are pickled, but tensors and numpy arrays of at least
+SHM_MIN_BYTES are not: the sender copies each into a POSIX shared-memory
+block and sends only its name, shape and dtype. The receiver maps the block
+as a zero-copy array and unlinks the name. The mapping is released when the
+last array referencing it is freed. The server relays these references
+without touching the data.
+"""
+import argparse
+import hashlib
+import hmac
+import itertools
+import logging
+import mmap
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+from typing import Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger("inference")
+
+INFERENCE_SOCKET = os.environ.get("INFERENCE_SOCKET", os.path.join("instance", "inference.sock"))
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "2"))
+INFERENCE_TIMEOUT = float(os.environ.get("INFERENCE_TIMEOUT", "120"))
+INFERENCE_TORCH_THREADS = int(os.environ.get("INFERENCE_TORCH_THREADS", "0"))  # 0: cpu_count // workers
+HEALTH_INTERVAL = float(os.environ.get("INFERENCE_HEALTH_INTERVAL", "5"))
+HEALTH_TIMEOUT = 10.0
+MIN_WORKER_UPTIME = 5.0  # a worker dying sooner than this is restarted after a delay
+SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+SHM_PREFIX = "fitinf-"
+SHM_MIN_BYTES = 64 * 1024  # smaller arrays are cheaper to pickle inline
+
+
+class InferenceError(Exception):
+    """The model raised, or its worker crashed or timed out while running it."""
+
+
+class InferenceUnavailable(Exception):
+    """The inference server could not be reached or had no worker free in time."""
+
+
+# ---- shared-memory arrays ----
+
+class SharedArray:
+    """Pickled in place of a large array: where to find it in shared memory."""
+
+    __slots__ = ("name", "shape", "dtype", "tensor")
+
+    def __init__(self, name, shape, dtype, tensor):
+        self.name, self.shape, self.dtype, self.tensor = name, shape, dtype, tensor
+
+    def __getstate__(self):
+        return (self.name, self.shape, self.dtype, self.tensor)
+
+    def __setstate__(self, state):
+        self.name, self.shape, self.dtype, self.tensor = state
+
+
+_shm_counter = itertools.count()
+
+
+def _to_shm(arr: np.ndarray, tensor: bool) -> SharedArray:
+    name = f"{SHM_PREFIX}{os.getpid()}-{next(_shm_counter)}"
+    fd = os.open(os.path.join(SHM_DIR, name), os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600)
+    try:
+        os.ftruncate(fd, arr.nbytes)
+        with mmap.mmap(fd, arr.nbytes) as mm:
+            np.ndarray(arr.shape, arr.dtype, buffer=mm)[...] = arr
+    finally:
+        os.close(fd)
+    return SharedArray(name, arr.shape, arr.dtype.str, tensor)
+
+
+def _from_shm(ref: SharedArray):
+    path = os.path.join(SHM_DIR, ref.name)
+    fd = os.open(path, os.O_RDWR)
+    try:
+        size = os.fstat(fd).st_size
+        mm = mmap.mmap(fd, size) if size else b""
+    finally:
+        os.close(fd)
+        os.unlink(path)  # the mapping outlives the name
+    # the array holds the mmap, which is unmapped once the last view is gone
+    arr = np.frombuffer(mm, dtype=np.dtype(ref.dtype)).reshape(ref.shape)
+    if ref.tensor:
+        import torch
+        return torch.from_numpy(arr)
+    return arr
+
+
+def pack(obj):
+    """Copy of `obj` (dicts, lists, tuples) with large arrays and tensors moved to shared memory."""
+    if SHM_DIR is None:
+        return obj
+    if isinstance(obj, dict):
+        return {k: pack(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(pack(v) for v in obj)
+    if isinstance(obj, np.ndarray) and obj.nbytes >= SHM_MIN_BYTES and not obj.dtype.hasobject:
+        return _to_shm(np.ascontiguousarray(obj), tensor=False)
+    torch = sys.modules.get("torch")
+    if torch is not None and isinstance(obj, torch.Tensor):
+        if obj.numel() * obj.element_size() >= SHM_MIN_BYTES:
+            try:
+                arr = obj.detach().cpu().numpy()
+            except (TypeError, RuntimeError):  # e.g. bfloat16 has no numpy dtype
+                return obj
+            return _to_shm(np.ascontiguousarray(arr), tensor=True)
+    return obj
+
+
+def unpack(obj):
+    if isinstance(obj, SharedArray):
+        return _from_shm(obj)
+    if isinstance(obj, dict):
+        return {k: unpack(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(unpack(v) for v in obj)
+    return obj
+
+
+def shared_refs(obj):
+    if isinstance(obj, SharedArray):
+        yield obj
+    elif isinstance(obj, dict):
+        for v in obj.values():
+            yield from shared_refs(v)
+    elif isinstance(obj, (list, tuple)):
+        for v in obj:
+            yield from shared_refs(v)
+
+
+def discard(obj):
+    """Unlink blocks referenced by a message that will never be unpacked."""
+    for ref in shared_refs(obj):
+        try:
+            os.unlink(os.path.join(SHM_DIR, ref.name))
+        except FileNotFoundError:
+            pass
+
+
+def sweep_shm(max_age: float):
+    """Remove blocks left behind by processes that died between creating and unpacking them."""
+    if SHM_DIR is None:
+        return
+    cutoff = time.time() - max_age
+    for name in os.listdir(SHM_DIR):
+        if name.startswith(SHM_PREFIX):
+            path = os.path.join(SHM_DIR, name)
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+
+# ---- model workers ----
+
+def _worker_main(conn, torch_threads: int):
+    """Body of a model worker process: serve requests from the supervisor until the pipe closes."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    import torch
+    from model_registry import ModelRegistry
+    from models import DEVICE, build_wrappers
+
+    torch.set_num_threads(torch_threads)
+    registry = ModelRegistry(device=DEVICE)
+    wrappers = build_wrappers(registry)
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError):
+            return
+        op = msg[0]
+        if op == "ping":
+            conn.send(("pong", {"models": registry.status(wrappers)}))
+        elif op == "run":
+            _, key, kwargs = msg
+            try:
+                result = wrappers[key].run(**unpack(kwargs))
+                conn.send(("ok", pack(result)))
+            except Exception as e:
+                logger.exception("Model %s failed", key)
+                conn.send(("error", "model", f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    def __init__(self, index: int, ctx, torch_threads: int):
+        self.index = index
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child, torch_threads),
+                                   name=f"inference-worker-{index}", daemon=True)
+        self.process.start()
+        child.close()
+        self.started = time.monotonic()
+        self.runs = 0
+        self.health = {}
+
+    def stop(self):
+        self.conn.close()
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+
+class InferencePool:
+    def __init__(self, size: int = INFERENCE_WORKERS, timeout: float = INFERENCE_TIMEOUT,
+                 torch_threads: int = INFERENCE_TORCH_THREADS):
+        self.size = size
+        self.timeout = timeout
+        self.torch_threads = torch_threads or max(1, (os.cpu_count() or 1) // size)
+        self.restarts = 0
+        self._ctx = multiprocessing.get_context("spawn")  # no forked torch/CUDA state in workers
+        self._workers: Dict[int, _Worker] = {}
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def start(self):
+        for i in range(self.size):
+            self._workers[i] = _Worker(i, self._ctx, self.torch_threads)
+            self._idle.put(self._workers[i])
+        threading.Thread(target=self._health_loop, name="inference-health", daemon=True).start()
+        return self
+
+    def _replace(self, worker: _Worker, reason: str) -> _Worker:
+        logger.warning("Restarting inference worker %d (pid %s): %s", worker.index, worker.process.pid, reason)
+        worker.stop()
+        if time.monotonic() - worker.started < MIN_WORKER_UPTIME:
+            time.sleep(1)
+        fresh = _Worker(worker.index, self._ctx, self.torch_threads)
+        with self._lock:
+            self._workers[worker.index] = fresh
+            self.restarts += 1
+        return fresh
+
+    def call(self, msg, timeout: Optional[float] = None):
+        """Send one request to a free worker and return its reply tuple."""
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            worker = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            return ("error", "unavailable", "No inference worker free")
+        try:
+            worker.conn.send(msg)
+            if not worker.conn.poll(timeout):
+                worker = self._replace(worker, f"no reply within {timeout:.0f}s")
+                return ("error", "timeout", "Model run timed out")
+            reply = worker.conn.recv()
+            worker.runs += 1
+            return reply
+        except (EOFError, OSError) as e:
+            worker = self._replace(worker, f"crashed ({e.__class__.__name__})")
+            return ("error", "crashed", "Inference worker crashed during the run")
+        finally:
+            self._idle.put(worker)
+
+    def _health_loop(self):
+        while not self._stop.wait(HEALTH_INTERVAL):
+            # ping the workers that are idle right now; busy ones are checked by call() itself
+            idle = []
+            while True:
+                try:
+                    idle.append(self._idle.get_nowait())
+                except queue.Empty:
+                    break
+            for worker in idle:
+                try:
+                    worker.conn.send(("ping",))
+                    if not worker.conn.poll(HEALTH_TIMEOUT):
+                        raise TimeoutError("ping timed out")
+                    worker.health = worker.conn.recv()[1]
+                    worker.health["checkedAt"] = time.time()
+                except (EOFError, OSError, TimeoutError) as e:
+                    worker = self._replace(worker, f"failed health check ({e})")
+                self._idle.put(worker)
+            sweep_shm(max_age=self.timeout * 2)
+
+    def stats(self) -> dict:
+        with self._lock:
+            workers = list(self._workers.values())
+        return {"size": self.size, "idle": self._idle.qsize(), "restarts": self.restarts,
+                "torchThreads": self.torch_threads,
+                "workers": [{"index": w.index, "pid": w.process.pid, "alive": w.process.is_alive(),
+                             "uptimeSeconds": round(time.monotonic() - w.started, 1), "runs": w.runs,
+                             **w.health} for w in workers]}
+
+    def stop(self):
+        self._stop.set()
+        for worker in list(self._workers.values()):
+            worker.stop()
+
+
+# ---- server and client ----
+
+def load_authkey() -> bytes:
+    """INFERENCE_AUTHKEY, else a key derived from the app secret (FLASK_SECRET or its key file)."""
+    if os.environ.get("INFERENCE_AUTHKEY"):
+        return os.environ["INFERENCE_AUTHKEY"].encode()
+    secret = os.environ.get("FLASK_SECRET", "").encode()
+    if not secret:
+        with open(os.environ.get("FLASK_SECRET_FILE", os.path.join("instance", "secret_key")), "rb") as f:
+            secret = f.read()
+    return hmac.new(secret, b"inference-server", hashlib.sha256).digest()
+
+
+class InferenceServer:
+    """Accepts client connections on a Unix socket; one thread per connection relays requests to the pool."""
+
+    def __init__(self, pool: InferencePool, address: str = INFERENCE_SOCKET, authkey: Optional[bytes] = None):
+        self.pool = pool
+        self.address = address
+        self.authkey = authkey or load_authkey()
+
+    def serve_forever(self):
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        os.makedirs(os.path.dirname(self.address) or ".", exist_ok=True)
+        listener = Listener(self.address, family="AF_UNIX", authkey=self.authkey)
+        os.chmod(self.address, 0o600)
+        logger.info("Inference server %d listening on %s with %d workers", os.getpid(), self.address, self.pool.size)
+        try:
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:  # failed handshake or authentication
+                    logger.warning("Rejected inference client: %s", e)
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        finally:
+            listener.close()
+
+    def _handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    msg = conn.recv()
+                except (EOFError, OSError):
+                    return
+                if msg[0] == "run":
+                    _, key, kwargs, timeout = msg
+                    reply = self.pool.call(("run", key, kwargs), timeout=timeout)
+                    if reply[0] != "ok":
+                        discard(msg)  # inputs the worker never unpacked
+                elif msg[0] == "stats":
+                    reply = ("ok", self.pool.stats())
+                else:
+                    reply = ("ok", "pong")
+                try:
+                    conn.send(reply)
+                except OSError:
+                    discard(reply)
+                    return
+
+
+class InferenceClient:
+    """Thin client used by the web tier; one connection per thread, reopened after a fork or a failure."""
+
+    def __init__(self, address: str = INFERENCE_SOCKET, authkey: Optional[bytes] = None,
+                 timeout: float = INFERENCE_TIMEOUT):
+        self.address = address
+        self.timeout = timeout
+        self._authkey = authkey
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn, True
+        if self._authkey is None:
+            self._authkey = load_authkey()
+        try:
+            conn = Client(self.address, family="AF_UNIX", authkey=self._authkey)
+        except (OSError, EOFError) as e:
+            raise InferenceUnavailable(f"Inference server unreachable at {self.address}: {e}")
+        self._local.conn, self._local.pid = conn, os.getpid()
+        return conn, False
+
+    def _drop(self):
+        conn, self._local.conn = getattr(self._local, "conn", None), None
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    def _request(self, msg, timeout: float):
+        conn, reused = self._connection()
+        try:
+            conn.send(msg)
+        except (OSError, EOFError):
+            self._drop()
+            if not reused:
+                raise InferenceUnavailable("Inference server closed the connection")
+            conn, _ = self._connection()  # the server restarted since this connection was opened
+            try:
+                conn.send(msg)
+            except (OSError, EOFError):
+                self._drop()
+                raise InferenceUnavailable("Inference server closed the connection")
+        try:
+            if conn.poll(timeout):
+                return conn.recv()
+        except (OSError, EOFError):
+            pass
+        self._drop()  # a late reply must not be read by the next request
+        raise InferenceUnavailable("Inference server did not reply")
+
+    def run(self, model_key: str, **kwargs) -> dict:
+        payload = pack(kwargs)
+        try:
+            reply = self._request(("run", model_key, payload, self.timeout), self.timeout + HEALTH_TIMEOUT)
+        except InferenceUnavailable:
+            discard(payload)
+            raise
+        if reply[0] == "ok":
+            return unpack(reply[1])
+        _, kind, message = reply
+        if kind == "unavailable":
+            raise InferenceUnavailable(message)
+        raise InferenceError(message)
+
+    def stats(self) -> dict:
+        return self._request(("stats",), HEALTH_TIMEOUT)[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run models in a pool of worker processes behind a Unix socket.")
+    parser.add_argument("--socket", default=INFERENCE_SOCKET)
+    parser.add_argument("--workers", type=int, default=INFERENCE_WORKERS)
+    parser.add_argument("--timeout", type=float, default=INFERENCE_TIMEOUT)
+    parser.add_argument("--torch-threads", type=int, default=INFERENCE_TORCH_THREADS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    pool = InferencePool(args.workers, args.timeout, args.torch_threads).start()
+    signal.signal(signal.SIGTERM, lambda *_: (pool.stop(), os._exit(0)))
+    try:
+        InferenceServer(pool, args.socket).serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.stop()
+
+
+if __name__ == "__main__":
+    # run from the importable module so SharedArray and _worker_main pickle as inference.*, not __main__.*
+    import inference
+    inference.main()
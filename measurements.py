@@ -0,0 +1,258 @@
+# measurements.py
+"""
+Batch ingestion of testing-day measurements into student_statistics.
+
+A batch is a list of rows (parsed JSON objects or csv.DictReader rows), each
+with a student id, an optional measuredAt, and any of the METRIC_UNITS
+columns. One row may hold several metrics, and a student may appear in many
+rows (one per attempt). Validation works column-wise over an (n rows x metrics)
+float matrix:
+
+  - parse: each column is gathered cell by cell into an object array,
+    where booleans, lists and objects are flagged, then converted with one
+    astype(); strings only get converted one by one when that fails, to
+    name the bad ones
+  - normalize: each column is multiplied by the factor for its unit
+    (e.g. {"vertical_jump": "in"}) to get METRIC_UNITS
+  - validate: cells outside BOUNDS become NaN and are reported; the
+    other cells of the row are kept
+
+Every valid cell is appended to stat_measurements, the history of a metric.
+student_statistics gets one row per student: the best attempt of the batch
+for ranked metrics (see achievements.METRICS), otherwise the latest. bmi is
+derived in bulk from the batch's or stored height and weight. The stats upsert
+is a single executemany; nothing commits here.
+"""
+from datetime import datetime
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from achievements import METRICS as RANKED_METRICS, check as check_achievements
+from reminders import parse_due_date
+
+MAX_ROWS = 20000
+SQL_CHUNK = 900  # ids per IN (...) query, under SQLite's default variable limit
+
+# metric -> canonical unit; bmi and workout_consistency are derived, never ingested
+METRIC_UNITS = {
+    "height": "cm", "weight": "kg", "vertical_jump": "cm", "broad_jump": "cm",
+    "flying_10": "s", "track_interval": "s", "hang_clean": "kg", "bench": "kg",
+    "back_squat": "kg", "front_squat": "kg", "balance_left": "s", "balance_right": "s",
+    "jump_force": "N", "air_time": "s",
+}
+METRIC_COLUMNS = tuple(METRIC_UNITS)
+
+# canonical unit -> {accepted unit: factor to canonical}
+CONVERSIONS = {
+    "cm": {"cm": 1.0, "m": 100.0, "mm": 0.1, "in": 2.54, "ft": 30.48},
+    "kg": {"kg": 1.0, "g": 0.001, "lb": 0.45359237, "lbs": 0.45359237},
+    "s": {"s": 1.0, "ms": 0.001},
+    "N": {"N": 1.0, "kN": 1000.0, "lbf": 4.4482216},
+}
+
+# plausible range per metric, in canonical units
+BOUNDS = {
+    "height": (50, 250), "weight": (15, 250), "vertical_jump": (1, 150), "broad_jump": (10, 400),
+    "flying_10": (0.6, 5), "track_interval": (1, 3600), "hang_clean": (0, 400), "bench": (0, 400),
+    "back_squat": (0, 400), "front_squat": (0, 400), "balance_left": (0, 600), "balance_right": (0, 600),
+    "jump_force": (50, 10000), "air_time": (0.01, 2),
+}
+
+
+def unit_factors(units: Optional[Mapping]) -> np.ndarray:
+    """Per-column multipliers for a {metric: unit} mapping; raises ValueError on unknown names."""
+    factors = np.ones(len(METRIC_COLUMNS))
+    for metric, unit in (units or {}).items():
+        if metric not in METRIC_UNITS:
+            raise ValueError(f"unknown metric '{metric}'")
+        accepted = CONVERSIONS[METRIC_UNITS[metric]]
+        if unit not in accepted:
+            raise ValueError(f"{metric} unit must be one of {sorted(accepted)}")
+        factors[METRIC_COLUMNS.index(metric)] = accepted[unit]
+    return factors
+
+
+def _column(rows: List[Mapping], name: str) -> Tuple[np.ndarray, List[int]]:
+    """One metric across all rows as float64 (NaN where absent) plus the rows whose cell isn't a number."""
+    raw = np.empty(len(rows), dtype=object)
+    for i, row in enumerate(rows):
+        raw[i] = row.get(name)  # element-wise, so a list cell stays one object instead of a new axis
+    absent = np.fromiter((c is None or c == "" for c in raw), dtype=bool, count=len(raw))
+    # JSON true/false would convert to 1.0/0.0, and lists or objects aren't numbers at all
+    wrong_type = np.fromiter((isinstance(c, bool) or not isinstance(c, (int, float, str)) for c in raw),
+                             dtype=bool, count=len(raw)) & ~absent
+    raw[absent | wrong_type] = np.nan
+    try:
+        out = raw.astype(np.float64)
+    except (TypeError, ValueError):
+        out = np.full(len(rows), np.nan)
+        for i, cell in enumerate(raw):
+            try:
+                out[i] = float(cell)
+            except (TypeError, ValueError):
+                wrong_type[i] = True
+    bad = wrong_type | (~absent & ~np.isfinite(out))  # "nan" and "inf" strings too
+    out[bad] = np.nan
+    return out, np.flatnonzero(bad).tolist()
+
+
+def parse_value(metric: str, cell) -> Optional[float]:
+    """One cell through the batch rules (type, then BOUNDS); None if empty, ValueError if invalid."""
+    column, bad = _column([{metric: cell}], metric)
+    if bad:
+        raise ValueError(f"{metric} must be a number")
+    value = float(column[0])
+    if np.isnan(value):
+        return None
+    if metric in BOUNDS and not BOUNDS[metric][0] <= value <= BOUNDS[metric][1]:
+        raise ValueError(f"{metric} {value:g} {METRIC_UNITS[metric]} outside {BOUNDS[metric]}")
+    return value
+
+
+def parse(rows: List[Mapping], units: Optional[Mapping] = None, measured_at: Optional[datetime] = None,
+          first_row: int = 1):
+    """Rows -> (student ids, values in canonical units, measured_at per row, errors).
+
+    Rows without a usable student id get id 0 and all-NaN values. Error
+    "row" numbers start at `first_row` (2 for a CSV with a header line).
+    """
+    factors = unit_factors(units)
+    default_time = measured_at or datetime.utcnow()
+    errors = []
+
+    n = len(rows)
+    student_ids = np.zeros(n, dtype=np.int64)
+    times = []
+    for i, row in enumerate(rows):
+        sid = row.get("studentId", row.get("student_id"))
+        try:
+            student_ids[i] = int(sid)
+        except (TypeError, ValueError):
+            errors.append({"row": i + first_row, "error": "Missing or invalid studentId"})
+        try:
+            times.append(parse_due_date(row.get("measuredAt", row.get("measured_at"))) or default_time)
+        except (TypeError, ValueError):
+            errors.append({"row": i + first_row, "error": "measuredAt must be an ISO date"})
+            times.append(default_time)
+
+    values = np.empty((n, len(METRIC_COLUMNS)))
+    for j, metric in enumerate(METRIC_COLUMNS):
+        values[:, j], bad = _column(rows, metric)
+        errors.extend({"row": i + first_row, "error": f"{metric} must be a number"} for i in bad)
+    values = np.round(values * factors, 3)  # drop float noise from unit conversion
+
+    low = np.array([BOUNDS[m][0] for m in METRIC_COLUMNS])
+    high = np.array([BOUNDS[m][1] for m in METRIC_COLUMNS])
+    with np.errstate(invalid="ignore"):
+        out_of_range = (values < low) | (values > high)
+    for i, j in zip(*np.nonzero(out_of_range)):
+        metric = METRIC_COLUMNS[j]
+        errors.append({"row": int(i) + first_row,
+                       "error": f"{metric} {values[i, j]:g} {METRIC_UNITS[metric]} outside {BOUNDS[metric]}"})
+    values[out_of_range | (student_ids == 0)[:, None]] = np.nan
+    return student_ids, values, times, errors
+
+
+def reduce_by_student(student_ids: np.ndarray, values: np.ndarray, times: List[datetime]):
+    """(unique student ids, one row each): best attempt for ranked metrics, latest value otherwise."""
+    stamps = np.array(times, dtype="datetime64[us]")
+    order = np.lexsort((stamps, student_ids))
+    ids, vals = student_ids[order], values[order]
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+
+    out = np.full((len(starts), len(METRIC_COLUMNS)), np.nan)
+    positions = np.arange(len(ids))
+    for j, metric in enumerate(METRIC_COLUMNS):
+        col = vals[:, j]
+        if metric in RANKED_METRICS:
+            reduce = np.fmax if RANKED_METRICS[metric][2] else np.fmin  # both skip NaN
+            out[:, j] = reduce.reduceat(col, starts)
+        else:
+            last = np.maximum.reduceat(np.where(np.isnan(col), -1, positions), starts)
+            out[:, j] = np.where(last >= 0, col[np.maximum(last, 0)], np.nan)
+    return ids[starts], out
+
+
+def bmi(height_cm: np.ndarray, weight_kg: np.ndarray) -> np.ndarray:
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.round(weight_kg / (height_cm / 100) ** 2, 1)
+
+
+def _existing(cur, sql: str, ids: List[int], params: tuple = ()) -> Dict[int, dict]:
+    found = {}
+    for k in range(0, len(ids), SQL_CHUNK):
+        chunk = ids[k:k + SQL_CHUNK]
+        for r in cur.execute(sql.format(marks=", ".join("?" * len(chunk))), (*params, *chunk)):
+            found[r[0]] = dict(r)
+    return found
+
+
+def record_history(cur, entries, recorded_by: Optional[int]):
+    """Append (student_id, metric, value, measured_at) tuples to stat_measurements."""
+    cur.executemany("INSERT INTO stat_measurements (student_id, metric, value, measured_at, recorded_by) "
+                    "VALUES (?, ?, ?, ?, ?)", [(*e, recorded_by) for e in entries])
+
+
+def ingest(cur, rows: List[Mapping], units: Optional[Mapping] = None, measured_at: Optional[datetime] = None,
+           recorded_by: Optional[int] = None, first_row: int = 1, teacher_id: Optional[int] = None) -> dict:
+    """Validate, store and summarise one batch; raises ValueError for batch-level problems (not committed).
+
+    With a teacher_id, rows for students who are not on that teacher's roster are reported and skipped.
+    """
+    if len(rows) > MAX_ROWS:
+        raise ValueError(f"at most {MAX_ROWS} rows per batch")
+    student_ids, values, times, errors = parse(rows, units, measured_at, first_row)
+
+    requested = [int(s) for s in np.unique(student_ids[student_ids > 0])]
+    known = _existing(cur, "SELECT id FROM users WHERE role = 'student' AND id IN ({marks})", requested)
+    unknown = (student_ids > 0) & ~np.isin(student_ids, np.fromiter(known, dtype=np.int64, count=len(known)))
+    errors.extend({"row": int(i) + first_row, "error": f"Unknown student {int(student_ids[i])}"}
+                  for i in np.flatnonzero(unknown))
+    if teacher_id is not None:
+        roster = _existing(cur, "SELECT DISTINCT student_id FROM teacher_students "
+                                "WHERE teacher_id = ? AND student_id IN ({marks})", requested, (teacher_id,))
+        off_roster = (student_ids > 0) & ~unknown & ~np.isin(
+            student_ids, np.fromiter(roster, dtype=np.int64, count=len(roster)))
+        errors.extend({"row": int(i) + first_row, "error": f"Student {int(student_ids[i])} is not on your roster"}
+                      for i in np.flatnonzero(off_roster))
+        unknown |= off_roster
+    values[unknown] = np.nan
+
+    keep = ~np.isnan(values).all(axis=1)
+    rows_idx, cols_idx = np.nonzero(~np.isnan(values))
+    record_history(cur, ((int(student_ids[i]), METRIC_COLUMNS[j], float(values[i, j]), times[i])
+                         for i, j in zip(rows_idx, cols_idx)), recorded_by)
+    if not keep.any():
+        return {"students": 0, "measurements": 0, "errors": errors, "achievements": []}
+
+    ids, best = reduce_by_student(student_ids[keep], values[keep], [t for t, k in zip(times, keep) if k])
+    old = _existing(cur, f"SELECT student_id, {', '.join(METRIC_COLUMNS)} FROM student_statistics "
+                         "WHERE student_id IN ({marks})", ids.tolist())
+
+    # bmi wherever the batch moved height or weight, using the stored value for the other one
+    h, w = METRIC_COLUMNS.index("height"), METRIC_COLUMNS.index("weight")
+    stored = np.array([[old.get(int(s), {}).get(c) for c in ("height", "weight")] for s in ids], dtype=np.float64)
+    height = np.where(np.isnan(best[:, h]), stored[:, 0], best[:, h])
+    weight = np.where(np.isnan(best[:, w]), stored[:, 1], best[:, w])
+    touched = ~np.isnan(best[:, h]) | ~np.isnan(best[:, w])
+    new_bmi = np.where(touched, bmi(height, weight), np.nan)
+
+    cols = METRIC_COLUMNS + ("bmi",)
+    now = datetime.utcnow()
+    table = np.column_stack([best, new_bmi]).astype(object)
+    table[np.isnan(table.astype(np.float64))] = None
+    cur.executemany(f"""
+        INSERT INTO student_statistics (student_id, {", ".join(cols)}, updated_at)
+        VALUES (?, {", ".join("?" * len(cols))}, ?)
+        ON CONFLICT(student_id) DO UPDATE SET
+            {", ".join(f"{c} = COALESCE(excluded.{c}, student_statistics.{c})" for c in cols)},
+            updated_at = excluded.updated_at
+    """, [(int(s), *table[k], now) for k, s in enumerate(ids)])
+
+    awarded = []
+    for k, s in enumerate(ids):
+        new = {m: float(best[k, j]) for j, m in enumerate(METRIC_COLUMNS) if not np.isnan(best[k, j])}
+        awarded.extend(check_achievements(cur, int(s), list(new), old.get(int(s), {}), new))
+
+    return {"students": len(ids), "measurements": len(rows_idx), "errors": errors, "achievements": awarded}
@@ -0,0 +1,184 @@
+# metrics.py
+"""
+In-process metrics with Prometheus text exposition.
+
+Counters and histograms are sharded per thread. Each thread updates only its
+own shard (keyed by thread ident; idents are reused after a thread exits, so
+the number of shards stays bounded by peak concurrency). The hot path
+therefore takes no lock. render() sums the shards at scrape time and adds any
+gauges supplied by registered collector callbacks.
+
+Every worker process has its own registry, so with serve.py each scrape
+reports the worker that answered it; the worker is identified by the pid label
+on app_worker_info.
+"""
+import bisect
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._shards = {}  # thread ident -> {metric name: {label values: cell}}
+        self._lock = threading.Lock()
+
+    def shard(self, name: str) -> dict:
+        ident = threading.get_ident()
+        shard = self._shards.get(ident)
+        if shard is None:
+            with self._lock:
+                shard = self._shards.setdefault(ident, {})
+        cells = shard.get(name)
+        if cells is None:
+            cells = shard[name] = {}
+        return cells
+
+    def merged(self, name: str, combine: Callable[[list, list], None]) -> Dict[tuple, list]:
+        out = {}
+        for shard in list(self._shards.values()):
+            cells = shard.get(name)
+            if not cells:
+                continue
+            for labels, cell in cells.copy().items():
+                if labels in out:
+                    combine(out[labels], cell)
+                else:
+                    out[labels] = list(cell)
+        return out
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, fn: Callable[[], Iterable[Tuple[str, str, str, Sequence[Tuple[dict, float]]]]]):
+        """fn() yields (name, type, help, [(labels, value), ...]) at scrape time."""
+        self._collectors.append(fn)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for fn in self._collectors:
+            for name, kind, help_text, samples in fn():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(f"{name}{_labels(labels)} {_num(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _num(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _add(into: list, cell: list):
+    for i, v in enumerate(cell):
+        into[i] += v
+
+
+class Counter:
+    def __init__(self, registry: Registry, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.registry, self.name, self.help, self.labelnames = registry, name, help_text, tuple(labelnames)
+        registry.register(self)
+
+    def inc(self, *labels, amount: float = 1):
+        cells = self.registry.shard(self.name)
+        cell = cells.get(labels)
+        if cell is None:
+            cells[labels] = [amount]
+        else:
+            cell[0] += amount
+
+    def value(self, *labels) -> float:
+        return self.registry.merged(self.name, _add).get(labels, [0])[0]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, cell in sorted(self.registry.merged(self.name, _add).items()):
+            lines.append(f"{self.name}{_labels(dict(zip(self.labelnames, labels)))} {_num(cell[0])}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, registry: Registry, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.registry, self.name, self.help, self.labelnames = registry, name, help_text, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        registry.register(self)
+
+    def observe(self, value: float, *labels):
+        cells = self.registry.shard(self.name)
+        cell = cells.get(labels)
+        if cell is None:
+            cell = cells[labels] = [0] * (len(self.buckets) + 1) + [0.0]  # per-bucket counts, +Inf, sum
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, cell in sorted(self.registry.merged(self.name, _add).items()):
+            base = dict(zip(self.labelnames, labels))
+            running = 0
+            for bound, count in zip(self.buckets + (float("inf"),), cell[:-1]):
+                running += count
+                lines.append(f"{self.name}_bucket{_labels({**base, 'le': _num(float(bound))})} {running}")
+            lines.append(f"{self.name}_sum{_labels(base)} {_num(cell[-1])}")
+            lines.append(f"{self.name}_count{_labels(base)} {running}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram, self.labels = histogram, labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+
+REGISTRY = Registry()
+
+HTTP_LATENCY = Histogram(REGISTRY, "http_request_duration_seconds", "Request latency by route",
+                         ("route", "method"))
+HTTP_RESPONSES = Counter(REGISTRY, "http_responses_total", "Responses by route and status", ("route", "method", "status"))
+DB_CONNECTIONS = Counter(REGISTRY, "db_connections_total", "Per-request SQLite connections", ("event",))
+DB_QUERIES = Histogram(REGISTRY, "db_queries_per_request", "SQL statements per request", ("route",), COUNT_BUCKETS)
+DB_TIME = Histogram(REGISTRY, "db_time_seconds", "SQL time per request", ("route",))
+ACTIVITY_LOG_WRITES = Counter(REGISTRY, "activity_log_writes_total", "activity_logs inserts", ("outcome",))
+MODEL_LOAD = Histogram(REGISTRY, "model_load_seconds", "Model weight load time", ("model",), SLOW_BUCKETS)
+MODEL_INFERENCE = Histogram(REGISTRY, "model_inference_seconds", "Model run latency", ("model",), SLOW_BUCKETS)
+MODEL_FAILURES = Counter(REGISTRY, "model_failures_total", "Model runs that raised", ("model",))
+OPENROUTER_LATENCY = Histogram(REGISTRY, "openrouter_request_seconds", "OpenRouter call latency", (), SLOW_BUCKETS)
+OPENROUTER_CALLS = Counter(REGISTRY, "openrouter_requests_total", "OpenRouter calls by outcome", ("outcome",))
+
+_started = time.time()
+REGISTRY.add_collector(lambda: [
+    ("app_worker_info", "gauge", "Worker process serving this scrape", [({"pid": os.getpid()}, 1)]),
+    ("app_uptime_seconds", "gauge", "Seconds since this worker imported metrics", [({}, round(time.time() - _started, 1))]),
+])
@@ -0,0 +1,403 @@
+# model_registry.py
+"""
+Versioned model weights and per-process residency.
+
+Weight files live under MODEL_STORE/<model key>/<version>.pt. The manifest
+MODEL_STORE/registry.json records the sha256, size and registration time of
+each version, plus the active version per model:
+
+    python model_registry.py register trend-ensemble ./trend.pt --version 2026-10-01
+    python model_registry.py activate trend-ensemble 2026-09-15
+    python model_registry.py list
+
+Weights are loaded with torch.load(mmap=True), so tensor storage is backed by
+the page cache. Every worker that maps the same file shares those pages
+instead of holding a private copy; on CUDA the tensors are copied to the
+device after the mapped load. A model without a registered version is built
+by its wrapper's loader as before, but its residency is still tracked here.
+
+Each worker keeps at most MODEL_MEMORY_BUDGET_MB of model tensors resident.
+The least recently used models are evicted when a load would exceed the
+budget, and any model unused for MODEL_IDLE_SECONDS is evicted by a sweeper
+thread. Activating another version is a hot swap: workers notice the
+manifest change within MANIFEST_CHECK_INTERVAL seconds, load the new file on
+the model's next use, and drop the old one. Runs already holding the old
+model finish with it.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import torch
+
+from metrics import MODEL_LOAD
+
+try:
+    import fcntl  # POSIX only; without it concurrent registrations may race
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger("model-registry")
+
+MODEL_STORE = os.environ.get("MODEL_STORE", "./model_store")
+MODEL_MEMORY_BUDGET_MB = float(os.environ.get("MODEL_MEMORY_BUDGET_MB", "2048"))
+MODEL_IDLE_SECONDS = float(os.environ.get("MODEL_IDLE_SECONDS", "900"))
+MANIFEST_CHECK_INTERVAL = 2.0
+BUILTIN = "builtin"  # version label of models built in code rather than loaded from the store
+
+_VERSION_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{0,63}$")
+
+
+def sha256_file(path: str, chunk: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def tensor_bytes(obj) -> int:
+    """Bytes of tensor storage held by a module, a state dict or a tensor."""
+    if isinstance(obj, torch.nn.Module):
+        tensors = list(obj.parameters()) + list(obj.buffers())
+    elif isinstance(obj, dict):
+        tensors = [v for v in obj.values() if isinstance(v, torch.Tensor)]
+    elif isinstance(obj, torch.Tensor):
+        tensors = [obj]
+    else:
+        return 0
+    seen, total = set(), 0
+    for t in tensors:
+        storage = t.untyped_storage()
+        if storage.data_ptr() not in seen:
+            seen.add(storage.data_ptr())
+            total += storage.nbytes()
+    return total
+
+
+def mapped_rss(path: str) -> Optional[int]:
+    """Resident bytes of this process's mappings of `path` (Linux); None if unknown."""
+    real = os.path.realpath(path)
+    total, inside = 0, False
+    try:
+        with open("/proc/self/smaps") as f:
+            for line in f:
+                first = line.split(None, 1)[0]
+                if "-" in first and not first.endswith(":"):
+                    inside = line.rstrip("\n").endswith(real)
+                elif inside and first == "Rss:":
+                    total += int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return total
+
+
+class _Resident:
+    __slots__ = ("model", "version", "path", "nbytes", "loaded_at", "last_used")
+
+    def __init__(self, model, version, path, nbytes):
+        self.model, self.version, self.path, self.nbytes = model, version, path, nbytes
+        self.loaded_at = self.last_used = time.time()
+
+
+class ModelRegistry:
+    def __init__(self, root: str = MODEL_STORE, budget_mb: float = MODEL_MEMORY_BUDGET_MB,
+                 idle_seconds: float = MODEL_IDLE_SECONDS, device=None):
+        self.root = root
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.idle_seconds = idle_seconds
+        self.device = device
+        self.evictions = 0
+        self._manifest = {}
+        self._manifest_mtime = None
+        self._checked_at = 0.0
+        self._resident: Dict[str, _Resident] = {}
+        self._verified = set()  # (path, size, mtime) of files whose checksum this process has checked
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._sweeper_pid = None
+        self._no_sweeper_pid = None
+
+    # ---- manifest ----
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.root, "registry.json")
+
+    def manifest(self, force: bool = False) -> dict:
+        """The manifest, re-read at most every MANIFEST_CHECK_INTERVAL seconds when its mtime changes."""
+        now = time.monotonic()
+        if force or now - self._checked_at >= MANIFEST_CHECK_INTERVAL:
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.manifest_path).st_mtime_ns
+            except FileNotFoundError:
+                self._manifest, self._manifest_mtime = {}, None
+                return self._manifest
+            if mtime != self._manifest_mtime:
+                with open(self.manifest_path) as f:
+                    self._manifest = json.load(f)
+                self._manifest_mtime = mtime
+        return self._manifest
+
+    def _update_manifest(self, change: Callable[[dict], None]) -> dict:
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, ".lock"), "w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            manifest = self.manifest(force=True)
+            manifest = json.loads(json.dumps(manifest))  # don't mutate the cached copy
+            change(manifest)
+            tmp = self.manifest_path + f".{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(manifest, f, indent=2, sort_keys=True)
+            os.replace(tmp, self.manifest_path)
+        return self.manifest(force=True)
+
+    def active(self, key: str):
+        """(version, info) of the active version, or (None, None)."""
+        entry = self.manifest().get(key) or {}
+        version = entry.get("active")
+        if version is None:
+            return None, None
+        return version, entry["versions"][version]
+
+    def register(self, key: str, src: str, version: Optional[str] = None, activate: bool = True,
+                 note: str = "") -> dict:
+        """Copy a weight file into the store as a new version of `key`."""
+        digest = sha256_file(src)
+        existing = (self.manifest(force=True).get(key) or {}).get("versions", {})
+        for known, info in existing.items():
+            if info["sha256"] == digest and version in (None, known):
+                logger.info("%s: %s is already registered as version %s", key, src, known)
+                if activate:
+                    self.activate(key, known)
+                return dict(info, version=known)
+        version = version or time.strftime("%Y%m%d%H%M%S", time.gmtime())
+        if not _VERSION_RE.match(key) or not _VERSION_RE.match(version):
+            raise ValueError(f"Invalid model key or version label {key!r} {version!r}")
+        if version in existing:
+            raise ValueError(f"{key} version {version} already exists with a different checksum")
+
+        rel = os.path.join(key, version + ".pt")
+        dest = os.path.join(self.root, rel)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        shutil.copyfile(src, dest + ".tmp")
+        os.replace(dest + ".tmp", dest)
+        info = {"file": rel, "sha256": digest, "size": os.path.getsize(dest),
+                "registeredAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "note": note}
+
+        def change(manifest):
+            entry = manifest.setdefault(key, {"active": None, "versions": {}})
+            entry["versions"][version] = info
+            if activate:
+                entry["active"] = version
+        self._update_manifest(change)
+        logger.info("Registered %s version %s (%s)", key, version, digest[:12])
+        return dict(info, version=version)
+
+    def adopt(self, key: str, path: Optional[str]):
+        """Register a configured weight file (e.g. TREND_MODEL_PATH) unless the store already holds it."""
+        if not path:
+            return
+        try:
+            active, _ = self.active(key)
+            self.register(key, path, activate=active is None, note="adopted from environment")
+        except (OSError, ValueError) as e:
+            logger.warning("Could not register %s weights from %s: %s", key, path, e)
+
+    def activate(self, key: str, version: str):
+        """Make `version` the active one; workers swap it in on the model's next use."""
+        def change(manifest):
+            entry = manifest.get(key)
+            if not entry or version not in entry["versions"]:
+                raise KeyError(f"{key} has no version {version}")
+            entry["active"] = version
+        self._update_manifest(change)
+
+    # ---- residency ----
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get(self, key: str, fallback: Callable[[], object], build: Optional[Callable[[], object]] = None):
+        """The resident model for `key`, loading the active version (or fallback()) if needed.
+
+        If build() returns an empty nn.Module the stored file is read as its
+        state dict (weights_only); otherwise the file holds a whole pickled model.
+        """
+        self._ensure_sweeper()
+        version, info = self.active(key)
+        want = version or BUILTIN
+        current = self._resident.get(key)
+        if current is not None and current.version == want:
+            current.last_used = time.time()
+            return current.model
+
+        with self._key_lock(key):
+            current = self._resident.get(key)
+            if current is not None and current.version == want:
+                current.last_used = time.time()
+                return current.model
+            start = time.perf_counter()
+            if version is None:
+                model, path = fallback(), None
+            else:
+                model, path = self._load_file(key, version, info, build)
+            MODEL_LOAD.observe(time.perf_counter() - start, key)
+            resident = _Resident(model, want, path, tensor_bytes(model))
+            self._make_room(resident.nbytes, exclude=key)
+            with self._lock:
+                self._resident[key] = resident
+            if current is not None:
+                logger.info("Swapped %s from version %s to %s", key, current.version, want)
+            return model
+
+    def _load_file(self, key, version, info, build):
+        path = os.path.join(self.root, info["file"])
+        st = os.stat(path)
+        stamp = (path, st.st_size, st.st_mtime_ns)
+        if stamp not in self._verified:
+            digest = sha256_file(path)
+            if digest != info["sha256"]:
+                raise RuntimeError(f"Checksum mismatch for {key} version {version}: {digest}")
+            self._verified.add(stamp)
+        module = build() if build is not None else None
+        obj = torch.load(path, map_location="cpu", mmap=True, weights_only=module is not None)
+        if module is not None:
+            module.load_state_dict(obj, assign=True)  # keep the mapped storages instead of copying
+            obj = module
+        if isinstance(obj, torch.nn.Module):
+            if self.device is not None and torch.device(self.device).type != "cpu":
+                obj = obj.to(self.device)
+            obj.eval()
+        return obj, path
+
+    def _make_room(self, incoming: int, exclude: str):
+        with self._lock:
+            used = sum(r.nbytes for k, r in self._resident.items() if k != exclude)
+            victims = sorted((r.last_used, k) for k, r in self._resident.items() if k != exclude)
+        for _, key in victims:
+            if used + incoming <= self.budget:
+                break
+            freed = self.evict(key, reason="budget")
+            used -= freed or 0
+        if used + incoming > self.budget:
+            logger.warning("Model memory budget exceeded: %d bytes resident, %d budget",
+                           used + incoming, self.budget)
+
+    def evict(self, key: str, reason: str = "manual") -> Optional[int]:
+        """Drop this worker's reference to a model; returns the bytes it accounted for."""
+        with self._lock:
+            resident = self._resident.pop(key, None)
+        if resident is None:
+            return None
+        self.evictions += 1
+        logger.info("Evicted %s version %s (%s, %d bytes)", key, resident.version, reason, resident.nbytes)
+        return resident.nbytes
+
+    def sweep(self):
+        cutoff = time.time() - self.idle_seconds
+        for key, resident in list(self._resident.items()):
+            if resident.last_used < cutoff:
+                self.evict(key, reason="idle")
+
+    def hold_sweeper(self):
+        """Never start a sweeper in this process (a pre-fork master); forked children still start their own.
+
+        A fork while the sweeper held self._lock would leave every child with a lock nobody releases.
+        """
+        self._no_sweeper_pid = os.getpid()
+
+    def _ensure_sweeper(self):
+        # threads do not survive fork, so each worker starts its own
+        pid = os.getpid()
+        if self._sweeper_pid == pid or self._no_sweeper_pid == pid or self.idle_seconds <= 0:
+            return
+        with self._lock:
+            if self._sweeper_pid == os.getpid():
+                return
+            self._sweeper_pid = os.getpid()
+        interval = max(1.0, min(60.0, self.idle_seconds / 4))
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.sweep()
+                except Exception:
+                    logger.exception("Model sweep failed")
+        threading.Thread(target=loop, name="model-sweeper", daemon=True).start()
+
+    def is_loaded(self, key: str) -> bool:
+        return key in self._resident
+
+    def status(self, keys=()) -> Dict[str, dict]:
+        """Versions, residency and memory of every known model in this worker."""
+        manifest = self.manifest()
+        now = time.time()
+        out = {}
+        for key in sorted(set(keys) | set(manifest) | set(self._resident)):
+            entry = manifest.get(key) or {}
+            resident = self._resident.get(key)
+            row = {"activeVersion": entry.get("active"),
+                   "versions": [dict(info, version=v) for v, info in sorted(entry.get("versions", {}).items())],
+                   "loaded": resident is not None}
+            if resident is not None:
+                rss = mapped_rss(resident.path) if resident.path else None
+                row.update({"loadedVersion": resident.version,
+                            "tensorBytes": resident.nbytes,
+                            "mappedResidentBytes": rss,
+                            # mapped pages count once here even if other workers share them
+                            "residentBytes": rss if rss is not None else resident.nbytes,
+                            "idleSeconds": round(now - resident.last_used, 1),
+                            "loadedAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(resident.loaded_at))})
+            out[key] = row
+        return out
+
+    def totals(self) -> dict:
+        return {"budgetBytes": self.budget, "idleSeconds": self.idle_seconds, "evictions": self.evictions,
+                "tensorBytes": sum(r.nbytes for r in list(self._resident.values()))}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage versioned model weights.")
+    parser.add_argument("--store", default=MODEL_STORE)
+    sub = parser.add_subparsers(dest="command", required=True)
+    reg = sub.add_parser("register", help="copy a weight file into the store as a new version")
+    reg.add_argument("key")
+    reg.add_argument("path")
+    reg.add_argument("--version")
+    reg.add_argument("--note", default="")
+    reg.add_argument("--no-activate", action="store_true")
+    act = sub.add_parser("activate", help="switch the active version (hot swap)")
+    act.add_argument("key")
+    act.add_argument("version")
+    sub.add_parser("list", help="print the manifest")
+    args = parser.parse_args(argv)
+
+    registry = ModelRegistry(args.store)
+    if args.command == "register":
+        info = registry.register(args.key, args.path, args.version, not args.no_activate, args.note)
+        print(json.dumps(info, indent=2))
+    elif args.command == "activate":
+        try:
+            registry.activate(args.key, args.version)
+        except KeyError as e:
+            sys.exit(str(e))
+    else:
+        print(json.dumps(registry.manifest(force=True), indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -7,11 +7,16 @@ import torch
 import torchaudio  # optional; used in some wrappers for audio/video frame extraction
 import numpy as np
 
+from metrics import MODEL_LOAD
+
 # set device (auto)
 DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
 # simple thread-safe lazy loader pattern
 class _LazyModel:
+    name = None  # model key for metrics; set by the app
+    registry = None  # ModelRegistry that owns residency and versions; set by the app
+
     def __init__(self):
         self._lock = threading.Lock()
         self._loaded = False
@@ -20,13 +25,28 @@ class _LazyModel:
     def load(self):
         raise NotImplementedError()
 
+    def build(self):
+        """Empty nn.Module for registered weights stored as a state dict; None if files hold whole models."""
+        return None
+
+    @property
+    def loaded(self) -> bool:
+        if self.registry is not None and self.name:
+            return self.registry.is_loaded(self.name)
+        return self._loaded
+
     @property
     def model(self):
+        if self.registry is not None and self.name:
+            # the registry serves the active stored version, or load() if none is registered
+            return self.registry.get(self.name, self.load, self.build)
         if not self._loaded:
             with self._lock:
                 if not self._loaded:
+                    start = time.perf_counter()
                     self._model = self.load()
                     self._loaded = True
+                    MODEL_LOAD.observe(time.perf_counter() - start, self.name or type(self).__name__)
         return self._model
 
 
@@ -63,9 +83,9 @@ class TrendEnsembleWrapper(BaseModelWrapper):
         # lazy.load -> create a small ensemble or load weights
         class Loader(_LazyModel):
             def load(inner_self):
-                # In prod: load your ensemble of PyTorch models and pre/post processors
-                # Example: return torch.load(self.model_path, map_location=DEVICE)
-                # For demo create a tiny torch.nn.Module that returns slope.
+                # In prod the ensemble's weights are registered in the model registry
+                # (TREND_MODEL_PATH is adopted as a version at startup); this fallback
+                # only runs while no version is active. For demo a tiny module that returns slope.
                 class Dummy(torch.nn.Module):
                     def forward(self, x):
                         return torch.tensor([0.02])  # dummy upward trend
@@ -228,3 +248,26 @@ class PersonalizedPlanWrapper(BaseModelWrapper):
     def explain_prompt(self, result):
         return "Summarize the periodized plan in plain English and identify three milestones for progress checks."
 
+
+MODEL_CLASSES = {
+    "trend-ensemble": TrendEnsembleWrapper,
+    "injury-risk": InjuryRiskWrapper,
+    "technique-analysis": TechniqueAnalysisWrapper,
+    "workload-optimizer": WorkloadOptimizerWrapper,
+    "recovery-predictor": RecoveryPredictorWrapper,
+    "talent-scout": TalentScoutWrapper,
+    "personalized-plan": PersonalizedPlanWrapper,
+}
+
+
+def build_wrappers(registry=None) -> Dict[str, BaseModelWrapper]:
+    """One lazy instance of every wrapper, keyed and wired to `registry` (web or inference worker alike)."""
+    wrappers = {}
+    for key, cls in MODEL_CLASSES.items():
+        wrapper = cls()
+        wrapper.lazy.name = key  # labels model_load_seconds and keys the registry
+        wrapper.lazy.registry = registry
+        wrappers[key] = wrapper
+    if registry is not None:
+        registry.adopt("trend-ensemble", wrappers["trend-ensemble"].model_path)
+    return wrappers
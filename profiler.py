@@ -0,0 +1,153 @@
+# profiler.py
+"""
+On-demand request profiling.
+
+A request is profiled when an admin sends `X-Profile: 1` (or `?_profile=1`),
+or at random with probability PROFILE_SAMPLE_RATE. Two modes are available:
+
+  sample   (default) a helper thread snapshots the request thread's stack every
+           PROFILE_INTERVAL seconds via sys._current_frames(). The output is a
+           folded-stack file (`frame;frame;frame count` per line) that
+           flamegraph.pl, speedscope or inferno can render directly.
+  cprofile deterministic cProfile of the request thread, written as .pstats.
+
+Each profile is saved under PROFILE_DIR next to a .json file holding the
+request metadata. Only the newest PROFILE_KEEP profiles are kept.
+"""
+import cProfile
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import List, Optional
+
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "./profiles")
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", "0.005"))
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", "200"))
+MODES = ("sample", "cprofile")
+
+
+def should_sample() -> bool:
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Samples one thread's stack on a timer and aggregates identical stacks."""
+
+    def __init__(self, thread_ident: int, interval: float = PROFILE_INTERVAL):
+        self.thread_ident = thread_ident
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_ident)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class RequestProfile:
+    def __init__(self, mode: str, trigger: str):
+        self.mode = mode
+        self.trigger = trigger
+        self.id = time.strftime("%Y%m%dT%H%M%S", time.gmtime()) + "-" + uuid.uuid4().hex[:8]
+        self.started = time.perf_counter()
+        self._sampler = None
+        self._cprofile = None
+
+    def start(self):
+        if self.mode == "cprofile":
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        else:
+            self._sampler = StackSampler(threading.get_ident())
+            self._sampler.start()
+        return self
+
+    def finish(self, metadata: dict, root: str = PROFILE_DIR) -> dict:
+        """Stop profiling and write the profile plus <id>.json; returns the metadata written."""
+        duration = time.perf_counter() - self.started
+        os.makedirs(root, exist_ok=True)
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            filename = self.id + ".pstats"
+            self._cprofile.dump_stats(os.path.join(root, filename))
+            samples = None
+        else:
+            self._sampler.stop()
+            filename = self.id + ".folded"
+            with open(os.path.join(root, filename), "w") as f:
+                f.write(self._sampler.folded())
+            samples = self._sampler.samples
+
+        meta = {"id": self.id, "file": filename, "mode": self.mode, "trigger": self.trigger,
+                "durationMs": round(duration * 1000, 2), "samples": samples,
+                "createdAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), **metadata}
+        with open(os.path.join(root, self.id + ".json"), "w") as f:
+            json.dump(meta, f)
+        prune(root)
+        return meta
+
+
+def prune(root: str = PROFILE_DIR, keep: int = PROFILE_KEEP):
+    metas = sorted(n for n in os.listdir(root) if n.endswith(".json"))
+    for name in metas[:-keep] if len(metas) > keep else []:
+        stem = name[:-len(".json")]
+        for ext in (".json", ".folded", ".pstats"):
+            try:
+                os.remove(os.path.join(root, stem + ext))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles(root: str = PROFILE_DIR, limit: int = 50) -> List[dict]:
+    """Metadata of the newest profiles first."""
+    try:
+        names = sorted((n for n in os.listdir(root) if n.endswith(".json")), reverse=True)[:limit]
+    except FileNotFoundError:
+        return []
+    out = []
+    for name in names:
+        try:
+            with open(os.path.join(root, name)) as f:
+                out.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return out
+
+
+def profile_path(filename: str, root: str = PROFILE_DIR) -> Optional[str]:
+    """Path of a profile output file, or None if the name is not one of ours."""
+    if os.path.basename(filename) != filename or not filename.endswith((".folded", ".pstats", ".json")):
+        return None
+    path = os.path.join(root, filename)
+    return path if os.path.isfile(path) else None
@@ -0,0 +1,158 @@
+# profiles.py
+"""
+Student profile assembly for /api/profile/<id>.
+
+A profile is built from users, student_statistics, student_achievements,
+student_sports, sports_credits and student_progress in three queries, then
+serialized once and cached. Triggers keep a per-student counter in
+profile_versions, so a cached document is reused until one of its rows changes.
+"""
+import json
+from typing import Any, Dict, Optional, Tuple
+
+from store import LocalStore
+
+# table -> column holding the student id
+PROFILE_TABLES = {
+    "users": "id",
+    "student_statistics": "student_id",
+    "student_achievements": "student_id",
+    "student_sports": "student_id",
+    "sports_credits": "student_id",
+    "student_progress": "student_id",
+}
+
+STAT_COLUMNS = (
+    "height", "weight", "bmi", "vertical_jump", "broad_jump", "flying_10",
+    "track_interval", "hang_clean", "bench", "back_squat", "front_squat",
+    "balance_left", "balance_right", "jump_force", "air_time", "workout_consistency",
+)
+
+PROFILE_CACHE_SIZE = 2048
+
+
+def profile_version_trigger_sql():
+    """Triggers bumping profile_versions for every student a write touches."""
+    bump = ("INSERT INTO profile_versions (student_id, version) VALUES ({ref}, 1) "
+            "ON CONFLICT(student_id) DO UPDATE SET version = version + 1;")
+    statements = []
+    for table, col in PROFILE_TABLES.items():
+        for event, refs in (("INSERT", ("NEW",)), ("UPDATE", ("OLD", "NEW")), ("DELETE", ("OLD",))):
+            body = "\n".join(bump.format(ref=f"{r}.{col}") for r in refs)
+            statements.append(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_profile_{event.lower()}
+                AFTER {event} ON {table}
+                BEGIN
+                    {body}
+                END
+            """)
+    return statements
+
+
+def _iso(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def assemble_profile(db, student_id: int) -> Optional[Dict[str, Any]]:
+    """Load one profile in a fixed three queries. Returns None for unknown ids."""
+    stat_cols = ", ".join(f"st.{c}" for c in STAT_COLUMNS)
+    user = db.execute(f"""
+        SELECT u.id, u.name, u.email, u.role, u.created_at,
+               {stat_cols}, st.updated_at AS stats_updated_at,
+               p.streak_count, p.last_completed,
+               (SELECT COALESCE(SUM(credits), 0) FROM sports_credits WHERE student_id = u.id) AS credits
+        FROM users u
+        LEFT JOIN student_statistics st ON st.student_id = u.id
+        LEFT JOIN student_progress p
+               ON p.id = (SELECT MAX(id) FROM student_progress WHERE student_id = u.id)
+        WHERE u.id = ?
+    """, (student_id,)).fetchone()
+    if not user:
+        return None
+
+    achievements = db.execute("""
+        SELECT id, title, description, achieved_at
+        FROM student_achievements
+        WHERE student_id = ?
+        ORDER BY achieved_at DESC, id DESC
+    """, (student_id,)).fetchall()
+
+    sports = db.execute("""
+        SELECT ss.id, ss.sport_name, ss.season, ss.coach_notes,
+               COALESCE(SUM(sc.credits), 0) AS credits
+        FROM student_sports ss
+        LEFT JOIN sports_credits sc ON sc.sport_id = ss.id
+        WHERE ss.student_id = ?
+        GROUP BY ss.id
+        ORDER BY ss.created_at DESC, ss.id DESC
+    """, (student_id,)).fetchall()
+
+    stats = {c: user[c] for c in STAT_COLUMNS if user[c] is not None}
+    last_active = max((v for v in (user["last_completed"], user["stats_updated_at"]) if v is not None), default=None)
+
+    return {
+        "id": user["id"],
+        "displayName": user["name"] or user["email"],
+        "role": user["role"],
+        "classYear": None,
+        "summary": None,
+        "profilePic": None,
+        "sports": [f"{s['sport_name']} ({s['season']})" if s["season"] else s["sport_name"] for s in sports],
+        "sportDetails": [
+            {"id": s["id"], "name": s["sport_name"], "season": s["season"],
+             "coachNotes": s["coach_notes"], "credits": s["credits"]}
+            for s in sports
+        ],
+        "achievements": [
+            {"id": a["id"], "title": a["title"], "description": a["description"],
+             "date": _iso(a["achieved_at"])}
+            for a in achievements
+        ],
+        "stats": stats,
+        "history": [],
+        "badges": [],
+        "credits": user["credits"],
+        "streak": user["streak_count"] or 0,
+        "lastActive": _iso(last_active),
+        "memberSince": _iso(user["created_at"]),
+    }
+
+
+class ProfileCache:
+    """Serialized profiles keyed by student id and tagged with their profile_versions counter.
+
+    Entries live in a store from store.py; with the shared SQLite store every
+    worker reuses the documents any other worker assembled.
+    """
+
+    def __init__(self, store=None, maxsize: int = PROFILE_CACHE_SIZE):
+        self.store = store if store is not None else LocalStore(maxsize)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def current_version(db, student_id: int) -> int:
+        row = db.execute("SELECT version FROM profile_versions WHERE student_id = ?", (student_id,)).fetchone()
+        return row[0] if row else 0
+
+    def get(self, db, student_id: int) -> Tuple[Optional[bytes], int]:
+        """Return (serialized profile or None, version), assembling on a miss."""
+        version = self.current_version(db, student_id)
+        cached = self.store.get(f"profile:{student_id}")
+        if cached and cached[0] == version:
+            self.hits += 1
+            return cached[1], version
+
+        self.misses += 1
+        profile = assemble_profile(db, student_id)
+        if profile is None:
+            return None, version
+        body = json.dumps(profile, separators=(",", ":")).encode("utf-8")
+        self.store.set(f"profile:{student_id}", (version, body))
+        return body, version
+
+    def invalidate(self, student_id: Optional[int] = None):
+        if student_id is None:
+            self.store.delete_prefix("profile:")
+        else:
+            self.store.delete(f"profile:{student_id}")
@@ -0,0 +1,159 @@
+# progress.py
+"""
+Streak and consistency bookkeeping for completed submissions.
+
+  student_progress.streak_count        consecutive on-time completions (a late one resets it to 0)
+  student_progress.last_completed      time of the latest completion
+  student_statistics.workout_consistency  percent of completions that were on time
+
+record_completion() maintains these in O(1) per completed submission.
+recompute() rebuilds them for every student in one vectorized pass over
+submissions and reports where the incremental values disagree:
+
+    python progress.py            # verify only
+    python progress.py --apply    # verify and overwrite
+"""
+import argparse
+import sqlite3
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# a stored consistency is right if it is a 1-decimal rounding of the exact percentage
+CONSISTENCY_TOLERANCE = 0.05 + 1e-9
+
+
+def record_completion(cur, submission_id: int):
+    """Fold one just-completed submission into its student's streak and consistency."""
+    row = cur.execute(
+        "SELECT student_id, submitted_at, late FROM submissions WHERE id = ? AND completed = 1",
+        (submission_id,),
+    ).fetchone()
+    if not row:
+        return
+    student_id, submitted_at, late = row[0], row[1], row[2]
+    on_time = 0 if late else 1
+
+    cur.execute("""
+                INSERT INTO student_progress (student_id, streak_count, last_completed, forms_completed, forms_on_time)
+                VALUES (?, ?, ?, 1, ?)
+                    ON CONFLICT(student_id) DO UPDATE SET
+                    streak_count = CASE WHEN excluded.forms_on_time = 1 THEN streak_count + 1 ELSE 0 END,
+                                                   last_completed = excluded.last_completed,
+                                                   forms_completed = forms_completed + 1,
+                                                   forms_on_time = forms_on_time + excluded.forms_on_time
+                """, (student_id, on_time, submitted_at, on_time))
+    cur.execute("""
+                INSERT INTO student_statistics (student_id, workout_consistency)
+                SELECT student_id, ROUND(100.0 * forms_on_time / forms_completed, 1)
+                FROM student_progress
+                WHERE student_id = ?
+                    ON CONFLICT(student_id) DO UPDATE SET workout_consistency = excluded.workout_consistency
+                """, (student_id,))
+
+
+def compute_all(conn) -> Dict[int, dict]:
+    """Derive every student's progress from scratch with NumPy group operations."""
+    rows = conn.execute("""
+                        SELECT student_id, late, submitted_at
+                        FROM submissions
+                        WHERE completed = 1 AND submitted_at IS NOT NULL
+                        ORDER BY student_id, submitted_at, id
+                        """).fetchall()
+    if not rows:
+        return {}
+
+    students = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    late = np.fromiter((bool(r[1]) for r in rows), dtype=bool, count=len(rows))
+    stamps = [r[2] for r in rows]
+
+    starts = np.flatnonzero(np.r_[True, students[1:] != students[:-1]])
+    ends = np.r_[starts[1:], len(rows)]
+    completed = ends - starts
+    on_time = np.add.reduceat((~late).astype(np.int64), starts)
+
+    # streak = on-time rows after the group's last late row
+    positions = np.arange(len(rows))
+    last_late = np.maximum.reduceat(np.where(late, positions, -1), starts)
+    streak = ends - 1 - np.maximum(last_late, starts - 1)
+    # half away from zero like SQLite's ROUND() in record_completion (np.round goes half to even)
+    consistency = np.floor(1000.0 * on_time / completed + 0.5) / 10
+
+    return {
+        int(students[s]): {
+            "streak_count": int(streak[i]),
+            "last_completed": stamps[ends[i] - 1],
+            "forms_completed": int(completed[i]),
+            "forms_on_time": int(on_time[i]),
+            "workout_consistency": float(consistency[i]),
+        }
+        for i, s in enumerate(starts)
+    }
+
+
+def _differs(have: Optional[dict], want: dict) -> bool:
+    if have is None:
+        return True
+    if any(have[k] != want[k] for k in want if k != "workout_consistency"):
+        return True
+    stored, expected = have["workout_consistency"], want["workout_consistency"]
+    if stored is None or expected is None:
+        return stored is not expected
+    exact = 100.0 * want["forms_on_time"] / want["forms_completed"]
+    return abs(stored - exact) > CONSISTENCY_TOLERANCE
+
+
+def recompute(conn, apply: bool = False) -> List[dict]:
+    """Compare stored progress with a full recompute; optionally write the recomputed values."""
+    expected = compute_all(conn)
+    stored = {
+        r[0]: {"streak_count": r[1] or 0, "last_completed": r[2], "forms_completed": r[3] or 0,
+               "forms_on_time": r[4] or 0, "workout_consistency": r[5]}
+        for r in conn.execute("""
+                              SELECT p.student_id, p.streak_count, p.last_completed, p.forms_completed,
+                                     p.forms_on_time, st.workout_consistency
+                              FROM student_progress p
+                                       LEFT JOIN student_statistics st ON st.student_id = p.student_id
+                              """)
+    }
+
+    mismatches = []
+    for student_id in expected.keys() | stored.keys():
+        want = expected.get(student_id, {"streak_count": 0, "last_completed": None, "forms_completed": 0,
+                                         "forms_on_time": 0, "workout_consistency": None})
+        have = stored.get(student_id)
+        if _differs(have, want):
+            mismatches.append({"student_id": student_id, "stored": have, "expected": want})
+
+    if apply and mismatches:
+        fixes = [(m["student_id"], m["expected"]) for m in mismatches]
+        conn.executemany("""
+                         INSERT INTO student_progress (student_id, streak_count, last_completed, forms_completed, forms_on_time)
+                         VALUES (?, ?, ?, ?, ?)
+                             ON CONFLICT(student_id) DO UPDATE SET
+                             streak_count = excluded.streak_count,
+                                                            last_completed = excluded.last_completed,
+                                                            forms_completed = excluded.forms_completed,
+                                                            forms_on_time = excluded.forms_on_time
+                         """, [(sid, e["streak_count"], e["last_completed"], e["forms_completed"], e["forms_on_time"])
+                               for sid, e in fixes])
+        conn.executemany("""
+                         INSERT INTO student_statistics (student_id, workout_consistency)
+                         VALUES (?, ?)
+                             ON CONFLICT(student_id) DO UPDATE SET workout_consistency = excluded.workout_consistency
+                         """, [(sid, e["workout_consistency"]) for sid, e in fixes])
+        conn.commit()
+    return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verify (and optionally repair) streaks and consistency.")
+    parser.add_argument("--db", default="fitness_app.db")
+    parser.add_argument("--apply", action="store_true", help="overwrite stored values with the recompute")
+    args = parser.parse_args()
+
+    with sqlite3.connect(args.db) as conn:
+        found = recompute(conn, apply=args.apply)
+    for m in found[:20]:
+        print(m)
+    print(f"{len(found)} students differ" + (" (repaired)" if args.apply and found else ""))
@@ -0,0 +1,309 @@
+# reflections.py
+"""
+Similarity search and clustering over students' free-text reflections.
+
+Each completed submission's student_response is embedded once, in batches,
+into reflection_vectors. The embedding is a sparse vector of signed hashed
+unigram and bigram counts (sublinear TF, DIM buckets, stopwords dropped),
+stored as two small BLOBs: uint16 bucket ids and float32 weights. No model
+or vocabulary is fitted, so a new response never changes existing vectors.
+
+ReflectionIndex keeps, per form, a contiguous float32 matrix of those rows in
+each worker. The matrix grows in place as new submissions are embedded.
+Submissions are completed in any order (their rows exist from assignment
+on), so a sync compares the form's vector count with the cached one and
+loads the ids it doesn't hold yet, rather than ids above the highest seen.
+Queries weight the columns by IDF over the form's own responses, so words
+that every answer shares (usually the question's) count for little. Rows
+are L2-normalised; similar() is then one matrix-vector product plus an
+argpartition, and clusters() runs spherical k-means on the same matrix.
+
+    python reflections.py --db fitness_app.db    # embed every response not yet embedded
+"""
+import argparse
+import hashlib
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter, OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+DIM = 1024
+EMBED_BATCH = 500
+SQL_CHUNK = 900  # ids per IN (...) query, under SQLite's default variable limit
+MAX_CACHED_FORMS = 256
+MAX_CLUSTERS = 12
+
+STOPWORDS = frozenset("""
+a about after all also am an and any are as at be because been but by can could did do does doing
+for from had has have having he her here hers him his how i if in into is it its just me more most my
+no not of on or our out over so some than that the their them then there these they this those to too
+up very was we were what when where which while who why will with would you your i'm it's don't
+""".split())
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+
+def tokens(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+def _bucket(term: str) -> Tuple[int, float]:
+    h = int.from_bytes(hashlib.blake2b(term.encode(), digest_size=4).digest(), "little")
+    return h % DIM, (1.0 if h & 0x80000000 else -1.0)
+
+
+def features(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """(bucket ids, weights) of one response; signed hashing keeps collisions unbiased."""
+    words = tokens(text)
+    counts = Counter(words)
+    counts.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    dense = {}
+    for term, n in counts.items():
+        bucket, sign = _bucket(term)
+        dense[bucket] = dense.get(bucket, 0.0) + sign * (1.0 + math.log(n))
+    ids = np.fromiter(dense.keys(), dtype=np.uint16, count=len(dense))
+    weights = np.fromiter(dense.values(), dtype=np.float32, count=len(dense))
+    return ids, weights
+
+
+def densify(rows) -> np.ndarray:
+    """Stack (bucket ids, weights) pairs into an (n, DIM) float32 matrix."""
+    out = np.zeros((len(rows), DIM), dtype=np.float32)
+    for i, (ids, weights) in enumerate(rows):
+        out[i, ids] = weights  # ids are unique per row
+    return out
+
+
+def embed_missing(db, form_id: Optional[int] = None, batch: int = EMBED_BATCH) -> int:
+    """Embed completed responses that have no vector yet; returns how many were added (not committed)."""
+    where, params = "", []
+    if form_id is not None:
+        where, params = "AND s.form_id = ?", [form_id]
+    added = 0
+    while True:
+        rows = db.execute(f"""
+            SELECT s.id, s.form_id, s.student_response
+            FROM submissions s
+            LEFT JOIN reflection_vectors r ON r.submission_id = s.id
+            WHERE r.submission_id IS NULL AND s.completed = 1
+              AND s.student_response IS NOT NULL AND TRIM(s.student_response) != '' {where}
+            ORDER BY s.id
+            LIMIT ?
+        """, params + [batch]).fetchall()
+        if not rows:
+            return added
+        encoded = []
+        for sub_id, fid, text in rows:
+            ids, weights = features(text)
+            encoded.append((sub_id, fid, ids.tobytes(), weights.tobytes()))
+        db.executemany("INSERT OR REPLACE INTO reflection_vectors (submission_id, form_id, terms, weights) "
+                       "VALUES (?, ?, ?, ?)", encoded)
+        added += len(encoded)
+        if len(rows) < batch:
+            return added
+
+
+class FormMatrix:
+    """Raw hashed-TF rows of one form, in the order they were loaded, with room to grow."""
+
+    def __init__(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self._raw = np.zeros((0, DIM), dtype=np.float32)
+        self.n = 0
+        self._weighted = None
+        self._idf = None
+
+    def missing(self, ids: np.ndarray) -> np.ndarray:
+        """The given submission ids that have no row here yet."""
+        return ids[~np.isin(ids, self.ids[:self.n])]
+
+    def append(self, ids: np.ndarray, rows: np.ndarray):
+        need = self.n + len(ids)
+        if need > len(self._raw):
+            capacity = max(need, 2 * len(self._raw), 16)
+            grown = np.zeros((capacity, DIM), dtype=np.float32)
+            grown[:self.n] = self._raw[:self.n]
+            self._raw = grown
+            self.ids = np.concatenate([self.ids[:self.n], np.zeros(capacity - self.n, dtype=np.int64)])
+        self._raw[self.n:need] = rows
+        self.ids[self.n:need] = ids
+        self.n = need
+        self._weighted = None
+
+    def weighted(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(row-normalised TF-IDF matrix, idf per bucket), recomputed only after an append."""
+        if self._weighted is None:
+            raw = self._raw[:self.n]
+            df = np.count_nonzero(raw, axis=0)
+            idf = (np.log((1.0 + self.n) / (1.0 + df)) + 1.0).astype(np.float32)
+            weighted = raw * idf
+            norms = np.linalg.norm(weighted, axis=1, keepdims=True)
+            weighted /= np.maximum(norms, 1e-12)
+            self._weighted, self._idf = weighted, idf
+        return self._weighted, self._idf
+
+
+def top_k(matrix: np.ndarray, query: np.ndarray, k: int, exclude: Optional[int] = None) -> List[Tuple[int, float]]:
+    """(row, cosine) of the k rows most similar to a normalised query, best first."""
+    scores = matrix @ query
+    if exclude is not None:
+        scores[exclude] = -np.inf
+    k = min(k, len(scores) - (exclude is not None))
+    if k <= 0:
+        return []
+    rows = np.argpartition(-scores, k - 1)[:k]
+    rows = rows[np.argsort(-scores[rows])]
+    return [(int(r), float(scores[r])) for r in rows]
+
+
+def spherical_kmeans(matrix: np.ndarray, k: int, iterations: int = 25, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Cluster normalised rows by cosine; k-means++ seeding, deterministic for a given seed."""
+    n = len(matrix)
+    rng = np.random.default_rng(seed)
+    centroids = np.empty((k, matrix.shape[1]), dtype=np.float32)
+    centroids[0] = matrix[rng.integers(n)]
+    closest = 1.0 - matrix @ centroids[0]
+    for i in range(1, k):
+        probs = np.maximum(closest, 0).astype(np.float64)
+        total = probs.sum()
+        pick = rng.choice(n, p=probs / total) if total > 0 else rng.integers(n)
+        centroids[i] = matrix[pick]
+        closest = np.minimum(closest, 1.0 - matrix @ centroids[i])
+
+    labels = np.full(n, -1)
+    for _ in range(iterations):
+        new_labels = np.argmax(matrix @ centroids.T, axis=1)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for c in range(k):
+            members = matrix[labels == c]
+            if len(members):
+                centre = members.sum(axis=0)
+                centroids[c] = centre / max(np.linalg.norm(centre), 1e-12)
+    return labels, centroids
+
+
+def default_clusters(n: int) -> int:
+    return max(2, min(MAX_CLUSTERS, int(round(math.sqrt(n / 2)))))
+
+
+class ReflectionIndex:
+    """Per-worker cache of form matrices; vectors are only ever added, so syncing reads just the new ones."""
+
+    def __init__(self, max_forms: int = MAX_CACHED_FORMS):
+        self.max_forms = max_forms
+        self._forms = OrderedDict()
+        self._lock = threading.Lock()
+
+    def matrix(self, db, form_id: int) -> FormMatrix:
+        with self._lock:
+            fm = self._forms.get(form_id)
+            if fm is None:
+                fm = self._forms[form_id] = FormMatrix()
+            self._forms.move_to_end(form_id)
+            while len(self._forms) > self.max_forms:
+                self._forms.popitem(last=False)
+
+        if embed_missing(db, form_id):
+            db.commit()
+        # one index-only count; the id list is read only when it shows new vectors
+        count = db.execute("SELECT COUNT(*) FROM reflection_vectors WHERE form_id = ?", (form_id,)).fetchone()[0]
+        if count == fm.n:
+            return fm
+        stored = np.array([r[0] for r in db.execute(
+            "SELECT submission_id FROM reflection_vectors WHERE form_id = ?", (form_id,))], dtype=np.int64)
+        with self._lock:
+            new_ids = fm.missing(stored).tolist()
+        rows = []
+        for k in range(0, len(new_ids), SQL_CHUNK):
+            chunk = new_ids[k:k + SQL_CHUNK]
+            rows.extend(db.execute("SELECT submission_id, terms, weights FROM reflection_vectors "
+                                   f"WHERE submission_id IN ({', '.join('?' * len(chunk))}) ORDER BY submission_id",
+                                   chunk).fetchall())
+        if rows:
+            with self._lock:
+                fresh = set(fm.missing(np.array([r[0] for r in rows], dtype=np.int64)).tolist())
+                rows = [r for r in rows if r[0] in fresh]  # another thread may have appended them
+                if rows:
+                    pairs = [(np.frombuffer(r[1], dtype=np.uint16), np.frombuffer(r[2], dtype=np.float32)) for r in rows]
+                    fm.append(np.array([r[0] for r in rows], dtype=np.int64), densify(pairs))
+        return fm
+
+    def snapshot(self, db, form_id: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(submission ids, normalised TF-IDF rows, idf) of a form; later appends don't touch them."""
+        fm = self.matrix(db, form_id)
+        with self._lock:
+            weighted, idf = fm.weighted()
+            return fm.ids[:len(weighted)].copy(), weighted, idf
+
+    def similar(self, db, form_id: int, submission_id: Optional[int] = None, text: Optional[str] = None,
+                k: int = 10) -> List[Tuple[int, float]]:
+        """(submission id, cosine) of the responses closest to a submission or a free-text query."""
+        ids, weighted, idf = self.snapshot(db, form_id)
+        if not len(ids):
+            return []
+        exclude = None
+        if submission_id is not None:
+            hit = np.flatnonzero(ids == submission_id)
+            if not len(hit):
+                raise KeyError(submission_id)
+            exclude = int(hit[0])
+            query = weighted[exclude]
+        else:
+            query = densify([features(text or "")])[0] * idf
+            norm = np.linalg.norm(query)
+            if norm == 0:
+                return []
+            query /= norm
+        return [(int(ids[row]), score) for row, score in top_k(weighted, query, k, exclude)]
+
+    def clusters(self, db, form_id: int, k: Optional[int] = None) -> List[dict]:
+        """Groups of a form's responses, largest first, each with its most central member."""
+        ids, weighted, _ = self.snapshot(db, form_id)
+        if len(ids) < 2:
+            return [{"submissionIds": ids.tolist(), "exemplarId": int(ids[0]), "cohesion": 1.0}] if len(ids) else []
+        k = min(k or default_clusters(len(ids)), len(ids))
+        labels, centroids = spherical_kmeans(weighted, k)
+        out = []
+        for c in range(k):
+            rows = np.flatnonzero(labels == c)
+            if not len(rows):
+                continue
+            sims = weighted[rows] @ centroids[c]
+            out.append({"submissionIds": ids[rows].tolist(),
+                        "exemplarId": int(ids[rows[np.argmax(sims)]]),
+                        "cohesion": round(float(sims.mean()), 3)})
+        out.sort(key=lambda cl: len(cl["submissionIds"]), reverse=True)
+        return out
+
+
+def top_terms(texts_by_cluster: List[List[str]], n: int = 3) -> List[List[str]]:
+    """Words over-represented in each cluster relative to the whole form."""
+    doc_words = [[set(tokens(t)) for t in texts] for texts in texts_by_cluster]
+    total_docs = sum(len(d) for d in doc_words)
+    form_df = Counter(w for docs in doc_words for words in docs for w in words)
+    out = []
+    for docs in doc_words:
+        df = Counter(w for words in docs for w in words)
+        scored = sorted(df, key=lambda w: (-df[w] * math.log(1 + total_docs / form_df[w]), w))
+        out.append([w for w in scored if df[w] > 1 or len(docs) == 1][:n])
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embed student reflections that have no vector yet.")
+    parser.add_argument("--db", default="fitness_app.db")
+    args = parser.parse_args()
+    conn = sqlite3.connect(args.db)
+    added = embed_missing(conn)
+    conn.commit()
+    conn.close()
+    print(f"Embedded {added} responses")
+
+
+if __name__ == "__main__":
+    main()
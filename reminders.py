@@ -0,0 +1,185 @@
+# reminders.py
+"""
+Deadline reminders and late flags for assigned forms.
+
+DeadlineScheduler keeps a min-heap of upcoming boundaries (REMINDER_LEAD before
+each due date, and the due date itself) and sleeps until the earliest one. Each
+wake runs process_due(), which handles every form at once inside one
+BEGIN IMMEDIATE transaction. Each (submission, kind) pair gets one row in
+form_reminders, so restarts and multiple workers never send a reminder twice.
+"""
+import heapq
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, time as dtime
+from typing import Optional
+
+logger = logging.getLogger("reminders")
+
+REMINDER_LEAD = timedelta(hours=24)
+# Upper bound on a single sleep; also how often forms assigned by other workers are picked up.
+RESYNC_INTERVAL = 3600
+
+
+def parse_due_date(value) -> Optional[datetime]:
+    """Accept a datetime or ISO string; a bare date means the end of that day."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    text = str(value).strip()
+    if len(text) == 10:
+        return datetime.combine(datetime.strptime(text, "%Y-%m-%d").date(), dtime(23, 59, 59))
+    parsed = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = (parsed - parsed.utcoffset()).replace(tzinfo=None)
+    return parsed
+
+
+def process_due(conn, now: datetime, lead: timedelta = REMINDER_LEAD) -> dict:
+    """
+    Send 'due soon' reminders and flag overdue pending submissions as late.
+    Safe to call any number of times: the markers in form_reminders make it idempotent.
+    """
+    batch = uuid.uuid4().hex
+    cur = conn.cursor()
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        # due soon: pending, not yet past due, due within the lead window
+        cur.execute("""
+                    INSERT OR IGNORE INTO form_reminders (submission_id, kind, batch_id, sent_at)
+                    SELECT s.id, 'reminder', ?, ?
+                    FROM forms f
+                             JOIN submissions s ON s.form_id = f.id AND s.completed = 0
+                    WHERE f.status = 'active' AND f.due_date > ? AND f.due_date <= ?
+                    """, (batch, now, now, now + lead))
+        reminded = cur.rowcount
+
+        # overdue: pending and past due
+        cur.execute("""
+                    INSERT OR IGNORE INTO form_reminders (submission_id, kind, batch_id, sent_at)
+                    SELECT s.id, 'late', ?, ?
+                    FROM forms f
+                             JOIN submissions s ON s.form_id = f.id AND s.completed = 0
+                    WHERE f.status = 'active' AND f.due_date <= ? AND s.late = 0
+                    """, (batch, now, now))
+        flagged = cur.rowcount
+
+        if flagged:
+            cur.execute("""
+                        UPDATE submissions SET late = 1
+                        WHERE id IN (SELECT submission_id FROM form_reminders WHERE batch_id = ? AND kind = 'late')
+                        """, (batch,))
+
+        if reminded or flagged:
+            cur.execute("""
+                        INSERT INTO notifications (user_id, type, title, message, created_at)
+                        SELECT s.student_id,
+                               CASE r.kind WHEN 'late' THEN 'late' ELSE 'update' END,
+                               CASE r.kind WHEN 'late' THEN 'Form overdue' ELSE 'Form due soon' END,
+                               CASE r.kind
+                                   WHEN 'late' THEN 'Your response to "' || substr(f.question, 1, 80) || '" is overdue.'
+                                   ELSE 'Reminder: "' || substr(f.question, 1, 80) || '" is due ' || substr(f.due_date, 1, 16) || ' UTC.'
+                                   END,
+                               ?
+                        FROM form_reminders r
+                                 JOIN submissions s ON s.id = r.submission_id
+                                 JOIN forms f ON f.id = s.form_id
+                        WHERE r.batch_id = ?
+                        """, (now, batch))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return {"reminded": reminded, "late": flagged}
+
+
+class DeadlineScheduler:
+    """Background thread that wakes on the next due-date boundary instead of polling."""
+
+    def __init__(self, db_file: str, lead: timedelta = REMINDER_LEAD, resync_interval: float = RESYNC_INTERVAL):
+        self.db_file = db_file
+        self.lead = lead
+        self.resync_interval = resync_interval
+        self._heap = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+    def _connect(self):
+        return sqlite3.connect(self.db_file, timeout=30, isolation_level=None)
+
+    def _push(self, due: datetime, now: datetime):
+        for boundary in (due - self.lead, due):
+            if boundary > now:
+                heapq.heappush(self._heap, boundary)
+
+    def schedule(self, due_date):
+        """Register a newly assigned form's due date and wake the thread if it is sooner."""
+        due = parse_due_date(due_date)
+        if due is None:
+            return
+        with self._cond:
+            self._push(due, datetime.utcnow())
+            self._cond.notify()
+
+    def _resync(self, conn, now: datetime):
+        rows = conn.execute("""
+                            SELECT DISTINCT due_date FROM forms
+                            WHERE status = 'active' AND due_date > ?
+                            """, (now,)).fetchall()
+        with self._cond:
+            self._heap = []
+            for (due_date,) in rows:
+                try:
+                    self._push(parse_due_date(due_date), now)
+                except ValueError:
+                    logger.warning("Skipping unparseable due_date %r", due_date)
+            heapq.heapify(self._heap)
+
+    def run_once(self, now: Optional[datetime] = None) -> dict:
+        now = now or datetime.utcnow()
+        conn = self._connect()
+        try:
+            result = process_due(conn, now, self.lead)
+            self._resync(conn, now)
+            return result
+        finally:
+            conn.close()
+
+    def _loop(self):
+        while not self._stopped:
+            try:
+                result = self.run_once()
+                if result["reminded"] or result["late"]:
+                    logger.info("Deadline pass: %s", result)
+            except Exception:
+                logger.exception("Deadline pass failed")
+
+            # sleep until the earliest boundary (or the resync deadline); schedule() may shorten it
+            resync_at = time.monotonic() + self.resync_interval
+            with self._cond:
+                while not self._stopped:
+                    now = datetime.utcnow()
+                    if self._heap and self._heap[0] <= now:
+                        break
+                    wait = resync_at - time.monotonic()
+                    if wait <= 0:
+                        break
+                    if self._heap:
+                        wait = min(wait, (self._heap[0] - now).total_seconds())
+                    self._cond.wait(timeout=wait)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="deadline-scheduler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
@@ -0,0 +1,115 @@
+# roster.py
+"""
+Keyset-paginated roster listings for the admin console.
+
+fetch_page() returns one window of classes, teachers or students. Windows
+are sorted by "recent" (id descending) or "alpha" (display name, then id)
+and optionally filtered by a substring. The opaque cursor encodes the last
+row's sort key and id. Each page is therefore an index range seek
+(see the idx_users_role_* / idx_classes_name indexes in init_db), so
+fetching page 500 costs the same as page 1.
+"""
+import base64
+import json
+from typing import Optional, Tuple
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+SORTS = ("recent", "alpha")
+
+KINDS = {
+    "classes": {
+        "from": "classes c LEFT JOIN users t ON t.id = c.teacher_id",
+        "where": "1 = 1",
+        "id": "c.id",
+        "display": "c.name COLLATE NOCASE",
+        "search": ("c.name", "c.description"),
+        "select": """c.id, c.name, c.description, c.teacher_id AS teacherId,
+                     COALESCE(t.name, t.email) AS teacherName,
+                     (SELECT COUNT(DISTINCT ts.student_id) FROM teacher_students ts WHERE ts.class_id = c.id) AS students,
+                     c.created_at AS createdAt""",
+    },
+    "teachers": {
+        "from": "users u",
+        "where": "u.role = 'teacher'",
+        "id": "u.id",
+        "display": "COALESCE(u.name, u.email) COLLATE NOCASE",
+        "search": ("u.name", "u.email"),
+        "select": """u.id, COALESCE(u.name, u.email) AS name, u.email, u.created_at AS createdAt,
+                     (SELECT COUNT(*) FROM classes c WHERE c.teacher_id = u.id) AS classes""",
+    },
+    "students": {
+        "from": "users u",
+        "where": "u.role = 'student'",
+        "id": "u.id",
+        "display": "COALESCE(u.name, u.email) COLLATE NOCASE",
+        "search": ("u.name", "u.email"),
+        "select": "u.id, COALESCE(u.name, u.email) AS name, u.email, u.created_at AS createdAt",
+    },
+}
+
+
+def encode_cursor(sort: str, key, row_id: int) -> str:
+    raw = json.dumps([sort, key, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[object, int]:
+    """(sort key, id) from a cursor; ValueError if it is malformed or from another sort order."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cur_sort, key, row_id = json.loads(raw)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if cur_sort != sort or not isinstance(row_id, int):
+        raise ValueError("Cursor does not match this sort order")
+    return key, row_id
+
+
+def fetch_page(db, kind: str, sort: str = "recent", q: str = "", limit: int = DEFAULT_PAGE_SIZE,
+               cursor: Optional[str] = None) -> dict:
+    spec = KINDS[kind]
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    where, params = [spec["where"]], []
+
+    if q:
+        where.append("(" + " OR ".join(f"LOWER({col}) LIKE ?" for col in spec["search"]) + ")")
+        params.extend([f"%{q.lower()}%"] * len(spec["search"]))
+    filter_where, filter_params = list(where), list(params)
+
+    id_col, display = spec["id"], spec["display"]
+    if sort == "alpha":
+        order = f"{display}, {id_col}"
+        if cursor:
+            key, last_id = decode_cursor(cursor, sort)
+            # the >= term lets SQLite seek the index; the OR finishes the tuple comparison
+            where.append(f"{display} >= ? AND ({display} > ? OR {id_col} > ?)")
+            params.extend([key, key, last_id])
+    else:
+        order = f"{id_col} DESC"
+        if cursor:
+            _, last_id = decode_cursor(cursor, sort)
+            where.append(f"{id_col} < ?")
+            params.append(last_id)
+
+    rows = db.execute(f"""
+        SELECT {spec['select']}, {display.split(' COLLATE')[0]} AS sortKey
+        FROM {spec['from']}
+        WHERE {' AND '.join(where)}
+        ORDER BY {order}
+        LIMIT ?
+    """, params + [limit + 1]).fetchall()
+
+    items = [dict(r) for r in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor(sort, last["sortKey"] if sort == "alpha" else None, last["id"])
+    for item in items:
+        del item["sortKey"]
+
+    page = {"kind": kind, "sort": sort, "items": items, "nextCursor": next_cursor}
+    if not cursor:
+        page["total"] = db.execute(f"SELECT COUNT(*) FROM {spec['from']} WHERE {' AND '.join(filter_where)}",
+                                   filter_params).fetchone()[0]
+    return page
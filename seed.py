@@ -0,0 +1,223 @@
+# seed.py
+"""
+Synthetic school-district generator for load testing.
+
+    python seed.py --preset school                  # into fitness_app.db
+    python seed.py --db /tmp/district.db --preset district --reset
+    python seed.py --students 8000 --forms-per-class 80 --seed 7
+
+Creates teachers, students, classes, rosters, forms, submissions, statistics,
+messages, notifications and activity rows with numpy's seeded RNG, so the
+same arguments always produce the same data. Rows are inserted per table
+with executemany() from generators in one transaction, and derived
+streak/consistency values are rebuilt at the end with progress.recompute().
+Every synthetic user's password is "password123".
+"""
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from werkzeug.security import generate_password_hash
+
+import app as webapp
+from progress import recompute
+
+DOMAIN = "district.example"
+PASSWORD = "password123"
+
+PRESETS = {
+    "small": dict(students=500, teachers=20, classes=40, classes_per_student=2, forms_per_class=10,
+                  messages=5000, activity=20000, notifications=5000),
+    "school": dict(students=3000, teachers=150, classes=300, classes_per_student=3, forms_per_class=40,
+                   messages=100000, activity=500000, notifications=50000),
+    "district": dict(students=20000, teachers=800, classes=1500, classes_per_student=3, forms_per_class=60,
+                     messages=1000000, activity=3000000, notifications=400000),
+}
+
+SUBJECTS = ("Strength", "Conditioning", "Mobility", "Track", "Soccer", "Basketball", "Swimming", "Volleyball")
+QUESTIONS = (
+    "How did today's workout feel?", "Rate your recovery this week.", "How was your sleep before practice?",
+    "Describe your warm-up routine.", "How confident do you feel about your technique?",
+)
+RESPONSES = (
+    "Felt strong today.", "A bit tired but pushed through.", "Legs were sore from yesterday.",
+    "Great session, hit a new best.", "Struggled with the last set.", "Worked on form, getting better.",
+)
+ACTIONS = ("login", "assign", "message", "grade", "notify", "bulk_upload", "create_class", "teacher_msg")
+
+# metric -> (mean, std) for student_statistics
+METRIC_DISTRIBUTIONS = {
+    "height": (170, 10), "weight": (65, 12), "vertical_jump": (50, 10), "broad_jump": (210, 30),
+    "flying_10": (1.3, 0.15), "track_interval": (75, 10), "hang_clean": (60, 15), "bench": (60, 20),
+    "back_squat": (90, 25), "front_squat": (75, 20), "balance_left": (30, 10), "balance_right": (30, 10),
+    "jump_force": (1800, 400), "air_time": (0.55, 0.08),
+}
+
+
+def chunked_insert(conn, sql, rows, label):
+    start = time.perf_counter()
+    cur = conn.executemany(sql, rows)
+    print(f"  {label:<20} {cur.rowcount:>10,} rows  {time.perf_counter() - start:6.1f}s", flush=True)
+
+
+def generate(conn, rng, students, teachers, classes, classes_per_student, forms_per_class,
+             messages, activity, notifications, days=180):
+    now = datetime.utcnow().replace(microsecond=0)
+    start_time = now - timedelta(days=days)
+
+    def stamp(seconds):
+        return start_time + timedelta(seconds=int(seconds))
+
+    span = days * 86400
+    pw_hash = generate_password_hash(PASSWORD)  # hashing per user would dominate the run
+
+    # users
+    chunked_insert(conn, "INSERT INTO users (email, password, name, role, created_at) VALUES (?, ?, ?, ?, ?)",
+                   ((f"teacher{i}@{DOMAIN}", pw_hash, f"Teacher {i}", "teacher", start_time) for i in range(teachers)),
+                   "teachers")
+    chunked_insert(conn, "INSERT INTO users (email, password, name, role, created_at) VALUES (?, ?, ?, ?, ?)",
+                   ((f"student{i}@{DOMAIN}", pw_hash, f"Student {i}", "student", stamp(rng.integers(0, span // 4)))
+                    for i in range(students)), "students")
+    teacher_ids = np.array([r[0] for r in conn.execute(
+        "SELECT id FROM users WHERE role = 'teacher' AND email LIKE ? ORDER BY id", (f"%@{DOMAIN}",))])
+    student_ids = np.array([r[0] for r in conn.execute(
+        "SELECT id FROM users WHERE role = 'student' AND email LIKE ? ORDER BY id", (f"%@{DOMAIN}",))])
+
+    # classes, round-robin over teachers
+    class_teacher = teacher_ids[np.arange(classes) % len(teacher_ids)]
+    chunked_insert(conn, "INSERT INTO classes (teacher_id, name, description, created_at) VALUES (?, ?, ?, ?)",
+                   ((int(class_teacher[i]), f"{SUBJECTS[i % len(SUBJECTS)]} P{i % 8 + 1} #{i}",
+                     "Synthetic class", start_time) for i in range(classes)), "classes")
+    class_ids = np.array([r[0] for r in conn.execute(
+        "SELECT id FROM classes WHERE description = 'Synthetic class' ORDER BY id")])
+
+    # rosters: each student in `classes_per_student` random classes (duplicates collapsed)
+    picks = rng.integers(0, classes, size=(students, classes_per_student))
+    pairs = np.unique(np.stack([np.repeat(np.arange(students), classes_per_student), picks.ravel()], axis=1), axis=0)
+    chunked_insert(conn, "INSERT INTO teacher_students (teacher_id, student_id, class_id) VALUES (?, ?, ?)",
+                   ((int(class_teacher[c]), int(student_ids[s]), int(class_ids[c])) for s, c in pairs), "teacher_students")
+    order = np.argsort(pairs[:, 1], kind="stable")
+    roster_students = student_ids[pairs[order, 0]]
+    roster_bounds = np.searchsorted(pairs[order, 1], np.arange(classes + 1))
+
+    # forms, spread evenly over the period, due a week after creation
+    form_offsets = rng.integers(0, span, size=(classes, forms_per_class))
+    chunked_insert(conn, """INSERT INTO forms (teacher_id, class_id, question, created_at, due_date, status)
+                            VALUES (?, ?, ?, ?, ?, 'active')""",
+                   ((int(class_teacher[c]), int(class_ids[c]), QUESTIONS[(c + f) % len(QUESTIONS)],
+                     stamp(form_offsets[c, f]), stamp(form_offsets[c, f] + 7 * 86400))
+                    for c in range(classes) for f in range(forms_per_class)), "forms")
+    form_ids = np.array([r[0] for r in conn.execute(
+        "SELECT f.id FROM forms f JOIN classes c ON c.id = f.class_id "
+        "WHERE c.description = 'Synthetic class' ORDER BY f.id")]).reshape(classes, forms_per_class)
+
+    # submissions: every rostered student gets every form of the class
+    def submission_rows():
+        for c in range(classes):
+            members = roster_students[roster_bounds[c]:roster_bounds[c + 1]]
+            if not len(members):
+                continue
+            for f in range(forms_per_class):
+                n = len(members)
+                created = form_offsets[c, f]
+                delay = rng.exponential(3 * 86400, size=n).astype(np.int64)
+                completed = (rng.random(n) < 0.85) & (created + delay < span)
+                graded = completed & (rng.random(n) < 0.6)
+                late = completed & (delay > 7 * 86400)
+                s_rating = rng.integers(1, 5, size=n)
+                t_rating = rng.integers(1, 5, size=n)
+                text = rng.integers(0, len(RESPONSES), size=n)
+                for i in range(n):
+                    if completed[i]:
+                        yield (int(form_ids[c, f]), int(members[i]), RESPONSES[text[i]], int(s_rating[i]),
+                               int(t_rating[i]) if graded[i] else None, "Nice work" if graded[i] else None,
+                               stamp(created + delay[i]), int(graded[i]), int(late[i]), 1)
+                    else:
+                        yield int(form_ids[c, f]), int(members[i]), None, None, None, None, None, 0, 0, 0
+
+    chunked_insert(conn, """INSERT INTO submissions (form_id, student_id, student_response, student_rating,
+                                                     teacher_rating, teacher_feedback, submitted_at,
+                                                     graded, late, completed)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", submission_rows(), "submissions")
+
+    # statistics
+    cols = list(METRIC_DISTRIBUTIONS)
+    values = np.column_stack([rng.normal(m, s, size=students) for m, s in METRIC_DISTRIBUTIONS.values()]).round(2)
+    bmi = (values[:, cols.index("weight")] / (values[:, cols.index("height")] / 100) ** 2).round(1)
+    chunked_insert(conn, f"""INSERT INTO student_statistics (student_id, {", ".join(cols)}, bmi, updated_at)
+                             VALUES (?, {", ".join("?" * len(cols))}, ?, ?)
+                             ON CONFLICT(student_id) DO NOTHING""",
+                   ((int(student_ids[i]), *map(float, values[i]), float(bmi[i]), now) for i in range(students)),
+                   "student_statistics")
+
+    # messages between rostered teacher/student pairs
+    pair_idx = rng.integers(0, len(pairs), size=messages)
+    from_teacher = rng.random(messages) < 0.6
+    msg_times = np.sort(rng.integers(0, span, size=messages))
+
+    def message_rows():
+        for i in range(messages):
+            s, c = pairs[pair_idx[i]]
+            t_id, s_id = int(class_teacher[c]), int(student_ids[s])
+            sender, recipient = (t_id, s_id) if from_teacher[i] else (s_id, t_id)
+            yield sender, recipient, RESPONSES[i % len(RESPONSES)], stamp(msg_times[i])
+
+    chunked_insert(conn, "INSERT INTO messages (sender_id, recipient_id, content, created_at) VALUES (?, ?, ?, ?)",
+                   message_rows(), "messages")
+
+    note_students = rng.choice(student_ids, size=notifications)
+    note_times = rng.integers(0, span, size=notifications)
+    chunked_insert(conn, "INSERT INTO notifications (user_id, type, title, message, created_at, read) VALUES (?, ?, ?, ?, ?, ?)",
+                   ((int(note_students[i]), ("new", "graded", "late", "update")[i % 4], "Synthetic",
+                     "Synthetic notification", stamp(note_times[i]), int(i % 3 == 0)) for i in range(notifications)),
+                   "notifications")
+
+    everyone = np.concatenate([teacher_ids, student_ids])
+    act_users = rng.choice(everyone, size=activity)
+    act_times = np.sort(rng.integers(0, span, size=activity))
+    chunked_insert(conn, "INSERT INTO activity_logs (action, detail, user_id, created_at) VALUES (?, ?, ?, ?)",
+                   ((ACTIONS[i % len(ACTIONS)], "synthetic", int(act_users[i]), stamp(act_times[i]))
+                    for i in range(activity)), "activity_logs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill a database with a synthetic school district.")
+    parser.add_argument("--db", default=webapp.DB_FILE)
+    parser.add_argument("--preset", choices=PRESETS, default="school")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="delete the database file first")
+    for name in PRESETS["school"]:
+        parser.add_argument("--" + name.replace("_", "-"), type=int, help=f"override the preset's {name}")
+    args = parser.parse_args()
+
+    params = dict(PRESETS[args.preset])
+    params.update({k: v for k, v in vars(args).items() if k in params and v is not None})
+
+    if args.reset and os.path.exists(args.db):
+        os.remove(args.db)
+    webapp.DB_FILE = args.db
+    webapp.init_db()
+
+    conn = sqlite3.connect(args.db, detect_types=sqlite3.PARSE_DECLTYPES)
+    if conn.execute("SELECT 1 FROM users WHERE email LIKE ? LIMIT 1", (f"%@{DOMAIN}",)).fetchone():
+        raise SystemExit(f"{args.db} already holds synthetic data; pass --reset to regenerate it")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA cache_size = -200000")
+
+    print(f"Generating {args.preset} preset into {args.db}: {params}")
+    started = time.perf_counter()
+    generate(conn, np.random.default_rng(args.seed), **params)
+    conn.commit()
+    mismatches = recompute(conn, apply=True)
+    print(f"  {'student_progress':<20} {len(mismatches):>10,} rows")
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+# series.py
+"""
+Downsampled chart series over stat_measurements.
+
+A chart never needs more points than it has pixels, so series are returned
+at the requested width whatever the length of the history:
+
+  minmax   per pixel column, the lowest and highest value (at most 2 x width points)
+  lttb     Largest-Triangle-Three-Buckets, exactly `width` points that keep the visual shape
+
+SeriesCache keeps, per (student, metric) and per worker, the measurements
+sorted by time plus a pyramid of min/max levels. Level k + 1 keeps the lowest
+and highest point of every 4 points of level k, so it has half as many
+points and still holds every extreme. A query uses the finest level with at
+most OVERSAMPLE x width points in range and downsamples only that slice,
+so its cost depends on the width and not on how long the history is.
+Measurements are only appended; a sync reads rows with a larger id than the
+cached ones through the (student_id, metric) index and rebuilds the pyramid
+on the next query.
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+MAX_CACHED_SERIES = 4096
+OVERSAMPLE = 4      # points per output pixel the chosen level may hold
+MIN_WIDTH, MAX_WIDTH = 16, 4096
+METHODS = ("lttb", "minmax")
+
+
+def _to_ms(values) -> np.ndarray:
+    return np.array(values, dtype="datetime64[ms]").astype(np.int64).astype(np.float64)
+
+
+def halve(t: np.ndarray, v: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Keep the min and max point of every 4 consecutive points, in time order."""
+    full = len(t) // 4 * 4
+    rows = np.arange(full // 4)
+    block_v = v[:full].reshape(-1, 4)
+    lo, hi = np.argmin(block_v, axis=1), np.argmax(block_v, axis=1)
+    first, second = np.minimum(lo, hi), np.maximum(lo, hi)
+    picks = np.column_stack([rows * 4 + first, rows * 4 + second]).ravel()
+    if full < len(t):
+        tail = np.arange(full, len(t))
+        picks = np.concatenate([picks, np.unique(tail[[np.argmin(v[full:]), np.argmax(v[full:])]])])
+    return t[picks], v[picks]
+
+
+def minmax(t: np.ndarray, v: np.ndarray, width: int, t0: float, t1: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Lowest and highest point of each of `width` equal time columns over [t0, t1]."""
+    if len(t) <= 2 * width:
+        return t, v
+    column = np.minimum(((t - t0) / max(t1 - t0, 1.0) * width).astype(np.int64), width - 1)
+    order = np.lexsort((v, column))
+    starts = np.flatnonzero(np.r_[True, column[order][1:] != column[order][:-1]])
+    ends = np.r_[starts[1:], len(order)] - 1
+    picks = np.unique(np.concatenate([order[starts], order[ends]]))  # back in time order
+    return t[picks], v[picks]
+
+
+def lttb(t: np.ndarray, v: np.ndarray, width: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Largest-Triangle-Three-Buckets down to `width` points (first and last are always kept)."""
+    n = len(t)
+    if n <= width or width < 3:
+        return t, v
+    edges = np.floor(np.linspace(1, n - 1, width - 1)).astype(np.int64)
+    picks = np.empty(width, dtype=np.int64)
+    picks[0], picks[-1] = 0, n - 1
+    a = 0
+    for i in range(width - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = hi, (edges[i + 2] if i + 2 < width - 1 else n)
+        avg_t, avg_v = t[nxt_lo:nxt_hi].mean(), v[nxt_lo:nxt_hi].mean()
+        area = np.abs((t[a] - avg_t) * (v[lo:hi] - v[a]) - (t[a] - t[lo:hi]) * (avg_v - v[a]))
+        a = lo + int(np.argmax(area))
+        picks[i + 1] = a
+    return t[picks], v[picks]
+
+
+class Series:
+    """One student's measurements of one metric, sorted by time, with its min/max pyramid."""
+
+    def __init__(self):
+        self.t = np.empty(0)
+        self.v = np.empty(0)
+        self.last_id = 0
+        self._levels = None
+
+    def append(self, ids: List[int], stamps_ms: List[float], values: List[float]):
+        t = np.concatenate([self.t, np.round(np.asarray(stamps_ms, dtype=np.float64))])
+        v = np.concatenate([self.v, np.asarray(values, dtype=np.float64)])
+        if np.any(np.diff(t[max(len(self.t) - 1, 0):]) < 0):  # backdated measurements
+            order = np.argsort(t, kind="stable")
+            t, v = t[order], v[order]
+        self.t, self.v = t, v
+        self.last_id = max(ids)
+        self._levels = None
+
+    def levels(self) -> List[Tuple[np.ndarray, np.ndarray]]:
+        if self._levels is None:
+            levels = [(self.t, self.v)]
+            while len(levels[-1][0]) > 2 * MIN_WIDTH:
+                levels.append(halve(*levels[-1]))
+            self._levels = levels
+        return self._levels
+
+    def query(self, width: int, method: str = "lttb", t0: Optional[float] = None,
+              t1: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray, int]:
+        """(times in ms, values, raw points in range) of the range [t0, t1] at `width` pixels."""
+        if not len(self.t):
+            return self.t, self.v, 0
+        t0 = self.t[0] if t0 is None else t0
+        t1 = self.t[-1] if t1 is None else t1
+        levels = self.levels()
+        raw_count = int(np.searchsorted(self.t, t1, side="right") - np.searchsorted(self.t, t0, side="left"))
+        for t, v in levels:
+            lo, hi = np.searchsorted(t, t0, side="left"), np.searchsorted(t, t1, side="right")
+            if hi - lo <= OVERSAMPLE * width:
+                break
+        t, v = t[lo:hi], v[lo:hi]
+        if method == "minmax":
+            t, v = minmax(t, v, width, t0, t1)
+        else:
+            t, v = lttb(t, v, width)
+        return t, v, raw_count
+
+
+class SeriesCache:
+    """Per-worker LRU of Series keyed by (student id, metric), topped up from stat_measurements on every read."""
+
+    def __init__(self, max_series: int = MAX_CACHED_SERIES):
+        self.max_series = max_series
+        self._series = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, db, student_id: int, metric: str) -> Series:
+        key = (student_id, metric)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = Series()
+            self._series.move_to_end(key)
+            while len(self._series) > self.max_series:
+                self._series.popitem(last=False)
+
+        # epoch ms computed by SQLite, so no datetime objects are built per row
+        rows = db.execute("SELECT id, (julianday(measured_at) - 2440587.5) * 86400000.0, value FROM stat_measurements "
+                          "WHERE student_id = ? AND metric = ? AND id > ? ORDER BY id",
+                          (student_id, metric, series.last_id)).fetchall()
+        if rows:
+            with self._lock:
+                rows = [r for r in rows if r[0] > series.last_id]  # another thread may have appended them
+                if rows:
+                    series.append([r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows])
+        return series
+
+    def query(self, db, student_id: int, metric: str, width: int, method: str = "lttb",
+              start: Optional[datetime] = None, end: Optional[datetime] = None) -> dict:
+        series = self.get(db, student_id, metric)
+        with self._lock:
+            t, v, raw = series.query(width, method,
+                                     None if start is None else float(_to_ms([start])[0]),
+                                     None if end is None else float(_to_ms([end])[0]))
+        return {"t": t.astype(np.int64).tolist(), "v": np.round(v, 3).tolist(), "rawPoints": raw}
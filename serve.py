@@ -0,0 +1,138 @@
+# serve.py
+"""
+Production entry point (POSIX): a pre-fork server with N worker processes sharing one socket.
+
+    FLASK_SECRET=... python serve.py --workers 4 --port 8000 --preload-models
+
+The master initializes the database, optionally loads every MODEL_WRAPPERS
+model, freezes the GC heap and then forks. Workers therefore share the
+model memory copy-on-write instead of each loading its own copy. Each
+worker runs a threaded WSGI server on the inherited listening socket, and
+the master restarts any worker that exits. Sessions stay valid across
+workers because the secret comes from FLASK_SECRET or the key file that
+app.load_secret_key() creates before the fork.
+
+With INFERENCE_SOCKET set, models run in a separate `python inference.py`
+server instead, and --preload-models has nothing to load.
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+from werkzeug.serving import make_server
+
+import app as webapp
+
+logger = logging.getLogger("serve")
+
+# A worker that dies sooner than this after starting is restarted with a delay, not in a tight loop.
+MIN_WORKER_UPTIME = 5.0
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(index: int, sock: socket.socket, host: str, port: int):
+    """Body of a forked worker; never returns."""
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # background jobs are idempotent across workers, but one copy is enough
+    if index == 0:
+        webapp.start_scheduler()
+        webapp.start_snapshot_builder()
+
+    server = make_server(host, port, webapp.app, threaded=True, fd=sock.fileno())
+    logger.info("Worker %d (pid %d) serving", index, os.getpid())
+    try:
+        server.serve_forever()
+    finally:
+        os._exit(0)
+
+
+def spawn(index: int, sock: socket.socket, host: str, port: int) -> int:
+    pid = os.fork()
+    if pid == 0:
+        try:
+            run_worker(index, sock, host, port)
+        except BaseException:
+            logger.exception("Worker %d crashed", index)
+        os._exit(1)
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the fitness app with multiple worker processes.")
+    parser.add_argument("--host", default=os.environ.get("HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_WORKERS", os.cpu_count() or 2)))
+    parser.add_argument("--preload-models", action="store_true",
+                        default=os.environ.get("PRELOAD_MODELS") == "1",
+                        help="load all model weights in the master so workers share them copy-on-write")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if not os.environ.get("FLASK_SECRET"):
+        logger.warning("FLASK_SECRET not set; using the key file at %s", webapp.SECRET_KEY_FILE)
+
+    webapp.init_db()
+    webapp.warm_timeline()  # workers inherit the feed buffers and only sync what was written since
+    if args.preload_models:
+        webapp.preload_models()
+
+    sock = bind_socket(args.host, args.port)
+    # keep long-lived objects (app, models) out of future GC passes so their pages stay shared
+    gc.collect()
+    gc.freeze()
+
+    workers = {}  # pid -> (index, started_at)
+    for i in range(args.workers):
+        workers[spawn(i, sock, args.host, args.port)] = (i, time.monotonic())
+    logger.info("Master %d listening on %s:%d with %d workers", os.getpid(), args.host, args.port, args.workers)
+
+    stopping = False
+
+    def stop(*_):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        index, started = workers.pop(pid, (None, 0))
+        if stopping or index is None:
+            continue
+        logger.warning("Worker %d (pid %d) exited with status %d; restarting", index, pid, status)
+        if time.monotonic() - started < MIN_WORKER_UPTIME:
+            time.sleep(1)
+        workers[spawn(index, sock, args.host, args.port)] = (index, time.monotonic())
+
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
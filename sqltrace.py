@@ -0,0 +1,159 @@
+# sqltrace.py
+"""
+Per-request SQL instrumentation.
+
+get_db() opens its connection with factory=TracingConnection. Every
+execute/executemany and every fetch on that connection's cursors is timed and
+added to the connection's QueryStats. SQLite does most of a SELECT's work
+while rows are fetched, so fetch time is charged to the statement that
+produced the rows. The app turns these stats into a Server-Timing header, logs
+slow requests with EXPLAIN QUERY PLAN output, and warns about N+1 patterns:
+the same statement text run more than N_PLUS_ONE_THRESHOLD times in one request.
+"""
+import os
+import sqlite3
+from time import perf_counter
+from typing import List, Tuple
+
+SQL_TRACE = os.environ.get("SQL_TRACE", "1") != "0"
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", "500"))
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("N_PLUS_ONE_THRESHOLD", "10"))
+
+
+class QueryStats:
+    """Totals for one connection (one request): count, time, and per-statement aggregates."""
+
+    __slots__ = ("count", "seconds", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = {}  # sql -> [executions, seconds, last params]
+
+    def record(self, sql, params, elapsed, execution=True):
+        entry = self.statements.get(sql)
+        if entry is None:
+            entry = self.statements[sql] = [0, 0.0, params]
+        if execution:
+            self.count += 1
+            entry[0] += 1
+            entry[2] = params
+        entry[1] += elapsed
+        self.seconds += elapsed
+
+    def slowest(self, n: int = 1) -> List[Tuple[str, list]]:
+        return sorted(self.statements.items(), key=lambda item: item[1][1], reverse=True)[:n]
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> List[Tuple[str, int]]:
+        return [(sql, e[0]) for sql, e in self.statements.items() if e[0] > threshold]
+
+
+class TracingCursor(sqlite3.Cursor):
+    _traced_sql = None
+
+    def _charge(self, start, sql=None, params=None):
+        stats = getattr(self.connection, "stats", None)
+        if stats is None:
+            return
+        if sql is not None:
+            self._traced_sql = sql
+            stats.record(sql, params, perf_counter() - start)
+        elif self._traced_sql is not None:
+            stats.record(self._traced_sql, None, perf_counter() - start, execution=False)
+
+    def execute(self, sql, parameters=()):
+        start = perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._charge(start, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._charge(start, sql, None)
+
+    def executescript(self, sql_script):
+        start = perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            self._charge(start, sql_script, None)
+
+    def fetchone(self):
+        start = perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            self._charge(start)
+
+    def fetchmany(self, size=None):
+        start = perf_counter()
+        try:
+            return super().fetchmany(self.arraysize if size is None else size)
+        finally:
+            self._charge(start)
+
+    def fetchall(self):
+        start = perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            self._charge(start)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = perf_counter()
+        try:
+            return super().__next__()
+        finally:
+            self._charge(start)
+
+
+class TracingConnection(sqlite3.Connection):
+    """sqlite3 connection whose cursors (including the implicit ones of execute()) are TracingCursors."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = QueryStats()
+
+    def cursor(self, factory=TracingCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+def explain(conn, sql: str, params) -> List[str]:
+    """EXPLAIN QUERY PLAN lines for `sql`, run on an untraced cursor."""
+    if params is None or not sql.lstrip().upper().startswith(("SELECT", "WITH")):
+        return []
+    try:
+        rows = sqlite3.Cursor(conn).execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    except sqlite3.Error as e:
+        return [f"(plan unavailable: {e})"]
+    return [row[3] for row in rows]
+
+
+def server_timing(stats: QueryStats, total_seconds: float) -> str:
+    parts = [f'db;dur={stats.seconds * 1000:.2f};desc="{stats.count} queries"']
+    slowest = stats.slowest(1)
+    if slowest:
+        parts.append(f"db-slowest;dur={slowest[0][1][1] * 1000:.2f}")
+    parts.append(f"app;dur={total_seconds * 1000:.2f}")
+    return ", ".join(parts)
+
+
+def compact(sql: str, limit: int = 300) -> str:
+    text = " ".join(sql.split())
+    return text if len(text) <= limit else text[:limit] + "..."
@@ -372,50 +372,93 @@ document.getElementById('refreshStats').addEventListener('click', () => {
     animateRings(demoStats);
 });
 
-/* ================= PAGINATION FOR CLASSES ================= */
+/* ================= CLASSES (windowed loading from /admin/roster) ================= */
 const classesGrid = document.getElementById('classesGrid');
-const classCards = classesGrid ? Array.from(classesGrid.querySelectorAll('article.card')) : [];
-let perPage = 12;
-let currentPage = 1;
-const total = classCards.length;
-const totalPages = Math.max(1, Math.ceil(total / perPage));
-
-const elPrev = document.getElementById('prevPage');
-const elNext = document.getElementById('nextPage');
-const elCurrent = document.getElementById('currentPage');
+const elEmpty = document.getElementById('classesEmpty');
 const elRange = document.getElementById('classesRange');
 const elTotal = document.getElementById('classesTotal');
+const elMore = document.getElementById('loadMoreClasses');
+const elSort = document.getElementById('sortClasses');
+const elFilter = document.getElementById('filterClasses');
+const classesSentinel = document.getElementById('classesSentinel');
+const CLASS_PAGE_SIZE = 24;
 
-if (elTotal) elTotal.innerText = total;
-
-function renderPage(page) {
-    currentPage = Math.max(1, Math.min(page, totalPages));
-    classCards.forEach(c => c.style.display = 'none');
-    const start = (currentPage - 1) * perPage;
-    const end = Math.min(total, start + perPage);
-    classCards.slice(start, end).forEach(c => c.style.display = '');
-    if (elCurrent) elCurrent.innerText = currentPage;
-    if (elRange) elRange.innerText = `${start+1}–${end}`;
-    if (elPrev) elPrev.disabled = currentPage === 1;
-    if (elNext) elNext.disabled = currentPage === totalPages;
-    // animate visible cards
-    gsap.fromTo(classCards.slice(start, end), {
-        y: 8,
-        opacity: 0,
-        scale: .995
-    }, {
-        y: 0,
-        opacity: 1,
-        scale: 1,
-        stagger: 0.04,
-        duration: 0.48,
-        ease: 'power3.out'
-    });
+const classState = {cursor: null, done: false, loading: false, shown: 0, generation: 0};
+
+function escapeHtml(value) {
+    return String(value ?? '').replace(/[&<>"']/g, ch => ({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}[ch]));
+}
+
+function classCard(cls) {
+    const card = document.createElement('article');
+    card.className = 'card p-4';
+    card.dataset.classId = cls.id;
+    card.innerHTML = `
+        <div class="flex items-start justify-between gap-3">
+            <div>
+                <h4 class="text-md font-semibold accent">${escapeHtml(cls.name)}</h4>
+                <p class="muted text-sm mt-1">${escapeHtml(cls.description || 'No description')}</p>
+                <div class="muted text-xs mt-2">${cls.students} student${cls.students === 1 ? '' : 's'}</div>
+            </div>
+            <div class="text-right">
+                <div class="muted text-xs">Teacher</div>
+                <div class="font-medium mt-1">${escapeHtml(cls.teacherName || '—')}</div>
+            </div>
+        </div>`;
+    return card;
 }
 
-elPrev?.addEventListener('click', () => renderPage(currentPage - 1));
-elNext?.addEventListener('click', () => renderPage(currentPage + 1));
-if (total > 0) renderPage(1);
+async function loadClassesPage() {
+    if (classState.loading || classState.done) return;
+    classState.loading = true;
+    const generation = classState.generation;
+    const params = new URLSearchParams({kind: 'classes', sort: elSort?.value || 'recent', limit: CLASS_PAGE_SIZE});
+    if (elFilter?.value.trim()) params.set('q', elFilter.value.trim());
+    if (classState.cursor) params.set('cursor', classState.cursor);
+    try {
+        const page = await apiFetch(`/admin/roster?${params}`);
+        if (generation !== classState.generation) return; // sort/filter changed meanwhile
+        if (page.total !== undefined && elTotal) elTotal.innerText = page.total;
+        const cards = page.items.map(classCard);
+        classesGrid.append(...cards);
+        classState.shown += cards.length;
+        classState.cursor = page.nextCursor;
+        classState.done = !page.nextCursor;
+        if (elRange) elRange.innerText = classState.shown;
+        if (elEmpty) elEmpty.hidden = classState.shown > 0;
+        if (elMore) elMore.hidden = classState.done;
+        if (cards.length) {
+            gsap.fromTo(cards, {y: 8, opacity: 0, scale: .995},
+                {y: 0, opacity: 1, scale: 1, stagger: 0.02, duration: 0.4, ease: 'power3.out'});
+        }
+    } catch (err) {
+        console.error('Failed to load classes', err);
+    } finally {
+        if (generation === classState.generation) classState.loading = false;
+    }
+}
+
+function resetClasses() {
+    classState.generation += 1;
+    Object.assign(classState, {cursor: null, done: false, loading: false, shown: 0});
+    if (classesGrid) classesGrid.innerHTML = '';
+    loadClassesPage();
+}
+
+if (classesGrid) {
+    // fetch the next window when the sentinel below the grid scrolls into view
+    new IntersectionObserver(entries => {
+        if (entries.some(e => e.isIntersecting)) loadClassesPage();
+    }, {rootMargin: '400px'}).observe(classesSentinel);
+    elMore?.addEventListener('click', loadClassesPage);
+    elSort?.addEventListener('change', resetClasses);
+    let filterTimer;
+    elFilter?.addEventListener('input', () => {
+        clearTimeout(filterTimer);
+        filterTimer = setTimeout(resetClasses, 250);
+    });
+    loadClassesPage();
+}
 
 /* ================= USER MGMT (Unified) ================= */
 function switchUserTab(tab) {
@@ -138,9 +138,17 @@ async function drawProgressChart(){
     try{
         await loadChartLibrary();
         const ctx = document.getElementById('profileProgressChart'); if(!ctx) return;
-        const history = (PROFILE && PROFILE.history) || MOCK_PROFILE.history;
-        const labels = history.map(h=> h[0]);
-        const data = history.map(h=> h[2]);
+        let labels, data;
+        const series = PROFILE && await fetchSeries(PROFILE.id, 'vertical_jump', ctx.clientWidth || 600);
+        if(series && series.t.length){
+            // already downsampled server-side to about one point per pixel
+            labels = series.t.map(t=> new Date(t).toLocaleDateString());
+            data = series.v;
+        } else {
+            const history = (PROFILE && PROFILE.history) || MOCK_PROFILE.history;
+            labels = history.map(h=> h[0]);
+            data = history.map(h=> h[2]);
+        }
         new Chart(ctx.getContext('2d'), {
             type:'line', data: { labels, datasets:[{ label:'Vertical Jump (cm)', data, tension:0.3, fill:true, backgroundColor:'rgba(6,46,30,0.06)', borderColor:'#0B8B5A', pointRadius:3 }] },
             options:{ plugins:{ legend:{ display:false } }, scales:{ x:{ grid:{ display:false } }, y:{ grid:{ color:'rgba(6,46,30,0.05)' } } }
@@ -166,12 +174,17 @@ async function drawProgressChart(){
     }
 
     /* ========== Fetch / Backend helpers (replace endpoints) ========== */
+    async function fetchSeries(profileId, metric, width){
+        try{
+            const res = await fetch(`/api/students/${profileId}/series/${metric}?width=${Math.round(width)}`);
+            return res.ok ? await res.json() : null;
+        }catch(e){ return null; }
+    }
+
     async function fetchProfile(profileId){
-        // Replace with: const res = await fetch(`/api/profile/${profileId}`)
-        // if(res.ok) return await res.json(); else throw new Error('fetch failed')
-        // For now return mock
-        await new Promise(r=> setTimeout(r, 200));
-        return JSON.parse(JSON.stringify(MOCK_PROFILE));
+        const res = await fetch(`/api/profile/${profileId}`);
+        if(!res.ok) throw new Error('fetch failed');
+        return await res.json();
     }
 
 /* ========== Model runner helpers ========== */
@@ -253,7 +266,7 @@ async function uploadTechniqueVideo(file){
 async function submitReport(){ const text = $('#reportText').value.trim(); if(!text) return alert('Please explain'); try{ const res = await fetch(`/api/profile/${PROFILE.id}/report`, { method:'POST', headers:{'content-type':'application/json'}, body: JSON.stringify({ text }) }); if(res.ok){ alert('Report sent'); hide($('#reportModal')); $('#reportText').value=''; } else { alert('Failed to send report'); }}catch(e){ alert('Network error'); }}
 async function submitEndorse(){ const text = $('#endorseText').value.trim(); if(!text) return alert('Add endorsement'); try{ const res = await fetch(`/api/profile/${PROFILE.id}/endorse`, { method:'POST', headers:{'content-type':'application/json'}, body: JSON.stringify({ text }) }); if(res.ok){ alert('Endorsed'); hide($('#endorseModal')); $('#endorseText').value=''; } else alert('Failed'); }catch(e){ alert('Network error'); }}
 async function submitEditRequest(){ const text = $('#editField').value.trim(); if(!text) return alert('Add suggestion'); try{ const res = await fetch(`/api/profile/${PROFILE.id}/edit-request`, { method:'POST', headers:{'content-type':'application/json'}, body: JSON.stringify({ text }) }); if(res.ok){ alert('Request sent'); hide($('#editProfileModal')); $('#editField').value=''; } else alert('Failed'); }catch(e){ alert('Network error'); }}
-async function awardBadge(){ const title = $('#awardBadgeTitle').value.trim(); if(!title) return alert('Add a title'); try{ const res = await fetch(`/api/profile/${PROFILE.id}/badge`, { method:'POST', headers:{'content-type':'application/json'}, body: JSON.stringify({ title }) }); if(res.ok){ alert('Badge awarded (mock)'); hide($('#awardBadgeModal')); $('#awardBadgeTitle').value=''; } else alert('Failed'); }catch(e){ alert('Network error'); }}
+async function awardBadge(){ const title = $('#awardBadgeTitle').value.trim(); if(!title) return alert('Add a title'); try{ const res = await fetch(`/api/profile/${PROFILE.id}/badge`, { method:'POST', headers:{'content-type':'application/json'}, body: JSON.stringify({ title }) }); if(res.ok){ alert('Badge awarded'); hide($('#awardBadgeModal')); $('#awardBadgeTitle').value=''; } else alert('Failed'); }catch(e){ alert('Network error'); }}
 
 /* ========== Small helpers to escape in JS context ========== */
 function escapeJs(str){ return String(str||'').replace(/'/g,"\\'").replace(/\n/g,'\\n'); }
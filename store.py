@@ -0,0 +1,289 @@
+# store.py
+"""
+Pluggable key/value store shared by the app's caches, role lookups and sessions.
+
+  LocalStore   in-process LRU with TTL; fine for a single worker.
+  SQLiteStore  a SQLite file every worker opens, fronted by a small per-process
+               LocalStore. Writes and deletes append to an `invalidations`
+               table, and each worker replays new entries (sync(), once per
+               request) to drop stale local copies. A change made in one
+               worker is therefore seen by all of them.
+
+make_store() picks one from SHARED_STORE ("local" or "sqlite:///path/to/file.db").
+StoreSessionInterface keeps Flask session data in the store behind a signed
+session-id cookie, so sessions can be revoked and are shared by every worker.
+"""
+import fnmatch
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+DEFAULT_STORE_URL = os.environ.get("SHARED_STORE", "sqlite:///" + os.path.join("instance", "shared_store.db"))
+MAX_ENTRIES = 50000
+L1_SIZE = 2048
+L1_TTL = 30.0            # local copies are dropped after this even without an invalidation
+TOUCH_INTERVAL = 30.0    # accessed_at is refreshed at most this often per key (LRU precision)
+MAINTENANCE_EVERY = 200  # writes between expiry / eviction / channel pruning passes
+CHANNEL_RETENTION = 600.0
+
+
+class LocalStore:
+    """Thread-safe in-process LRU with per-key TTL."""
+
+    def __init__(self, maxsize: int = L1_SIZE, default_ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._data = OrderedDict()  # key -> (expires_at or None, value)
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires, value = item
+            if expires is not None and expires <= time.time():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = ttl if ttl is not None else self.default_ttl
+        with self._lock:
+            self._data[key] = (time.time() + ttl if ttl else None, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_prefix(self, prefix: str):
+        self.delete_matching(prefix + "*")
+
+    def delete_matching(self, pattern: str):
+        with self._lock:
+            for key in [k for k in self._data if fnmatch.fnmatchcase(k, pattern)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def sync(self):
+        """Nothing to replay for a single process."""
+
+
+class SQLiteStore:
+    """Cross-process store in a SQLite file, with TTL, LRU eviction and an invalidation channel."""
+
+    def __init__(self, path: str, max_entries: int = MAX_ENTRIES, l1_size: int = L1_SIZE):
+        self.path = path
+        self.max_entries = max_entries
+        self.l1 = LocalStore(l1_size, default_ttl=L1_TTL)
+        self._local = threading.local()
+        self._seq_lock = threading.Lock()
+        self._last_seq = None
+        self._writes = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS kv (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                expires_at REAL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_kv_accessed ON kv(accessed_at);
+            CREATE INDEX IF NOT EXISTS idx_kv_expires ON kv(expires_at);
+            CREATE TABLE IF NOT EXISTS invalidations (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                pattern TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+        """)
+
+    def _conn(self):
+        """One connection per thread, reopened after fork."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    # ---------- invalidation channel ----------
+    def _publish(self, conn, pattern: str):
+        conn.execute("INSERT INTO invalidations (pattern, created_at) VALUES (?, ?)", (pattern, time.time()))
+
+    def sync(self):
+        """Drop local copies of keys other workers changed since the last call."""
+        conn = self._conn()
+        with self._seq_lock:
+            if self._last_seq is None:
+                row = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM invalidations").fetchone()
+                self._last_seq = row[0]
+                return
+            rows = conn.execute("SELECT seq, pattern FROM invalidations WHERE seq > ? ORDER BY seq",
+                                (self._last_seq,)).fetchall()
+            if not rows:
+                return
+            if rows[0][0] > self._last_seq + 1:
+                self.l1.clear()  # missed pruned entries; start over
+            else:
+                for _, pattern in rows:
+                    self.l1.delete_matching(pattern)
+            self._last_seq = rows[-1][0]
+
+    # ---------- key/value ----------
+    def get(self, key: str, default=None):
+        value = self.l1.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        conn = self._conn()
+        now = time.time()
+        row = conn.execute("SELECT value, expires_at, accessed_at FROM kv WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] <= now):
+            return default
+        if now - row[2] > TOUCH_INTERVAL:
+            conn.execute("UPDATE kv SET accessed_at = ? WHERE key = ?", (now, key))
+        value = pickle.loads(row[0])
+        self.l1.set(key, value, ttl=min(L1_TTL, row[1] - now) if row[1] else None)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("""
+                INSERT INTO kv (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at,
+                                               accessed_at = excluded.accessed_at
+            """, (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), now + ttl if ttl else None, now))
+            self._publish(conn, key)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self.l1.set(key, value, ttl=min(L1_TTL, ttl) if ttl else None)
+        self._maybe_maintain()
+
+    def delete(self, key: str):
+        self._delete("key = ?", key, key)
+
+    def delete_prefix(self, prefix: str):
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        self._delete("key LIKE ? ESCAPE '\\'", escaped + "%", prefix + "*")
+
+    def _delete(self, where: str, arg: str, pattern: str):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(f"DELETE FROM kv WHERE {where}", (arg,))
+            self._publish(conn, pattern)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self.l1.delete_matching(pattern)
+
+    def _maybe_maintain(self):
+        self._writes += 1
+        if self._writes % MAINTENANCE_EVERY:
+            return
+        conn = self._conn()
+        now = time.time()
+        conn.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        over = conn.execute("SELECT COUNT(*) FROM kv").fetchone()[0] - self.max_entries
+        if over > 0:
+            conn.execute("DELETE FROM kv WHERE key IN (SELECT key FROM kv ORDER BY accessed_at LIMIT ?)", (over,))
+        conn.execute("DELETE FROM invalidations WHERE created_at < ?", (now - CHANNEL_RETENTION,))
+
+
+_MISSING = object()
+
+
+class StoreSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.replaced_sid = None
+
+    def regenerate(self):
+        """Move the data to a fresh id (call on login); the old id's stored entry is dropped on save."""
+        if self.replaced_sid is None and not self.new:
+            self.replaced_sid = self.sid
+        self.sid = os.urandom(24).hex()
+        self.modified = True
+
+
+class StoreSessionInterface(SessionInterface):
+    """Server-side sessions: the cookie carries only a signed random id, data lives under session:<id>."""
+
+    key_prefix = "session:"
+
+    def __init__(self, store):
+        self.store = store
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt="store-session")
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode()
+            except BadSignature:
+                sid = None
+            if sid:
+                data = self.store.get(self.key_prefix + sid)
+                if data is not None:
+                    return StoreSession(data, sid=sid)
+        return StoreSession(sid=os.urandom(24).hex(), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.replaced_sid is not None:
+            self.store.delete(self.key_prefix + session.replaced_sid)
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(self.key_prefix + session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if session.modified:
+            self.store.set(self.key_prefix + session.sid, dict(session),
+                           ttl=app.permanent_session_lifetime.total_seconds())
+        if session.new or session.modified or self.should_set_cookie(app, session):
+            response.vary.add("Cookie")
+            response.set_cookie(
+                name, self._signer(app).sign(session.sid.encode()).decode(),
+                expires=self.get_expiration_time(app, session), domain=domain, path=path,
+                httponly=self.get_cookie_httponly(app), secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+
+
+def make_store(url: str = DEFAULT_STORE_URL):
+    if url == "local":
+        return LocalStore(MAX_ENTRIES)
+    if url.startswith("sqlite:///"):
+        return SQLiteStore(url[len("sqlite:///"):])
+    raise ValueError(f"Unsupported SHARED_STORE url: {url}")
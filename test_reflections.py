@@ -0,0 +1,45 @@
+# test_reflections.py
+import sqlite3
+
+from reflections import ReflectionIndex
+
+
+def _db(placeholders: int):
+    db = sqlite3.connect(":memory:")
+    db.executescript("""
+        CREATE TABLE submissions (id INTEGER PRIMARY KEY, form_id INTEGER, student_response TEXT,
+                                  completed INTEGER DEFAULT 0);
+        CREATE TABLE reflection_vectors (submission_id INTEGER PRIMARY KEY, form_id INTEGER NOT NULL,
+                                         terms BLOB NOT NULL, weights BLOB NOT NULL);
+        CREATE INDEX idx_reflection_vectors_form ON reflection_vectors(form_id, submission_id);
+    """)
+    # assignment creates the pending rows up front; students complete them later, in any order
+    db.executemany("INSERT INTO submissions (id, form_id) VALUES (?, 1)", [(i,) for i in range(1, placeholders + 1)])
+    return db
+
+
+def _complete(db, submission_id: int, text: str):
+    db.execute("UPDATE submissions SET student_response = ?, completed = 1 WHERE id = ?", (text, submission_id))
+    db.commit()
+
+
+def test_responses_completed_out_of_id_order_are_loaded():
+    db = _db(3)
+    index = ReflectionIndex()
+    _complete(db, 3, "my hamstrings were tight after sprint drills")
+    _complete(db, 2, "box jumps felt explosive and my landing improved")
+    ids, _, _ = index.snapshot(db, 1)
+    assert sorted(ids.tolist()) == [2, 3]
+
+    _complete(db, 1, "sprint drills left my hamstrings tight again")
+    ids, _, _ = index.snapshot(db, 1)
+    assert sorted(ids.tolist()) == [1, 2, 3]
+    assert index.similar(db, 1, submission_id=3, k=1)[0][0] == 1
+
+
+def test_sync_without_new_vectors_keeps_the_matrix():
+    db = _db(2)
+    index = ReflectionIndex()
+    _complete(db, 2, "core work was hard")
+    first = index.matrix(db, 1)
+    assert index.matrix(db, 1) is first and first.n == 1
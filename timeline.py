@@ -0,0 +1,193 @@
+# timeline.py
+"""
+News feed timeline served from memory.
+
+Each audience (the whole school, or one class) keeps its newest FEED_BUFFER
+items in a ring buffer, newest first, ordered by (created_at, id). A page for
+a reader merges the buffers of the audiences they see (the school plus their
+classes) and is answered without touching news_feed as long as the buffers
+reach back far enough. A cursor older than what a truncated buffer holds
+falls back to one keyset query.
+
+Buffers are filled by warm() at startup and kept current by sync() before each
+read. sync() compares table_versions['news_feed'] with the version it last
+saw, a single primary-key lookup. The version triggers bump it once per
+written row, so when it has moved by exactly the number of new ids, only
+inserts happened and those rows are pushed; any update or delete causes a
+re-warm. Inserts made by any worker or script show up this way.
+"""
+import base64
+import heapq
+import json
+import threading
+from collections import deque
+from datetime import datetime
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Tuple
+
+FEED_BUFFER = 200
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+SCHOOL = None  # audience key of items without a class_id
+
+_COLUMNS = "id, title, description, category, class_id, created_by, created_at"
+
+
+def encode_cursor(created_at: datetime, item_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(" "), item_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """(created_at, id) from a cursor; ValueError if it is malformed."""
+    try:
+        stamp, item_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(stamp), int(item_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def _key(item: dict) -> Tuple[datetime, int]:
+    return item["_created"], item["id"]
+
+
+def _item(row) -> dict:
+    created = row["created_at"]
+    if not isinstance(created, datetime):
+        created = datetime.fromisoformat(str(created))
+    return {"id": row["id"], "title": row["title"], "description": row["description"],
+            "category": row["category"], "classId": row["class_id"], "createdBy": row["created_by"],
+            "createdAt": created.isoformat(), "_created": created}
+
+
+def _public(item: dict) -> dict:
+    return {k: v for k, v in item.items() if k != "_created"}
+
+
+class Timeline:
+    def __init__(self, size: int = FEED_BUFFER):
+        self.size = size
+        self._buffers: Dict[Optional[int], deque] = {}
+        self._complete: Dict[Optional[int], bool] = {}  # False once a buffer has dropped older items
+        self._lock = threading.Lock()
+        self.version = None
+        self.last_id = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _current_version(self, db) -> int:
+        row = db.execute("SELECT version FROM table_versions WHERE name = 'news_feed'").fetchone()
+        return row[0] if row else 0
+
+    def warm(self, db):
+        """Reload every audience's newest items from news_feed."""
+        version = self._current_version(db)
+        rows = db.execute(f"""
+            SELECT {_COLUMNS} FROM (
+                SELECT {_COLUMNS}, ROW_NUMBER() OVER (PARTITION BY class_id ORDER BY created_at DESC, id DESC) AS rn
+                FROM news_feed)
+            WHERE rn <= ?
+            ORDER BY created_at DESC, id DESC
+        """, (self.size + 1,)).fetchall()
+        buffers, counts = {}, {}
+        for row in rows:
+            audience = row["class_id"]
+            counts[audience] = counts.get(audience, 0) + 1
+            if counts[audience] <= self.size:
+                buffers.setdefault(audience, deque(maxlen=self.size)).append(_item(row))
+        with self._lock:
+            self._buffers = buffers
+            self._complete = {a: counts[a] <= self.size for a in counts}
+            self.version = version
+            self.last_id = max((r["id"] for r in rows), default=0)
+
+    def _push(self, item: dict):
+        audience = item["classId"]
+        buf = self._buffers.get(audience)
+        if buf is None:
+            buf = self._buffers[audience] = deque(maxlen=self.size)
+            self._complete[audience] = True
+        if len(buf) == self.size:
+            self._complete[audience] = False
+        if not buf or _key(item) > _key(buf[0]):
+            buf.appendleft(item)  # the usual case: newer than everything buffered
+        else:
+            items = sorted([*buf, item], key=_key, reverse=True)
+            buf.clear()
+            buf.extend(items[:self.size])
+
+    def sync(self, db):
+        """Fold in rows written since the last sync (by any process); re-warm after edits or deletes."""
+        version = self._current_version(db)
+        if self.version is None:
+            self.warm(db)
+            return
+        if version == self.version:
+            return
+        rows = db.execute(f"SELECT {_COLUMNS} FROM news_feed WHERE id > ? ORDER BY id",
+                          (self.last_id,)).fetchall()
+        with self._lock:
+            if self.version is not None and version - self.version == len(rows):
+                for row in rows:
+                    self._push(_item(row))
+                self.version = version
+                self.last_id = max([self.last_id] + [r["id"] for r in rows])
+                return
+        self.warm(db)
+
+    def page(self, db, class_ids: Optional[Iterable[int]] = None, cursor: Optional[str] = None,
+             limit: int = DEFAULT_PAGE_SIZE, school: bool = True) -> dict:
+        """Items for the school feed (if `school`) plus the given classes, newest first.
+
+        class_ids=None means every class (admins); raises ValueError for a bad cursor.
+        """
+        before = decode_cursor(cursor) if cursor else None
+        self.sync(db)
+        with self._lock:
+            if class_ids is None:
+                audiences = [a for a in self._buffers if a is not SCHOOL or school]
+            else:
+                audiences = ([SCHOOL] if school else []) + sorted(set(class_ids))
+            streams = [self._after(self._buffers.get(a, ()), before) for a in audiences]
+            items = list(islice(heapq.merge(*streams, key=_key, reverse=True), limit + 1))
+            # a truncated buffer is only trustworthy down to its oldest item
+            served = all(self._complete.get(a, True) or
+                         (len(items) > limit and _key(items[-1]) >= _key(self._buffers[a][-1]))
+                         for a in audiences)
+        if served:
+            self.hits += 1
+        else:
+            self.misses += 1
+            items = self._query(db, class_ids, before, limit + 1, school)
+
+        more = len(items) > limit
+        items = items[:limit]
+        return {"items": [_public(i) for i in items],
+                "nextCursor": encode_cursor(*_key(items[-1])) if more else None}
+
+    @staticmethod
+    def _after(buf, before):
+        return (i for i in buf if before is None or _key(i) < before)
+
+    @staticmethod
+    def _query(db, class_ids, before, limit: int, school: bool) -> List[dict]:
+        where, params = [], []
+        if class_ids is not None:
+            ids = sorted(set(class_ids))
+            scope = [f"class_id IN ({', '.join('?' * len(ids))})"] if ids else []
+            if school:
+                scope.append("class_id IS NULL")
+            where.append("(" + " OR ".join(scope or ["0"]) + ")")
+            params.extend(ids)
+        elif not school:
+            where.append("class_id IS NOT NULL")
+        if before is not None:
+            where.append("(created_at < ? OR (created_at = ? AND id < ?))")
+            params.extend([before[0], before[0], before[1]])
+        rows = db.execute(f"""
+            SELECT {_COLUMNS} FROM news_feed
+            {"WHERE " + " AND ".join(where) if where else ""}
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        """, params + [limit]).fetchall()
+        return [_item(r) for r in rows]
@@ -1,8 +1,11 @@
 # utils.py
 import os
+import time
 import requests
 from typing import Optional
 
+from metrics import OPENROUTER_CALLS, OPENROUTER_LATENCY
+
 OPENROUTER_API_KEY = os.environ.get("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")
 OPENROUTER_URL = os.environ.get("OPENROUTER_URL", "https://openrouter.ai/api/v1")
 
@@ -23,10 +26,12 @@ def openrouter_explain(prompt: str) -> Optional[str]:
         "max_tokens": 256,
         "temperature": 0.2
     }
+    start = time.perf_counter()
     try:
         r = requests.post(endpoint, json=payload, headers=headers, timeout=20)
         r.raise_for_status()
         data = r.json()
+        OPENROUTER_CALLS.inc("ok")
         # The structure below is placeholder; adapt to actual response format.
         if "output" in data:
             return data["output"]
@@ -35,9 +40,12 @@ def openrouter_explain(prompt: str) -> Optional[str]:
             return data["choices"][0].get("message", {}).get("content", "")
         return None
     except Exception as e:
+        OPENROUTER_CALLS.inc("timeout" if isinstance(e, requests.Timeout) else "error")
         # log in server logs; don't crash on explainability failure
         print("OpenRouter explain error:", e)
         return None
+    finally:
+        OPENROUTER_LATENCY.observe(time.perf_counter() - start)
 
 def allowed_file(filename: str, ext_whitelist=None) -> bool:
     if "." not in filename: